@@ -1,17 +1,36 @@
-from flask import Flask, current_app, flash, render_template, request, jsonify, session, redirect, url_for, send_file, after_this_request
+from flask import Flask, current_app, flash, render_template, request, jsonify, session, redirect, url_for, send_file, send_from_directory, after_this_request
 from flask_cors import CORS
+import click
 import mysql.connector
 from contextlib import contextmanager
 import shutil
 import os
+import re
 from dotenv import load_dotenv
-import logging
-from logging.handlers import RotatingFileHandler
-import sys
-import statistics
+import app_logging
 import file_handler
 import ask_ai
+import similarity
+import text_search
+import topic_stats
+import cooccurrence
+import data_version
+import db_routing
+import cache
+import page_cache
+from json_provider import FastJSONProvider
+import compression
+import media_derivatives
+import metrics
+import slow_queries
+import migrations
+import columnar
+import rollups
+import singleflight
+import video_uploads
+import numpy as np
 import subprocess
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 import threading
 
@@ -19,25 +38,25 @@ import threading
 # Load environment
 load_dotenv()
 
+# Logging: queued JSON-lines writer, configured before app.logger is first used
+app_logging.configure()
+
 # Flask app setup
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
+compression.init_app(app)
+metrics.init_app(app)
+data_version.init_app(app)
+video_uploads.init_app(app)
 
 # For session storage
 app.secret_key = os.getenv("SECRET_KEY")
 
-# Logging
-logging.basicConfig(
-    level=logging.INFO,
-    handlers=[
-        RotatingFileHandler("app.log", maxBytes=100000, backupCount=3),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
-
 # ----------- Database config -----------
 db_config = {
     "host": os.getenv("DB_HOST"),
+    "port": int(os.getenv("DB_PORT", 3306)),
     "user": os.getenv("DB_USER"),
     "password": os.getenv("DB_PASSWORD"),
     "database": os.getenv("DB_NAME"),
@@ -48,13 +67,14 @@ def get_db_connection():
     conn = None
     try:
         conn = mysql.connector.connect(**db_config)
-        yield conn
+        yield metrics.instrument_connection(conn)
     finally:
         if conn and conn.is_connected():
             conn.close()
 
 read_only_db_config = {
     "host": os.getenv("DB_HOST"),
+    "port": int(os.getenv("DB_PORT", 3306)),
     "user": os.getenv("READ_ONLY_DB_USER"),
     "password": os.getenv("READ_ONLY_DB_PASSWORD"),
     "database": os.getenv("DB_NAME"),
@@ -64,12 +84,39 @@ read_only_db_config = {
 def get_read_only_db_connection():
     conn = None
     try:
-        conn = mysql.connector.connect(**read_only_db_config)
-        yield conn
+        conn = db_routing.connect_for_read(read_only_db_config)
+        yield metrics.instrument_connection(conn)
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+
+# Read-only routes: a replica when configured and in sync, else the primary
+@contextmanager
+def get_read_db_connection():
+    conn = None
+    try:
+        conn = db_routing.connect_for_read(db_config)
+        yield metrics.instrument_connection(conn)
     finally:
         if conn and conn.is_connected():
             conn.close()
 
+# Build any of the given in-memory indexes that are not loaded, reading from
+# the primary: a rebuild from a lagging replica would leave out recent posts,
+# and no later delta adds them back
+def ensure_indexes_loaded(*indexes):
+    missing = [index for index in indexes if not index.is_loaded()]
+    if not missing:
+        return
+    with get_db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        for index in missing:
+            index.ensure_loaded(cursor)
+
+db_routing.init_app(app, mysql.connector.connect, db_config)
+
+slow_queries.init_app(app, lambda: mysql.connector.connect(**db_config))
+
 # ----------- Helper Functions -----------
 
 def run_media_sync(app_instance):
@@ -92,11 +139,116 @@ def run_media_sync(app_instance):
                     if not any(f.startswith(p_id) for f in existing_files):
                         app_instance.logger.info(f"Downloading missing media for: {p_id}")
                         file_handler.download_media_by_id(row['post_url'], p_id)
-            
-            app_instance.logger.info("Sync Complete.")
+
+            created = media_derivatives.backfill(app_instance.logger)
+            page_cache.invalidate_all()
+            swept = file_handler.sweep_media_objects()
+            app_instance.logger.info(f"Sync Complete. Generated {created} missing thumbnails, removed {swept} unused media objects.")
         except Exception as e:
             app_instance.logger.error(f"Sync failed: {e}")
 
+def run_thumbnail_backfill(app_instance):
+    with app_instance.app_context():
+        try:
+            created = media_derivatives.backfill(app_instance.logger)
+            if created:
+                page_cache.invalidate_all()
+            app_instance.logger.info(f"Thumbnail backfill complete. Generated {created} thumbnails.")
+        except Exception as e:
+            app_instance.logger.error(f"Thumbnail backfill failed: {e}")
+
+def run_index_rebuild(app_instance):
+    with app_instance.app_context():
+        try:
+            with get_db_connection() as conn:
+                cursor = conn.cursor(dictionary=True)
+                similarity.rebuild(cursor)
+                text_search.rebuild(cursor)
+                cooccurrence.rebuild(cursor)
+                columnar.rebuild(cursor)
+                topic_stats.invalidate()
+            app_instance.logger.info("Index rebuild complete.")
+        except Exception as e:
+            app_instance.logger.error(f"Index rebuild failed: {e}")
+
+# Fetch post card rows for the given ids, keeping the order of the ids
+def fetch_post_cards(cursor, post_ids, columns="post_id, media_url, caption, impressions, likes, comments, reposts"):
+    if not post_ids:
+        return []
+    placeholders = ', '.join(['%s'] * len(post_ids))
+    cursor.execute(f"SELECT {columns} FROM posts WHERE post_id IN ({placeholders})", list(post_ids))
+    rows_by_id = {row['post_id']: row for row in cursor.fetchall()}
+    return [rows_by_id[i] for i in post_ids if i in rows_by_id]
+
+# Keep the in-memory indexes in step with a newly committed post. Each index
+# is updated on its own; one that fails is dropped so it rebuilds from the
+# database on next use. With raise_errors the first failure is re-raised
+# once every index has been tried.
+def update_indexes_after_save(post_id, post_data, tags, topic_ids, graphic_desc_ids, raise_errors=False):
+    topics = list(zip(topic_ids, tags))
+    updates = (
+        (similarity, lambda: similarity.add_post(post_id, post_data.get('post_datetime'), topic_ids, graphic_desc_ids)),
+        (text_search, lambda: text_search.add_post(post_id, post_data.get('caption'))),
+        (columnar, lambda: columnar.add_post(post_id, post_data, topics)),
+        (topic_stats, lambda: topic_stats.invalidate(topic_ids)),
+        (cooccurrence, lambda: cooccurrence.add_post(topics)),
+    )
+    failure = None
+    for index, update in updates:
+        try:
+            update()
+        except Exception as e:
+            app.logger.error(f"Failed to update {index.__name__} for post {post_id}: {e}")
+            index.invalidate()
+            failure = failure or e
+    if failure is not None and raise_errors:
+        raise failure
+
+# Detail pages that show a newly saved post: its own page, its topics' pages,
+# posts sharing a topic or graphic description (similar posts, latest related
+# post) and posts with similar caption wording
+def pages_affected_by_post(cursor, post_id, topic_ids, graphic_desc_ids):
+    post_ids = {int(post_id)}
+    for table, column, ids in (("topic_posts", "topic_id", topic_ids),
+                               ("graphic_desc_posts", "graphic_desc_id", graphic_desc_ids)):
+        if ids:
+            cursor.execute(f"SELECT DISTINCT post_id FROM {table} WHERE {column} IN ({', '.join(['%s'] * len(ids))})", ids)
+            post_ids.update(row[0] for row in cursor.fetchall())
+    post_ids.update(pid for pid, _ in text_search.similar_to(int(post_id)))
+    return ([page_cache.page_key('post', pid) for pid in post_ids] +
+            [page_cache.page_key('topic', tid) for tid in topic_ids])
+
+# Another worker saved a post: apply it to this worker's indexes. Errors
+# propagate so data_version falls back to reset_derived_state().
+def apply_saved_post(delta):
+    cache.invalidate()
+    update_indexes_after_save(int(delta['post_id']), delta['post_data'], delta['tags'],
+                              delta['topic_ids'], delta['graphic_desc_ids'], raise_errors=True)
+
+# Another worker changed data this worker cannot replay: drop everything derived from it
+def reset_derived_state():
+    cache.invalidate()
+    topic_stats.invalidate()
+    similarity.invalidate()
+    text_search.invalidate()
+    cooccurrence.invalidate()
+    columnar.invalidate()
+
+data_version.add_listener(reset_derived_state)
+data_version.add_delta_listener(apply_saved_post)
+
+# Thumbnail URL for a post's media, or None when no derivative exists yet;
+# `v` is the thumbnail's mtime, so a regenerated one gets a new URL
+@app.template_global()
+def thumbnail_url(media_url):
+    if not media_url or media_url.startswith('http'):
+        return None
+    try:
+        version = os.stat(media_derivatives.thumbnail_path(media_url)).st_mtime_ns
+    except OSError:
+        return None
+    return url_for('media_thumbnail', filename=media_derivatives.thumbnail_name(media_url), v=version)
+
 # Cleanup temp uploads on startup
 def cleanup_temp_folder():
     temp_dir = os.path.join(app.root_path, 'temp_uploads')
@@ -123,10 +275,11 @@ def topics_list():
     return render_template("topics.html")
 
 @app.route("/post/<int:post_id>")
+@page_cache.cached('post')
 def show_post_details(post_id):
-    app.logger.info(f"Request received for post ID: {post_id}")
+    app.logger.debug("Request received for post ID: %s", post_id)
     try:
-        with get_db_connection() as conn:
+        with get_read_db_connection() as conn:
             cursor = conn.cursor(dictionary=True)
             
             # Fetch the main post
@@ -157,47 +310,35 @@ def show_post_details(post_id):
             """, (post_id,))
             graphic_descs = cursor.fetchall()
 
-            # Fetch similar posts
-            cursor.execute("""
-                SELECT p.post_id, p.media_url, p.caption, p.impressions, p.likes, p.comments, p.reposts
-                FROM posts p
-                JOIN topic_posts tp ON p.post_id = tp.post_id
-                WHERE tp.topic_id IN (
-                    SELECT topic_id FROM topic_posts WHERE post_id = %s
-                ) AND p.post_id != %s
-                GROUP BY p.post_id
-                ORDER BY p.post_datetime DESC
-                LIMIT 10
-            """, (post_id, post_id))
-            similar_posts = cursor.fetchall()
-
-            # Fetch the most recent post date among similar posts
+            # Fetch similar posts, ranked by the in-memory similarity index
+            ensure_indexes_loaded(similarity, text_search)
+            similar_posts = fetch_post_cards(cursor, similarity.similar_posts(post_id))
+
+            # Posts with similar caption wording, from the TF-IDF caption index
+            similar_wording_ids = [pid for pid, _ in text_search.similar_to(post_id, limit=10)]
+            similar_wording_posts = fetch_post_cards(cursor, similar_wording_ids)
+
+            # Most recent post among posts sharing a topic
             most_recent_post_info = None
             if similar_posts:
-                cursor.execute("""
-                    SELECT p.post_id, p.post_datetime
-                    FROM posts p
-                    JOIN topic_posts tp ON p.post_id = tp.post_id
-                    WHERE tp.topic_id IN (
-                        SELECT topic_id FROM topic_posts WHERE post_id = %s
-                    )
-                    ORDER BY p.post_datetime DESC
-                    LIMIT 1
-                """, (post_id,))
-                most_recent_post_info = cursor.fetchone()
+                most_recent_post_info = similarity.latest_related_post(post_id)
                 if most_recent_post_info and most_recent_post_info.get('post_datetime'):
                     most_recent_post_info['post_datetime'] = most_recent_post_info['post_datetime'].strftime('%d %B %Y')
 
-            return render_template('individual_post.html', post=post, topics=topics, graphic_descs=graphic_descs, similar_posts=similar_posts, most_recent_post_info=most_recent_post_info)
+            return render_template('individual_post.html', post=post, topics=topics, graphic_descs=graphic_descs, similar_posts=similar_posts, similar_wording_posts=similar_wording_posts, most_recent_post_info=most_recent_post_info)
 
     except mysql.connector.Error as err:
         app.logger.error(f"Database error: {err}")
         return "Database error", 500
 
+TOPIC_POSTS_PAGE_SIZE = 20
+TOPIC_CAPTION_LENGTH = 150
+
 @app.route("/topic/<int:topic_id>")
+@page_cache.cached('topic')
 def show_topic_details(topic_id):
     try:
-        with get_db_connection() as conn:
+        with get_read_db_connection() as conn:
             cursor = conn.cursor(dictionary=True)
 
             # Fetch topic details
@@ -207,48 +348,27 @@ def show_topic_details(topic_id):
             if not topic:
                 return "Topic not found", 404
 
-            # Fetch all posts for this topic
+            # Fetch the first page of posts; the rest are lazy-loaded from /api/posts
             cursor.execute("""
-                SELECT p.*
+                SELECT p.post_id, p.media_url, LEFT(p.caption, %s) AS caption, p.impressions, p.likes, p.comments
                 FROM posts p
                 JOIN topic_posts tp ON p.post_id = tp.post_id
                 WHERE tp.topic_id = %s
-                ORDER BY p.post_datetime DESC
-            """, (topic_id,))
+                ORDER BY p.post_datetime DESC, p.post_id DESC
+                LIMIT %s
+            """, (TOPIC_CAPTION_LENGTH, topic_id, TOPIC_POSTS_PAGE_SIZE))
             posts = cursor.fetchall()
 
-            # Fetch relevant topics
-            cursor.execute("""
-                SELECT t.id, t.name, COUNT(t.id) as post_count
-                FROM topics t
-                JOIN topic_posts tp ON t.id = tp.topic_id
-                WHERE tp.post_id IN (
-                    SELECT post_id FROM topic_posts WHERE topic_id = %s
-                ) AND t.id != %s
-                GROUP BY t.id, t.name
-                ORDER BY post_count DESC
-                LIMIT 10
-            """, (topic_id, topic_id))
-            relevant_topics = cursor.fetchall()
-
-            total_posts = len(posts)
+            # Relevant topics from the in-memory co-occurrence store
+            ensure_indexes_loaded(cooccurrence)
+            relevant_topics = cooccurrence.related_topics(topic_id)
+
+            # Aggregate stats come from the per-topic cache
+            stats = topic_stats.get(topic_id, load=lambda: ensure_indexes_loaded(columnar))
+            total_posts = stats['total_posts']
             last_post_date = ""
-            if posts:
-                last_post_date = posts[0]['post_datetime'].strftime('%d %B %Y')
-
-            # Calculate stats
-            likes = [p['likes'] for p in posts if p['likes'] is not None]
-            impressions = [p['impressions'] for p in posts if p['impressions'] is not None]
-            comments = [p['comments'] for p in posts if p['comments'] is not None]
-
-            stats = {
-                'avg_likes': statistics.mean(likes) if likes else 0,
-                'median_likes': statistics.median(likes) if likes else 0,
-                'avg_impressions': statistics.mean(impressions) if impressions else 0,
-                'median_impressions': statistics.median(impressions) if impressions else 0,
-                'avg_comments': statistics.mean(comments) if comments else 0,
-                'median_comments': statistics.median(comments) if comments else 0,
-            }
+            if stats['last_post_datetime']:
+                last_post_date = stats['last_post_datetime'].strftime('%d %B %Y')
 
             return render_template('topic.html',
                                    topic=topic,
@@ -256,7 +376,9 @@ def show_topic_details(topic_id):
                                    total_posts=total_posts,
                                    last_post_date=last_post_date,
                                    stats=stats,
-                                   relevant_topics=relevant_topics)
+                                   relevant_topics=relevant_topics,
+                                   page_size=TOPIC_POSTS_PAGE_SIZE,
+                                   caption_length=TOPIC_CAPTION_LENGTH)
 
     except mysql.connector.Error as err:
         app.logger.error(f"Database error in topic details: {err}")
@@ -336,65 +458,74 @@ def confirm_upload_post():
         queue_count=len(post_files_queue)
     )
 
+# Convert a stored upload to a GIF download; the input and every
+# intermediate file are removed once the response has been sent
+def gif_response(input_path, original_name):
+    base_name = os.path.splitext(input_path)[0]
+    palette_path = f"{base_name}_palette.png"
+    output_gif_path = f"{base_name}.gif"
+
+    @after_this_request
+    def cleanup(response):
+        try:
+            for path in (input_path, palette_path, output_gif_path):
+                if os.path.exists(path): os.remove(path)
+        except Exception as e:
+            app.logger.error(f"Error cleaning up temp files: {e}")
+        return response
+
+    # Rejects non-videos and over-long or oversized videos before encoding
+    video_uploads.probe(input_path)
+
+    # Step 1: Generate optimal palette
+    palette_cmd = [
+        "ffmpeg", "-y", "-i", input_path,
+        "-vf", "fps=15,scale=iw:ih:flags=lanczos,palettegen=stats_mode=full",
+        palette_path
+    ]
+
+    # Step 2: Create GIF using palette
+    gif_cmd = [
+        "ffmpeg", "-y", "-i", input_path, "-i", palette_path,
+        "-filter_complex", "fps=15,scale=iw:ih:flags=lanczos[x];[x][1:v]paletteuse=dither=sierra2_4a",
+        output_gif_path
+    ]
+
+    with metrics.timed('ffmpeg_duration_seconds', task='palette'):
+        subprocess.run(palette_cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    with metrics.timed('ffmpeg_duration_seconds', task='gif'):
+        subprocess.run(gif_cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    return send_file(
+        output_gif_path,
+        as_attachment=True,
+        download_name=f"{os.path.splitext(secure_filename(original_name) or 'video')[0]}.gif",
+        mimetype='image/gif'
+    )
+
 @app.route("/video-to-gif", methods=['GET', 'POST'])
 def video_to_gif_page():
     if request.method == 'POST':
-        if 'file' not in request.files:
-            return render_template('video_to_gif.html', error='No file part')
-        
+        # Form fallback for browsers without the chunked uploader; the body
+        # limit covers the video plus multipart overhead
+        request.max_content_length = video_uploads.MAX_BYTES + 64 * 1024
+        try:
+            if 'file' not in request.files:
+                return render_template('video_to_gif.html', error='No file part')
+        except RequestEntityTooLarge:
+            return render_template('video_to_gif.html', error=f"Video is larger than {video_uploads.MAX_BYTES // (1024 * 1024)} MB."), 413
+
         file = request.files['file']
         if file.filename == '':
             return render_template('video_to_gif.html', error='No selected file')
 
         if file:
             try:
-                filename = secure_filename(file.filename)
-                # Create a temporary directory if it doesn't exist
-                temp_dir = os.path.join(app.root_path, 'temp_uploads')
-                os.makedirs(temp_dir, exist_ok=True)
-                
-                input_path = os.path.join(temp_dir, filename)
-                file.save(input_path)
-
-                base_name = os.path.splitext(input_path)[0]
-                palette_path = f"{base_name}_palette.png"
-                output_gif_path = f"{base_name}.gif"
-
-                # Step 1: Generate optimal palette
-                palette_cmd = [
-                    "ffmpeg", "-y", "-i", input_path,
-                    "-vf", "fps=15,scale=iw:ih:flags=lanczos,palettegen=stats_mode=full",
-                    palette_path
-                ]
-
-                # Step 2: Create GIF using palette
-                gif_cmd = [
-                    "ffmpeg", "-y", "-i", input_path, "-i", palette_path,
-                    "-filter_complex", "fps=15,scale=iw:ih:flags=lanczos[x];[x][1:v]paletteuse=dither=sierra2_4a",
-                    output_gif_path
-                ]
-
-                subprocess.run(palette_cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                subprocess.run(gif_cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-
-                # Schedule cleanup of files after the response is sent
-                @after_this_request
-                def cleanup(response):
-                    try:
-                        if os.path.exists(input_path): os.remove(input_path)
-                        if os.path.exists(palette_path): os.remove(palette_path)
-                        if os.path.exists(output_gif_path): os.remove(output_gif_path)
-                    except Exception as e:
-                        app.logger.error(f"Error cleaning up temp files: {e}")
-                    return response
-
-                return send_file(
-                    output_gif_path, 
-                    as_attachment=True, 
-                    download_name=f"{os.path.splitext(filename)[0]}.gif",
-                    mimetype='image/gif'
-                )
+                input_path = video_uploads.save_upload(file)
+                return gif_response(input_path, file.filename)
 
+            except video_uploads.UploadError as e:
+                return render_template('video_to_gif.html', error=str(e)), e.status
             except subprocess.CalledProcessError:
                 app.logger.error("FFmpeg failed to convert video")
                 return render_template('video_to_gif.html', error="Error processing video. Please ensure FFmpeg is installed and the video file is valid.")
@@ -404,76 +535,175 @@ def video_to_gif_page():
 
     return render_template('video_to_gif.html')
 
+# ----------- Resumable video uploads -----------
+
+@app.errorhandler(video_uploads.UploadError)
+def upload_error(e):
+    return jsonify({"error": str(e)}), e.status
+
+@app.route("/api/video-uploads", methods=['POST'])
+def create_video_upload():
+    data = request.get_json(silent=True) or {}
+    return jsonify(video_uploads.create(data.get('filename'), data.get('size'))), 201
+
+@app.route("/api/video-uploads/<upload_id>", methods=['GET'])
+def video_upload_status(upload_id):
+    return jsonify(video_uploads.status(upload_id))
+
+@app.route("/api/video-uploads/<upload_id>", methods=['PUT'])
+def upload_video_chunk(upload_id):
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({"error": "Upload-Offset header required"}), 400
+    return jsonify(video_uploads.append(upload_id, offset, request.stream, request.content_length))
+
+@app.route("/api/video-uploads/<upload_id>", methods=['DELETE'])
+def discard_video_upload(upload_id):
+    video_uploads.discard(upload_id)
+    return "", 204
+
+@app.route("/api/video-uploads/<upload_id>/gif", methods=['POST'])
+def convert_video_upload(upload_id):
+    input_path, filename = video_uploads.complete(upload_id)
+    try:
+        return gif_response(input_path, filename)
+    except subprocess.CalledProcessError:
+        app.logger.error("FFmpeg failed to convert video")
+        return jsonify({"error": "Error processing video. Please ensure FFmpeg is installed and the video file is valid."}), 500
+
 @app.route("/ask-ai", methods=['GET'])
 def ask_ai_page():
     return render_template("ask_ai.html")
 
+DOWNLOAD_BATCH_SIZE = 500
+
 @app.route("/download")
+@singleflight.coalesce()
 def download_data():
     try:
-        with get_db_connection() as conn:
+        with get_read_db_connection() as conn:
             cursor = conn.cursor(dictionary=True)
 
-            # Fetch all posts
-            cursor.execute("SELECT * FROM posts")
-            posts = cursor.fetchall()
-
             # Fetch all topics and group them by post_id
             cursor.execute("""
-                SELECT tp.post_id, t.name
+                SELECT CAST(tp.post_id AS CHAR) AS post_id, t.name
                 FROM topics t
                 JOIN topic_posts tp ON t.id = tp.topic_id
             """)
             topic_data = cursor.fetchall()
-            
-            topics_by_post = {}
-            for row in topic_data:
-                post_id = row['post_id']
-                if post_id not in topics_by_post:
-                    topics_by_post[post_id] = []
-                topics_by_post[post_id].append(row['name'])
-
-            # Combine posts with their topics
-            for post in posts:
-                post_id = post['post_id']
-                post['topics'] = topics_by_post.get(post_id, [])
-                if post.get('post_datetime'):
-                    post['post_datetime'] = post['post_datetime'].isoformat()
-
-            # Create a JSON response
-            response = jsonify(posts)
-            response.headers['Content-Disposition'] = 'attachment; filename=posts.json'
-            return response
+
+        topics_by_post = {}
+        for row in topic_data:
+            post_id = row['post_id']
+            if post_id not in topics_by_post:
+                topics_by_post[post_id] = []
+            topics_by_post[post_id].append(row['name'])
 
     except mysql.connector.Error as err:
         app.logger.error(f"Database error: {err}")
         return jsonify({"error": "Database error"}), 500
 
+    # Stream the posts as a JSON array in batches instead of building it in memory
+    def generate():
+        try:
+            with get_read_db_connection() as conn:
+                cursor = conn.cursor(dictionary=True)
+
+                # The trailing post_id column replaces the numeric one with its
+                # text form so the JSON provider never sees 64-bit integers
+                cursor.execute("SELECT *, CAST(post_id AS CHAR) AS post_id FROM posts")
+
+                yield "["
+                separator = ""
+                while True:
+                    posts = cursor.fetchmany(DOWNLOAD_BATCH_SIZE)
+                    if not posts:
+                        break
+                    for post in posts:
+                        post['topics'] = topics_by_post.get(post['post_id'], [])
+                    yield separator + app.json.dumps(posts)[1:-1]
+                    separator = ","
+                yield "]"
+        except mysql.connector.Error as err:
+            app.logger.error(f"Database error while streaming download: {err}")
+            raise
+
+    # generate() needs no request context, so concurrent downloads can share it
+    response = app.response_class(generate(), mimetype="application/json")
+    response.headers['Content-Disposition'] = 'attachment; filename=posts.json'
+    return response
+
+# A thumbnail requested with its current version (see thumbnail_url) never
+# changes under that URL, so browsers may cache it for good. Unversioned or
+# outdated URLs (e.g. built by topic.js) are revalidated on every use.
+THUMBNAIL_MAX_AGE = 31536000
+THUMBNAIL_URL_PREFIX = f"/media/thumbs/w{media_derivatives.THUMB_WIDTH}/"
+app.jinja_env.globals['thumbnail_url_prefix'] = THUMBNAIL_URL_PREFIX
+
+@app.route(THUMBNAIL_URL_PREFIX + "<path:filename>")
+def media_thumbnail(filename):
+    response = send_from_directory(media_derivatives.THUMB_DIR, filename, max_age=0)
+    version = request.args.get('v')
+    try:
+        current = str(os.stat(os.path.join(media_derivatives.THUMB_DIR, filename)).st_mtime_ns)
+    except OSError:
+        current = None
+    if version and version == current:
+        response.headers['Cache-Control'] = f"public, max-age={THUMBNAIL_MAX_AGE}, immutable"
+    else:
+        response.headers['Cache-Control'] = "public, no-cache"
+    return response
+
 # ----------- API routes -----------
 
 # Search suggestions API
+# Fulltext prefix match on captions, or a LIKE scan before migration 4 has run.
+# The LIKE scan also runs when the fulltext search finds nothing, since the
+# index skips stopwords, short words and matches inside words.
+def caption_matches(cursor, query):
+    words = re.findall(r"\w+", query)
+    if words:
+        try:
+            cursor.execute(
+                "SELECT post_id, caption FROM posts WHERE MATCH(caption) AGAINST (%s IN BOOLEAN MODE) LIMIT 10",
+                (" ".join(f"+{word}*" for word in words),)
+            )
+            rows = cursor.fetchall()
+            if rows:
+                return rows
+        except mysql.connector.Error:
+            pass
+    cursor.execute("SELECT post_id, caption FROM posts WHERE caption LIKE %s LIMIT 10", (f"%{query}%",))
+    return cursor.fetchall()
+
 @app.route("/api/search-suggestions")
 def search_suggestions():
     query = request.args.get("query", "")
     if not query:
         return jsonify({"topics": [], "posts": []})
     try:
-        with get_db_connection() as conn:
+        with get_read_db_connection() as conn:
             cursor = conn.cursor(dictionary=True)
 
             # Search for topics
             cursor.execute("SELECT id, name FROM topics WHERE name LIKE %s", (f"%{query}%",))
             topics = cursor.fetchall()
 
-            # Search for posts
-            cursor.execute(
-                "SELECT p.post_id, p.caption FROM posts p "
-                "WHERE p.caption LIKE %s OR p.post_id LIKE %s",
-                (f"%{query}%", f"%{query}%")
-            )
+            # Search for posts: id matches first, then captions ranked by the text index
+            posts = []
+            if query.isdigit():
+                cursor.execute("SELECT post_id, caption FROM posts WHERE post_id LIKE %s LIMIT 10", (f"%{query}%",))
+                posts = cursor.fetchall()
+            seen_ids = {post['post_id'] for post in posts}
+
+            ensure_indexes_loaded(text_search)
+            ranked_ids = [pid for pid, _ in text_search.search(query, limit=10) if pid not in seen_ids]
+            if ranked_ids:
+                posts += fetch_post_cards(cursor, ranked_ids, columns="post_id, caption")
+            else:
+                posts += caption_matches(cursor, query)
 
-            posts = cursor.fetchall()
-            
             topics_suggestions = [{"id": topic['id'], "name": topic['name']} for topic in topics]
             posts_suggestions = [{"post_id": str(post['post_id']), "caption": post['caption']} for post in posts]
 
@@ -487,6 +717,8 @@ def search_suggestions():
         return jsonify({"error": "Database error"}), 500
 
 @app.route("/api/topics-list")
+@data_version.conditional
+@singleflight.coalesce()
 def api_topics_list():
     try:
         offset = int(request.args.get("offset", 0))
@@ -503,91 +735,56 @@ def api_topics_list():
         date_from = request.args.get("date_from")
         date_to = request.args.get("date_to")
 
+        # Reject malformed filters up front instead of failing mid-query
+        try:
+            bounds = [(column, float(low) if low else None, float(high) if high else None)
+                      for column, low, high in (("median_impressions", impressions_min, impressions_max),
+                                                ("median_likes", likes_min, likes_max),
+                                                ("median_comments", comments_min, comments_max))]
+            date_from = np.datetime64(date_from) if date_from else None
+            date_to = np.datetime64(date_to) if date_to else None
+        except ValueError:
+            return jsonify({"error": "Invalid filter value"}), 400
+
         valid_sort_columns = ["post_count", "median_impressions", "median_likes", "median_comments", "last_posted"]
         if sort_by not in valid_sort_columns:
             sort_by = "last_posted"
         if sort_order not in ["ASC", "DESC"]:
             sort_order = "DESC"
 
-        with get_db_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-
-            query = """
-                SELECT
-                    t.id,
-                    t.name,
-                    COUNT(p.post_id) AS post_count,
-                    MAX(p.post_datetime) AS last_posted,
-                    GROUP_CONCAT(p.impressions ORDER BY p.impressions) AS all_impressions,
-                    GROUP_CONCAT(p.likes ORDER BY p.likes) AS all_likes,
-                    GROUP_CONCAT(p.comments ORDER BY p.comments) AS all_comments
-                FROM topics t
-                JOIN topic_posts tp ON t.id = tp.topic_id
-                JOIN posts p ON tp.post_id = p.post_id
-                GROUP BY t.id, t.name
-            """
-
-            cursor.execute(query)
-            rows = cursor.fetchall()
-
-            def median_from_csv(csv_str):
-                if not csv_str:
-                    return None
-                vals = [int(v) for v in csv_str.split(',') if v]
-                n = len(vals)
-                if n == 0:
-                    return None
-                mid = n // 2
-                if n % 2 == 0:
-                    return (vals[mid - 1] + vals[mid]) / 2
-                return vals[mid]
-
-            topics = []
-            for row in rows:
-                topic = {
-                    'id': row['id'],
-                    'name': row['name'],
-                    'post_count': row['post_count'],
-                    'last_posted': row['last_posted'].strftime('%d %B %Y') if row['last_posted'] else None,
-                    'last_posted_raw': row['last_posted'],
-                    'median_impressions': median_from_csv(row['all_impressions']),
-                    'median_likes': median_from_csv(row['all_likes']),
-                    'median_comments': median_from_csv(row['all_comments'])
-                }
-                topics.append(topic)
-
-            if impressions_min:
-                topics = [t for t in topics if t['median_impressions'] is not None and t['median_impressions'] >= float(impressions_min)]
-            if impressions_max:
-                topics = [t for t in topics if t['median_impressions'] is not None and t['median_impressions'] <= float(impressions_max)]
-            if likes_min:
-                topics = [t for t in topics if t['median_likes'] is not None and t['median_likes'] >= float(likes_min)]
-            if likes_max:
-                topics = [t for t in topics if t['median_likes'] is not None and t['median_likes'] <= float(likes_max)]
-            if comments_min:
-                topics = [t for t in topics if t['median_comments'] is not None and t['median_comments'] >= float(comments_min)]
-            if comments_max:
-                topics = [t for t in topics if t['median_comments'] is not None and t['median_comments'] <= float(comments_max)]
-            if date_from:
-                topics = [t for t in topics if t['last_posted_raw'] and str(t['last_posted_raw']) >= date_from]
-            if date_to:
-                topics = [t for t in topics if t['last_posted_raw'] and str(t['last_posted_raw']) <= date_to]
-
-            reverse = sort_order == "DESC"
-            sort_field = 'last_posted_raw' if sort_by == 'last_posted' else sort_by
-            def sort_key(t):
-                val = t.get(sort_field)
-                if val is None:
-                    return (0, '') if reverse else (1, '')
-                return (1, val) if reverse else (0, val)
-            topics.sort(key=sort_key, reverse=reverse)
-
-            page = topics[offset:offset + limit]
-
-            for t in page:
-                t.pop('last_posted_raw', None)
-
-            return jsonify(page)
+        ensure_indexes_loaded(columnar)
+
+        # Per-topic medians and last post dates, computed over the columnar snapshot
+        table = columnar.topics_table()
+        keep = np.ones(len(table['id']), dtype=bool)
+        for column, low, high in bounds:
+            # NaN (no values) fails both comparisons, so those topics drop out of filtered lists
+            if low is not None:
+                keep &= table[column] >= low
+            if high is not None:
+                keep &= table[column] <= high
+        if date_from is not None:
+            keep &= table['last_posted'] >= date_from
+        if date_to is not None:
+            keep &= table['last_posted'] <= date_to
+
+        selected = np.flatnonzero(keep)
+        order = columnar.order_by(table[sort_by][selected], descending=sort_order == "DESC")
+        page = selected[order][offset:offset + limit]
+
+        topics = []
+        for i in page:
+            last_posted = columnar.to_python(table['last_posted'][i])
+            topics.append({
+                'id': int(table['id'][i]),
+                'name': table['name'][i],
+                'post_count': int(table['post_count'][i]),
+                'last_posted': last_posted.strftime('%d %B %Y') if last_posted else None,
+                'median_impressions': columnar.to_python(table['median_impressions'][i]),
+                'median_likes': columnar.to_python(table['median_likes'][i]),
+                'median_comments': columnar.to_python(table['median_comments'][i]),
+            })
+        return jsonify(topics)
 
     except mysql.connector.Error as err:
         app.logger.error(f"Database error in topics list: {err}")
@@ -598,6 +795,7 @@ def api_topics_list():
 
 # Fetch posts for posts page
 @app.route("/api/posts")
+@data_version.conditional
 def api_posts():
     try:
         offset = int(request.args.get("offset", 0))
@@ -614,6 +812,8 @@ def api_posts():
         comments_max = request.args.get("comments_max")
         latest_date_from = request.args.get("latest_date_from")
         latest_date_to = request.args.get("latest_date_to")
+        topic_id = request.args.get("topic_id", type=int)
+        caption_length = request.args.get("caption_length", type=int)
 
         valid_sort_columns = ["post_datetime", "likes", "comments", "impressions", "main_ebook_ctr", "main_ebook_clicks", "latest_post_datetime"]
         if sort_by not in valid_sort_columns:
@@ -621,74 +821,85 @@ def api_posts():
         if sort_order not in ["ASC", "DESC"]:
             sort_order = "DESC"
 
-        query = """SELECT post_id, caption, impressions, likes, comments, post_datetime, main_ebook_ctr, main_ebook_clicks,
-                   (SELECT MAX(p2.post_datetime) 
-                    FROM posts p2 
-                    JOIN topic_posts tp2 ON p2.post_id = tp2.post_id 
-                    WHERE tp2.topic_id IN (
-                        SELECT tp1.topic_id 
-                        FROM topic_posts tp1 
-                        WHERE tp1.post_id = posts.post_id
-                    )) as latest_post_datetime
-                   FROM posts WHERE 1=1"""
+        caption_column = "posts.caption"
         params = []
-
+        if caption_length:
+            caption_column = "LEFT(posts.caption, %s) AS caption"
+            params.append(caption_length)
+
+        where, where_params = "1=1", []
+        if topic_id:
+            where += " AND post_id IN (SELECT post_id FROM topic_posts WHERE topic_id = %s)"
+            where_params.append(topic_id)
         if date_from:
-            query += " AND post_datetime >= %s"
-            params.append(date_from)
+            where += " AND post_datetime >= %s"
+            where_params.append(date_from)
         if date_to:
-            query += " AND post_datetime <= %s"
-            params.append(date_to)
+            where += " AND post_datetime <= %s"
+            where_params.append(date_to)
         if likes_min:
-            query += " AND likes >= %s"
-            params.append(likes_min)
+            where += " AND likes >= %s"
+            where_params.append(likes_min)
         if likes_max:
-            query += " AND likes <= %s"
-            params.append(likes_max)
+            where += " AND likes <= %s"
+            where_params.append(likes_max)
         if impressions_min:
-            query += " AND impressions >= %s"
-            params.append(impressions_min)
+            where += " AND impressions >= %s"
+            where_params.append(impressions_min)
         if impressions_max:
-            query += " AND impressions <= %s"
-            params.append(impressions_max)
+            where += " AND impressions <= %s"
+            where_params.append(impressions_max)
         if comments_min:
-            query += " AND comments >= %s"
-            params.append(comments_min)
+            where += " AND comments >= %s"
+            where_params.append(comments_min)
         if comments_max:
-            query += " AND comments <= %s"
-            params.append(comments_max)
+            where += " AND comments <= %s"
+            where_params.append(comments_max)
 
         having_clauses = []
+        having_params = []
         if latest_date_from:
             having_clauses.append("latest_post_datetime >= %s")
-            params.append(latest_date_from)
+            having_params.append(latest_date_from)
         if latest_date_to:
             having_clauses.append("latest_post_datetime <= %s")
-            params.append(latest_date_to)
-
-        if having_clauses:
-            query += " HAVING " + " AND ".join(having_clauses)
-
-        query += f" ORDER BY {sort_by} {sort_order} LIMIT %s OFFSET %s"
-        params.extend([limit, offset])
+            having_params.append(latest_date_to)
 
-        with get_db_connection() as conn:
+        # post_id is cast in SQL so the JSON provider never sees a 64-bit integer
+        select = f"""SELECT CAST(posts.post_id AS CHAR) AS post_id, posts.media_url, {caption_column}, posts.impressions, posts.likes, posts.comments, posts.post_datetime, posts.main_ebook_ctr, posts.main_ebook_clicks,
+                   (SELECT MAX(p2.post_datetime) 
+                    FROM posts p2 
+                    JOIN topic_posts tp2 ON p2.post_id = tp2.post_id 
+                    WHERE tp2.topic_id IN (
+                        SELECT tp1.topic_id 
+                        FROM topic_posts tp1 
+                        WHERE tp1.post_id = posts.post_id
+                    )) as latest_post_datetime"""
+        # post_id breaks ties so pages never repeat or skip rows; qualified, as
+        # the bare name is the CHAR alias above
+        order = f"ORDER BY {sort_by} {sort_order}, posts.post_id DESC"
+
+        if sort_by == "latest_post_datetime" or having_clauses:
+            # Needs the per-post subquery for every candidate row
+            query = f"{select} FROM posts WHERE {where}"
+            if having_clauses:
+                query += " HAVING " + " AND ".join(having_clauses)
+            query += f" {order} LIMIT %s OFFSET %s"
+            params += where_params + having_params + [limit, offset]
+        else:
+            # Pick the page's ids first, from a covering index (migration 6),
+            # and only fetch full rows and run the subquery for those
+            query = f"""{select}
+                   FROM (SELECT post_id FROM posts WHERE {where}
+                         ORDER BY {sort_by} {sort_order}, post_id DESC LIMIT %s OFFSET %s) page
+                   JOIN posts ON posts.post_id = page.post_id
+                   ORDER BY posts.{sort_by} {sort_order}, posts.post_id DESC"""
+            params += where_params + [limit, offset]
+
+        with get_read_db_connection() as conn:
             cursor = conn.cursor(dictionary=True)
             cursor.execute(query, params)
             posts = cursor.fetchall()
-
-            for post in posts:
-                if "post_id" in post and post["post_id"] is not None:
-                    post["post_id"] = str(post["post_id"])
-
-                if post.get("post_datetime"):
-                    post["post_datetime"] = post["post_datetime"].strftime("%d %B %Y")
-                
-                if post.get("latest_post_datetime"):
-                    post["latest_post_datetime"] = post["latest_post_datetime"].strftime("%d %B %Y")
-                else:
-                    post["latest_post_datetime"] = "-"
-
             return jsonify(posts)
 
     except mysql.connector.Error as err:
@@ -697,9 +908,11 @@ def api_posts():
 
 #Get topic suggestions for confirm post: 
 @app.route("/api/topics")
+@data_version.conditional
+@cache.cached(ttl=600)
 def api_topics():
     try:
-        with get_db_connection() as conn:
+        with get_read_db_connection() as conn:
             cursor = conn.cursor(dictionary=True)
             cursor.execute("SELECT id, name FROM topics")
             topics = cursor.fetchall()
@@ -710,9 +923,11 @@ def api_topics():
 
 #Get graphic description suggestions for confirm post:
 @app.route("/api/graphic-descs")
+@data_version.conditional
+@cache.cached(ttl=600)
 def api_graphic_descs():
     try:
-        with get_db_connection() as conn:
+        with get_read_db_connection() as conn:
             cursor = conn.cursor(dictionary=True)
             cursor.execute("SELECT id, name FROM graphic_desc")
             graphic_descs = cursor.fetchall()
@@ -721,6 +936,70 @@ def api_graphic_descs():
         app.logger.error(f"Database error: {err}")
         return jsonify({"error": "Database error"}), 500
 
+#Hit/miss counts of the lookup cache, plus page cache size
+# Totals across all worker processes, with each worker's own numbers under "workers"
+@app.route("/api/cache-stats")
+def cache_stats():
+    workers = metrics.worker_status('cache')
+    return jsonify({**cache.combine([w['responses'] for w in workers.values()]), 'workers': workers})
+
+metrics.register_status('cache', lambda: {'responses': cache.stats(), 'pages': page_cache.stats()})
+
+def cache_metrics():
+    lines = ["# HELP response_cache_entries Lookup endpoint cache entries.",
+             "# TYPE response_cache_entries gauge"]
+    for endpoint, counters in sorted(cache.stats()["endpoints"].items()):
+        lines.append(f'response_cache_entries{{endpoint="{endpoint}"}} {counters.get("entries", 0)}')
+    return lines
+
+metrics.register_collector(cache_metrics)
+
+#Per-route slow query report (SLOW_QUERY_LOG=1):
+@app.route("/api/slow-queries")
+def slow_query_report():
+    return jsonify(slow_queries.combine(list(metrics.worker_status('slow_queries').values())))
+
+metrics.register_status('slow_queries', slow_queries.report)
+
+#Prometheus scrape endpoint:
+@app.route("/metrics")
+def metrics_endpoint():
+    return app.response_class(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+#Engagement rollups: daily, weekly, weekday-hour or topic-monthly
+@app.route("/api/analytics/<rollup>")
+@data_version.conditional
+def api_analytics(rollup):
+    if rollup not in rollups.ROLLUPS:
+        return jsonify({"error": f"Unknown rollup. Use one of: {', '.join(rollups.ROLLUPS)}"}), 404
+    try:
+        with get_read_db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            rows = rollups.fetch(
+                cursor, rollup,
+                date_from=request.args.get("date_from"),
+                date_to=request.args.get("date_to"),
+                topic_id=request.args.get("topic_id", type=int),
+            )
+            return jsonify(rows)
+    except mysql.connector.Error as err:
+        app.logger.error(f"Database error in analytics: {err}")
+        return jsonify({"error": "Database error"}), 500
+
+#Get related topic suggestions for the tags already on a post:
+@app.route("/api/topic-suggestions")
+@data_version.conditional
+def topic_suggestions():
+    names = [n.strip() for n in request.args.getlist("topics") if n.strip()]
+    if not names:
+        return jsonify([])
+    try:
+        ensure_indexes_loaded(cooccurrence)
+        return jsonify(cooccurrence.suggest(names))
+    except mysql.connector.Error as err:
+        app.logger.error(f"Database error: {err}")
+        return jsonify({"error": "Database error"}), 500
+
 #Save post after confirmation
 @app.route("/api/save-post", methods=['POST'])
 def save_post():
@@ -766,6 +1045,7 @@ def save_post():
                 post_id = post_data['post_id']
 
                 topic_ids = []
+                created_topics = False
                 for tag in tags:
                     cursor.execute("SELECT id FROM topics WHERE name = %s", (tag,))
                     result = cursor.fetchone()
@@ -774,12 +1054,14 @@ def save_post():
                     else:
                         cursor.execute("INSERT INTO topics (name) VALUES (%s)", (tag,))
                         topic_ids.append(cursor.lastrowid)
+                        created_topics = True
 
                 for topic_id in topic_ids:
                     cursor.execute("INSERT INTO topic_posts (post_id, topic_id) VALUES (%s, %s)", (post_id, topic_id))
 
                 # Handle graphic descriptions
                 graphic_desc_ids = []
+                created_graphic_descs = False
                 for gd in graphic_descs:
                     cursor.execute("SELECT id FROM graphic_desc WHERE name = %s", (gd,))
                     result = cursor.fetchone()
@@ -788,12 +1070,42 @@ def save_post():
                     else:
                         cursor.execute("INSERT INTO graphic_desc (name) VALUES (%s)", (gd,))
                         graphic_desc_ids.append(cursor.lastrowid)
+                        created_graphic_descs = True
 
                 for gd_id in graphic_desc_ids:
                     cursor.execute("INSERT INTO graphic_desc_posts (post_id, graphic_desc_id) VALUES (%s, %s)", (post_id, gd_id))
 
+                # Rollups are updated in the same transaction as the post
+                try:
+                    rollups.add_post(cursor, post_data, topic_ids)
+                except mysql.connector.Error as err:
+                    if err.errno != 1146: # 1146: rollup tables missing until migration 5 has run
+                        raise
+                    app.logger.warning(f"Rollup tables missing, run migrations: {err}")
+
                 conn.commit()
-                
+                db_routing.mark_write()
+
+                # Apply other workers' saves first, then this one, and only
+                # then publish the new version, so it is never served with
+                # stale caches or indexes
+                data_version.sync()
+                if created_topics:
+                    cache.invalidate('api_topics')
+                if created_graphic_descs:
+                    cache.invalidate('api_graphic_descs')
+                update_indexes_after_save(int(post_id), post_data, tags, topic_ids, graphic_desc_ids)
+                data_version.bump({
+                    'post_id': int(post_id), 'post_data': post_data, 'tags': tags,
+                    'topic_ids': topic_ids, 'graphic_desc_ids': graphic_desc_ids,
+                })
+
+                try:
+                    page_cache.invalidate(pages_affected_by_post(cursor, post_id, topic_ids, graphic_desc_ids))
+                except Exception as e:
+                    app.logger.error(f"Targeted page invalidation failed, flushing page cache: {e}")
+                    page_cache.invalidate_all()
+
                 cleanup_current_file()
                 return jsonify({"success": True, "post_id": post_id}), 201
 
@@ -813,7 +1125,13 @@ def save_post():
         app.logger.error(f"Database connection error: {err}")
         return jsonify({"error": "Database connection error"}), 500
 
+# Identical questions differing only in case or spacing share one Gemini round trip
+def normalized_question():
+    data = request.get_json(silent=True) or {}
+    return " ".join(str(data.get("question", "")).lower().split())
+
 @app.route("/api/ask-ai-query", methods=['POST'])
+@singleflight.coalesce(key=normalized_question)
 def ask_ai_query():
     data = request.get_json()
     user_question = data.get("question")
@@ -841,14 +1159,7 @@ def ask_ai_query():
             cursor.execute(sql_query)
             results = cursor.fetchall()
 
-            #Convert big numbers to string to avoid precision loss
-            for row in results:
-                for key, value in row.items():
-                    if key == 'post_id' and value is not None:
-                        row[key] = str(value)
-                    elif isinstance(value, int) and value > 9007199254740991:
-                        row[key] = str(value)
-            
+            # Big integers, dates and decimals are handled by the JSON provider
             response_data = {
                 "type": query_type,
                 "sql": sql_query,
@@ -872,6 +1183,20 @@ def ask_ai_query():
         app.logger.error(f"AI/Server Error: {e}")
         return jsonify({"error": "Failed to process the question with AI."}), 500
 
+@app.route("/api/rebuild-indexes")
+def rebuild_indexes():
+    thread = threading.Thread(target=run_index_rebuild, args=(app,))
+    thread.daemon = True
+    thread.start()
+    return jsonify({"message": "Index rebuild started in background. Check your terminal logs."}), 202
+
+@app.route("/api/backfill-thumbnails")
+def backfill_thumbnails():
+    thread = threading.Thread(target=run_thumbnail_backfill, args=(app,))
+    thread.daemon = True
+    thread.start()
+    return jsonify({"message": "Thumbnail backfill started in background. Check your terminal logs."}), 202
+
 @app.route("/api/sync-media")
 def sync_media():
     thread = threading.Thread(target=run_media_sync, args=(app,)) 
@@ -887,9 +1212,63 @@ def not_found(e):
 def server_error(e):
     return jsonify({"error": "Internal server error"}), 500
 
-#Server entry point
-if __name__ == "__main__":
+# ----------- Schema migrations -----------
+
+def run_migrations():
+    with get_db_connection() as conn:
+        applied = migrations.migrate(conn)
+    if applied:
+        app.logger.info(f"Applied schema migrations: {applied}")
+    return applied
+
+@app.cli.command("migrate")
+@click.option("--status", "show_status", is_flag=True, help="List migrations without applying them.")
+@click.option("--verify", is_flag=True, help="EXPLAIN each route's query and check the indexes it uses.")
+def migrate_command(show_status, verify):
+    """Apply pending schema migrations."""
+    with get_db_connection() as conn:
+        if show_status:
+            for m in migrations.status(conn):
+                click.echo(f"{m['version']:>3}  {'applied' if m['applied'] else 'pending':<8} {m['description']}")
+        else:
+            applied = migrations.migrate(conn)
+            click.echo(f"Applied: {applied}" if applied else "Schema is up to date.")
+        if verify:
+            for check in migrations.verify(conn):
+                detail = check.get('error') or f"{check['index']} ({check['access']})"
+                click.echo(f"{'ok  ' if check['ok'] else 'MISS'}  {check['route']}: {detail}")
+
+# ----------- Application factory -----------
+
+_startup_done = False
+
+# One-time tasks for a server start. Under gunicorn they run in the master
+# process (see gunicorn.conf.py) before any worker is forked.
+def run_startup_tasks():
+    global _startup_done
+    if _startup_done:
+        return
+    _startup_done = True
     cleanup_temp_folder() # Remove any leftover files from previous runs on startup
+    data_version.new_epoch()
+    page_cache.clear()
+    metrics.clear_snapshots()
+    file_handler.sweep_media_objects()
+    if os.getenv("MIGRATE_ON_STARTUP", "").lower() in ("1", "true", "yes"):
+        run_migrations()
+
+# Routes and hooks are registered on the module-level app at import; the
+# factory applies per-deployment config and optionally runs startup tasks
+def create_app(config=None, run_startup=False):
+    if config:
+        app.config.update(config)
+    if run_startup:
+        run_startup_tasks()
+    return app
+
+#Development server entry point; production uses wsgi.py under gunicorn
+if __name__ == "__main__":
+    create_app(run_startup=True)
     app.run(debug=True, use_reloader=False)
 
     
\ No newline at end of file
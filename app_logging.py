@@ -0,0 +1,194 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, WatchedFileHandler
+from flask import has_request_context, request
+import metrics
+
+# Logging goes through a bounded in-memory queue: request threads only format
+# the message and enqueue the record, and a background listener thread does
+# the file and stdout writes. When the queue is full, records are dropped
+# (and counted) rather than blocking the request. The log file holds one
+# JSON object per line; stdout stays human-readable unless LOG_STDOUT_FORMAT
+# is "json". Large payloads go through log_payload(), which samples and
+# truncates them before any serialization work happens.
+#
+# Settings (environment):
+#   LOG_LEVEL                  root level (INFO)
+#   LOG_FILE                   JSON-lines file, empty to disable (app.log)
+#   LOG_ROTATION               "size" rotates in-process at LOG_MAX_BYTES; only
+#                              safe with a single process. "external" leaves
+#                              rotation to logrotate and reopens the file when
+#                              it is moved, so several workers can append to
+#                              it (gunicorn.conf.py defaults to this). (size)
+#   LOG_MAX_BYTES, LOG_BACKUPS size rotation (10 MB, 5 files)
+#   LOG_QUEUE_SIZE             records buffered before dropping (10000)
+#   LOG_STDOUT_FORMAT          "text" or "json" (text)
+#   LOG_MAX_MESSAGE_CHARS      longer messages are truncated (4000)
+#   LOG_PAYLOAD_SAMPLE_RATE    fraction of payloads logged, 0-1 (0.1)
+#   LOG_PAYLOAD_MAX_CHARS      longer payloads are truncated (2000)
+
+metrics.describe('log_records_dropped_total', 'counter', 'Log records dropped because the log queue was full.')
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+_queue = None
+_handler = None
+_listener = None
+_targets = []
+_lock = threading.Lock()
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+MAX_MESSAGE_CHARS = int(_env_float("LOG_MAX_MESSAGE_CHARS", 4000))
+PAYLOAD_SAMPLE_RATE = _env_float("LOG_PAYLOAD_SAMPLE_RATE", 0.1)
+PAYLOAD_MAX_CHARS = int(_env_float("LOG_PAYLOAD_MAX_CHARS", 2000))
+
+
+def _truncate(text, limit):
+    if limit and len(text) > limit:
+        return f"{text[:limit]}... [{len(text) - limit} more chars]"
+    return text
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'thread': record.threadName,
+        }
+        for field in ('request', 'payload', 'payload_chars'):
+            if hasattr(record, field):
+                entry[field] = getattr(record, field)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        if hasattr(record, 'payload'):
+            line = f"{line} {record.payload}"
+        return line
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    # Runs in the calling thread: merge args into the message, render any
+    # traceback and note the current request, so the record is self-contained
+    # and cheap to copy across threads
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = _truncate(record.getMessage(), MAX_MESSAGE_CHARS)
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        record.stack_info = None
+        if has_request_context() and not hasattr(record, 'request'):
+            record.request = f"{request.method} {request.path}"
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc('log_records_dropped_total')
+
+
+def _build_targets():
+    targets = []
+    log_file = os.getenv("LOG_FILE", "app.log")
+    if log_file and os.getenv("LOG_ROTATION", "size").lower() == "external":
+        file_handler = WatchedFileHandler(log_file, encoding="utf-8")
+        file_handler.setFormatter(JSONFormatter())
+        targets.append(file_handler)
+    elif log_file:
+        file_handler = RotatingFileHandler(
+            log_file,
+            maxBytes=int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024)),
+            backupCount=int(os.getenv("LOG_BACKUPS", 5)),
+            encoding="utf-8",
+        )
+        file_handler.setFormatter(JSONFormatter())
+        targets.append(file_handler)
+
+    stdout_handler = logging.StreamHandler(sys.stdout)
+    if os.getenv("LOG_STDOUT_FORMAT", "text").lower() == "json":
+        stdout_handler.setFormatter(JSONFormatter())
+    else:
+        stdout_handler.setFormatter(TextFormatter(TEXT_FORMAT))
+    targets.append(stdout_handler)
+    return targets
+
+
+def _start_listener():
+    global _queue, _listener
+    _queue = queue.Queue(int(os.getenv("LOG_QUEUE_SIZE", 10000)))
+    _handler.queue = _queue
+    _listener = QueueListener(_queue, *_targets, respect_handler_level=True)
+    _listener.start()
+
+
+# Forked workers (gunicorn with preload_app) inherit the handler but not the
+# listener thread, and possibly a queue lock held at fork time: give each
+# child its own queue and listener
+def _after_fork_in_child():
+    if _handler is not None:
+        _start_listener()
+
+
+def _stop():
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+# Replace the root handlers with the queue handler; safe to call more than once
+def configure():
+    global _handler, _targets
+    with _lock:
+        if _handler is not None:
+            return
+        _targets = _build_targets()
+        _handler = _NonBlockingQueueHandler(queue.Queue())
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(_handler)
+        root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+        _start_listener()
+        atexit.register(_stop)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+# Log a large structure (e.g. a parsed upload) for a sample of calls only.
+# Nothing is serialized when the level is disabled or the call is not
+# sampled; the serialized form is compact and truncated.
+def log_payload(logger, message, payload, level=logging.INFO, sample_rate=None):
+    if not logger.isEnabledFor(level):
+        return
+    rate = PAYLOAD_SAMPLE_RATE if sample_rate is None else sample_rate
+    if rate <= 0 or (rate < 1 and random.random() >= rate):
+        return
+    text = json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=str)
+    logger.log(level, message, extra={
+        'payload': _truncate(text, PAYLOAD_MAX_CHARS),
+        'payload_chars': len(text),
+    })
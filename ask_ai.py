@@ -2,6 +2,7 @@ import os
 import json
 from google import genai
 from google.genai import types
+import metrics
 
 DB_SCHEMA = """
 Table: posts
@@ -37,6 +38,33 @@ Table: topic_posts
 Columns:
   - topic_id (int) COMPOSITE PRIMARY KEY
   - post_id (bigint) COMPOSITE PRIMARY KEY
+
+Rollup tables (small, precomputed sums over posts; use them instead of grouping posts
+for trends over time, weekday / posting-hour questions and per-topic monthly performance).
+Each has: posts (number of posts), likes, impressions, total_clicks, main_ebook_clicks,
+followers_gained — all SUMs. Averages are column / posts; CTR is main_ebook_clicks / impressions * 100.
+
+Table: rollup_daily
+Columns:
+  - day (date) PRIMARY KEY
+  - posts, likes, impressions, total_clicks, main_ebook_clicks, followers_gained
+
+Table: rollup_weekly
+Columns:
+  - week_start (date, Monday) PRIMARY KEY
+  - posts, likes, impressions, total_clicks, main_ebook_clicks, followers_gained
+
+Table: rollup_weekday_hour
+Columns:
+  - weekday (tinyint, 0 = Monday ... 6 = Sunday) COMPOSITE PRIMARY KEY
+  - hour (tinyint, 0-23) COMPOSITE PRIMARY KEY
+  - posts, likes, impressions, total_clicks, main_ebook_clicks, followers_gained
+
+Table: rollup_topic_monthly
+Columns:
+  - topic_id (int) COMPOSITE PRIMARY KEY
+  - month (date, first day of the month) COMPOSITE PRIMARY KEY
+  - posts, likes, impressions, total_clicks, main_ebook_clicks, followers_gained
 """
 
 SYSTEM_PROMPT = f"""
@@ -81,11 +109,12 @@ def generate_query(user_question):
         temperature=0.1
     )
 
-    response = client.models.generate_content(
-        model='gemini-2.5-flash',
-        contents=user_question,
-        config=config
-    )
+    with metrics.timed('external_request_duration_seconds', service='gemini'):
+        response = client.models.generate_content(
+            model='gemini-2.5-flash',
+            contents=user_question,
+            config=config
+        )
 
     raw = response.text.strip()
     if raw.startswith("```json"):
@@ -124,10 +153,11 @@ def analyze_results(user_question, sql_query, data):
         temperature=0.3
     )
 
-    response = client.models.generate_content(
-        model='gemini-2.5-flash',
-        contents=user_content,
-        config=config
-    )
+    with metrics.timed('external_request_duration_seconds', service='gemini'):
+        response = client.models.generate_content(
+            model='gemini-2.5-flash',
+            contents=user_content,
+            config=config
+        )
 
     return response.text.strip()
\ No newline at end of file
@@ -0,0 +1,78 @@
+import argparse
+import decimal
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_provider import FastJSONProvider
+
+# Serialization time of a /download-sized payload: the old per-row
+# stringify loop + Flask's default provider versus FastJSONProvider on rows
+# whose post_id was cast to text in SQL (as the routes now do). The
+# "fast_int_ids_ms" case shows the provider's fallback for raw 64-bit ids.
+# Usage: python benchmarks/bench_json.py --rows 100000
+
+
+def make_rows(count, ids_as_text=False):
+    start = datetime(2023, 1, 1, 9, 30)
+    return [{
+        'post_id': str(7100000000000000000 + i) if ids_as_text else 7100000000000000000 + i,
+        'post_url': f'https://www.linkedin.com/feed/update/urn:li:activity:{7100000000000000000 + i}/',
+        'media_url': f'{7100000000000000000 + i}.jpeg',
+        'post_datetime': start + timedelta(hours=i),
+        'caption': 'Grid and flexbox tips for frontend developers. ' * 20,
+        'likes': i % 500,
+        'comments': i % 40,
+        'impressions': i * 7 % 100000,
+        'main_ebook_clicks': i % 30,
+        'main_ebook_ctr': decimal.Decimal('1.25'),
+        'created_at': start + timedelta(hours=i, minutes=5),
+        'topics': ['Css', 'Grid'],
+    } for i in range(count)]
+
+
+def legacy_loop(rows):
+    for row in rows:
+        for key, value in row.items():
+            if key == 'post_id' and value is not None:
+                row[key] = str(value)
+            elif isinstance(value, datetime):
+                row[key] = value.isoformat()
+
+
+def run(row_count, repeat):
+    app = Flask(__name__)
+
+    def legacy():
+        rows = make_rows(row_count)
+        started = time.perf_counter()
+        legacy_loop(rows)
+        DefaultJSONProvider(app).response(rows)
+        return time.perf_counter() - started
+
+    def fast(ids_as_text=True):
+        rows = make_rows(row_count, ids_as_text=ids_as_text)
+        started = time.perf_counter()
+        FastJSONProvider(app).response(rows)
+        return time.perf_counter() - started
+
+    return {
+        'rows': row_count,
+        'legacy_ms': round(min(legacy() for _ in range(repeat)) * 1000, 2),
+        'fast_ms': round(min(fast() for _ in range(repeat)) * 1000, 2),
+        'fast_int_ids_ms': round(min(fast(False) for _ in range(repeat)) * 1000, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark JSON serialization of post rows")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, args.repeat), indent=2))
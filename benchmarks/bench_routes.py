@@ -0,0 +1,275 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from unittest import mock
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from generate_data import bench_db_config
+
+# Times every read route of app.py plus file_handler.handle_file against the
+# database filled by generate_data.py, through Flask's test client so no
+# server or network is involved. Each route is timed cold (the app's
+# in-memory indexes and page cache reset before every sample) and warm
+# (repeated calls served from those caches), reported under separate
+# labels. Results are written as JSON; pass an earlier results file as
+# --baseline to get the p50 change per case and label.
+# Usage: python benchmarks/bench_routes.py --repeat 20 --cold-repeat 5 --output results.json
+
+POST_SORTS = ["post_datetime", "likes", "comments", "impressions", "main_ebook_ctr", "main_ebook_clicks", "latest_post_datetime"]
+TOPIC_SORTS = ["post_count", "median_impressions", "median_likes", "median_comments", "last_posted"]
+FILTERS = {
+    "date_range": {"date_from": "2023-01-01", "date_to": "2023-06-30"},
+    "likes_range": {"likes_min": 50, "likes_max": 500},
+    "impressions_range": {"impressions_min": 1000, "impressions_max": 20000},
+    "comments_range": {"comments_min": 5, "comments_max": 50},
+}
+
+EXPORT_ROWS = [
+    ("Post URL", "https://www.linkedin.com/feed/update/urn:li:activity:{post_id}/"),
+    ("Post Date", "2024-03-14"),
+    ("Post Publish Time", "09:30"),
+    ("Impressions", "12,345"),
+    ("Members reached", "8,100"),
+    ("Reactions", "321"),
+    ("Comments", "17"),
+    ("Reposts", "9"),
+    ("Saves", "22"),
+    ("Sends on LinkedIn", "4"),
+    ("Profile viewers from this post", "40"),
+    ("Followers gained from this post", "6"),
+    ("Visits to links in this post", "88"),
+    ("https://flexicajourney.com/master-flexbox-and-grid", "51"),
+    ("top-job-titles", "Frontend Developer"),
+]
+
+POST_HTML = ('<html><head><meta property="og:description" content="fallback"></head><body>'
+             '<p class="attributed-text-segment-list__content">{caption}</p></body></html>')
+
+
+def load_app(config):
+    # app.py reads its connection settings at import time
+    os.environ.update({
+        "DB_HOST": config["host"], "DB_PORT": str(config["port"]), "DB_USER": config["user"] or "",
+        "DB_PASSWORD": config["password"] or "", "DB_NAME": config["database"],
+        "READ_ONLY_DB_USER": config["user"] or "", "READ_ONLY_DB_PASSWORD": config["password"] or "",
+    })
+    import app as webapp
+    webapp.app.config["SERVER_TIMING"] = True
+    return webapp
+
+
+def sample_ids(webapp):
+    with webapp.get_db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT COUNT(*) AS posts, MIN(post_id) AS first_post, MAX(post_id) AS last_post FROM posts")
+        summary = cursor.fetchone()
+        cursor.execute("""
+            SELECT topic_id, COUNT(*) AS post_count FROM topic_posts
+            GROUP BY topic_id ORDER BY post_count DESC
+        """)
+        topic_counts = cursor.fetchall()
+        cursor.execute("SELECT post_id FROM posts ORDER BY post_id LIMIT 1 OFFSET %s", (summary["posts"] // 2,))
+        middle_post = cursor.fetchone()["post_id"]
+        cursor.execute("SELECT COUNT(*) AS topics FROM topics")
+        summary.update(cursor.fetchone())
+    return {
+        "dataset": {"posts": summary["posts"], "topics": summary["topics"],
+                    "topic_posts": sum(t["post_count"] for t in topic_counts)},
+        "posts": [summary["first_post"], middle_post, summary["last_post"]],
+        "hot_topic": topic_counts[0]["topic_id"],
+        "median_topic": topic_counts[len(topic_counts) // 2]["topic_id"],
+        "tail_topic": topic_counts[-1]["topic_id"],
+    }
+
+
+def route_cases(ids):
+    cases = {}
+    for sort in POST_SORTS:
+        cases[f"api_posts sort={sort}"] = ("/api/posts", {"sort_by": sort})
+    cases["api_posts sort=likes asc"] = ("/api/posts", {"sort_by": "likes", "sort_order": "asc"})
+    for name, params in FILTERS.items():
+        cases[f"api_posts {name}"] = ("/api/posts", params)
+    cases["api_posts latest_date_range"] = ("/api/posts", {"latest_date_from": "2024-01-01", "latest_date_to": "2024-12-31"})
+    cases["api_posts deep_page"] = ("/api/posts", {"offset": 5000})
+    cases["api_posts hot_topic"] = ("/api/posts", {"topic_id": ids["hot_topic"], "caption_length": 150})
+    cases["api_posts tail_topic"] = ("/api/posts", {"topic_id": ids["tail_topic"], "caption_length": 150})
+
+    for sort in TOPIC_SORTS:
+        cases[f"api_topics_list sort={sort}"] = ("/api/topics-list", {"sort_by": sort})
+    for name, params in FILTERS.items():
+        cases[f"api_topics_list {name}"] = ("/api/topics-list", params)
+
+    cases["search_suggestions word"] = ("/api/search-suggestions", {"query": "grid"})
+    cases["search_suggestions phrase"] = ("/api/search-suggestions", {"query": "flexbox layout tips"})
+    cases["search_suggestions digits"] = ("/api/search-suggestions", {"query": str(ids["posts"][1])[-6:]})
+
+    for label, post_id in zip(("first", "middle", "last"), ids["posts"]):
+        cases[f"post_page {label}"] = (f"/post/{post_id}", {})
+    for label in ("hot", "median", "tail"):
+        cases[f"topic_page {label}"] = (f"/topic/{ids[label + '_topic']}", {})
+    cases["download"] = ("/download", {})
+    return cases
+
+
+def timing_summary(samples):
+    ms = np.array(samples) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "min_ms": round(float(ms.min()), 2),
+        "mean_ms": round(float(ms.mean()), 2),
+    }
+
+
+def db_queries(response):
+    # metrics.py reports `db;dur=..;desc="N queries"` when SERVER_TIMING is on
+    for entry in response.headers.get("Server-Timing", "").split(","):
+        if entry.strip().startswith("db;") and 'desc="' in entry:
+            return int(entry.split('desc="')[1].split()[0])
+    return None
+
+
+# Drop everything the app derives from the database, as after a save in another worker
+def reset_caches(webapp):
+    webapp.reset_derived_state()
+    webapp.page_cache.invalidate_all()
+
+
+def time_route(webapp, client, path, params, repeat, cold_repeat):
+    def call():
+        started = time.perf_counter()
+        response = client.get(path, query_string=params)
+        body = response.get_data()  # drains streamed responses such as /download
+        return time.perf_counter() - started, response, len(body)
+
+    cold_samples = []
+    for _ in range(cold_repeat):
+        reset_caches(webapp)
+        elapsed, response, size = call()
+        cold_samples.append(elapsed)
+    cold_queries = db_queries(response)
+
+    call()  # the first call after the last reset may still fill caches
+    warm_samples = []
+    for _ in range(repeat):
+        elapsed, response, size = call()
+        warm_samples.append(elapsed)
+    return {
+        "status": response.status_code,
+        "bytes": size,
+        "cold": {**timing_summary(cold_samples), "db_queries": cold_queries},
+        "warm": {**timing_summary(warm_samples), "db_queries": db_queries(response)},
+    }
+
+
+def write_export(directory, index):
+    path = os.path.join(directory, f"export_{index}.csv")
+    post_id = 7200000000000000000 + index
+    with open(path, "w", encoding="utf-8-sig") as f:
+        f.write("Post Performance,\n")
+        for key, value in EXPORT_ROWS:
+            f.write(f'{key},"{value.format(post_id=post_id)}"\n')
+    return path
+
+
+def time_handle_file(webapp, repeat):
+    import file_handler
+
+    caption = " ".join(["Grid and flexbox tips for frontend developers."] * 40)
+    page = mock.Mock(text=POST_HTML.format(caption=caption), raise_for_status=lambda: None)
+    samples = []
+    with tempfile.TemporaryDirectory() as directory, webapp.app.app_context(), \
+            mock.patch.object(file_handler.requests, "get", return_value=page), \
+            mock.patch.object(file_handler, "download_media_by_id", return_value=None):
+        exports = [write_export(directory, i) for i in range(repeat + 1)]
+        result = file_handler.handle_file(exports[0])
+        if "error" in result:
+            return {"error": result["error"]}
+        for path in exports[1:]:
+            started = time.perf_counter()
+            file_handler.handle_file(path)
+            samples.append(time.perf_counter() - started)
+    return timing_summary(samples)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _compare_timing(result, before):
+    if before.get("p50_ms") and "p50_ms" in result:
+        result["baseline_p50_ms"] = before["p50_ms"]
+        result["change_pct"] = round((result["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100, 1)
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    for name, result in results.items():
+        before = baseline.get(name, {})
+        _compare_timing(result, before)
+        for label in ("cold", "warm"):
+            if label in result and isinstance(before.get(label), dict):
+                _compare_timing(result[label], before[label])
+
+
+def run(repeat, download_repeat, cold_repeat, only=None, baseline=None):
+    webapp = load_app(bench_db_config())
+    client = webapp.app.test_client()
+    ids = sample_ids(webapp)
+
+    results = {}
+    for name, (path, params) in route_cases(ids).items():
+        if only and only not in name:
+            continue
+        if name == "download":
+            results[name] = time_route(webapp, client, path, params, download_repeat, min(cold_repeat, download_repeat))
+        else:
+            results[name] = time_route(webapp, client, path, params, repeat, cold_repeat)
+    if not only or only == "handle_file":
+        results["handle_file"] = time_handle_file(webapp, repeat)
+    if baseline:
+        compare(results, baseline)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "repeat": repeat,
+            "cold_repeat": cold_repeat,
+            "dataset": ids["dataset"],
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark app routes against the synthetic dataset")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--download-repeat", type=int, default=3)
+    parser.add_argument("--cold-repeat", type=int, default=5,
+                        help="samples per route with the app caches reset first (default: 5)")
+    parser.add_argument("--only", help="run only cases whose name contains this text")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--output", help="write results here instead of stdout")
+    args = parser.parse_args()
+
+    report = run(args.repeat, args.download_repeat, args.cold_repeat, args.only, args.baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
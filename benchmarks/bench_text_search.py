@@ -0,0 +1,107 @@
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import text_search
+
+# Query latency of the caption TF-IDF index on synthetic captions.
+# Usage: python benchmarks/bench_text_search.py --captions 50000 --queries 200
+
+
+class RowsCursor:
+    def __init__(self, rows):
+        self._rows = rows
+        self._pos = 0
+
+    def execute(self, query, params=None):
+        self._pos = 0
+
+    def fetchmany(self, size):
+        rows = self._rows[self._pos:self._pos + size]
+        self._pos += size
+        return rows
+
+
+def make_vocabulary(size, rng):
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    words = set()
+    while len(words) < size:
+        length = int(rng.integers(3, 11))
+        words.add(''.join(rng.choice(letters, length)))
+    return sorted(words)
+
+
+def make_captions(count, vocabulary, rng):
+    # Zipf-distributed word choice gives a realistic long-tail vocabulary
+    ranks = np.minimum(rng.zipf(1.15, size=count * 160), len(vocabulary)) - 1
+    lengths = rng.integers(20, 300, size=count)
+    captions = []
+    pos = 0
+    for length in lengths:
+        captions.append(' '.join(vocabulary[r] for r in ranks[pos:pos + length]))
+        pos += length
+        if pos + 300 > len(ranks):
+            pos = 0
+    return captions
+
+
+def percentiles(samples):
+    ms = np.array(samples) * 1000
+    return {"p50_ms": round(float(np.percentile(ms, 50)), 3),
+            "p95_ms": round(float(np.percentile(ms, 95)), 3),
+            "max_ms": round(float(ms.max()), 3)}
+
+
+def run(captions_count, queries, seed=7):
+    rng = np.random.default_rng(seed)
+    vocabulary = make_vocabulary(20000, rng)
+    captions = make_captions(captions_count, vocabulary, rng)
+    rows = [{"post_id": 7000000000000000000 + i, "caption": c} for i, c in enumerate(captions)]
+
+    started = time.perf_counter()
+    text_search.rebuild(RowsCursor(rows))
+    text_search.search("warmup")
+    build_s = time.perf_counter() - started
+
+    search_times = []
+    for _ in range(queries):
+        ranks = np.minimum(rng.zipf(1.15, size=int(rng.integers(1, 5))), len(vocabulary)) - 1
+        words = [vocabulary[r] for r in ranks]
+        started = time.perf_counter()
+        text_search.search(' '.join(words))
+        search_times.append(time.perf_counter() - started)
+
+    similar_times = []
+    for i in rng.integers(0, captions_count, size=queries):
+        started = time.perf_counter()
+        text_search.similar_to(rows[int(i)]["post_id"])
+        similar_times.append(time.perf_counter() - started)
+
+    add_times = []
+    for i, caption in enumerate(make_captions(20, vocabulary, rng)):
+        started = time.perf_counter()
+        text_search.add_post(8000000000000000000 + i, caption)
+        text_search.search("warmup")
+        add_times.append(time.perf_counter() - started)
+
+    return {
+        "captions": captions_count,
+        "entries": int(len(text_search._terms) + text_search._pending_entries),
+        "build_s": round(build_s, 3),
+        "search": percentiles(search_times),
+        "similar_to": percentiles(similar_times),
+        "add_then_query": percentiles(add_times),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the caption text index")
+    parser.add_argument("--captions", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps(run(args.captions, args.queries), indent=2))
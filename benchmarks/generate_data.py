@@ -0,0 +1,179 @@
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+import mysql.connector
+import numpy as np
+from dotenv import load_dotenv
+
+from bench_text_search import make_captions, make_vocabulary
+
+# Fills a scratch MySQL database with a synthetic dataset shaped like the
+# production one: long Zipf-worded captions, log-normal engagement, and a
+# skewed topic_posts distribution where a few topics hold most posts.
+# The target database is taken from BENCH_DB_* (never DB_NAME), so the
+# generator cannot be pointed at the real data by accident.
+# Usage: python benchmarks/generate_data.py --posts 100000 --topics 5000 --reset
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS posts (
+        post_id BIGINT PRIMARY KEY,
+        post_url VARCHAR(500),
+        media_url VARCHAR(500),
+        post_datetime DATETIME,
+        caption LONGTEXT,
+        likes INT, comments INT, impressions INT, members_reached INT,
+        total_clicks INT, main_ebook_clicks INT, lead_magnet_clicks INT,
+        profile_viewers INT, followers_gained INT, reactions INT,
+        reposts INT, saves INT, sends INT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        main_ebook_ctr DECIMAL(6,2)
+    )""",
+    """CREATE TABLE IF NOT EXISTS topics (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(255) UNIQUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""",
+    """CREATE TABLE IF NOT EXISTS topic_posts (
+        topic_id INT,
+        post_id BIGINT,
+        PRIMARY KEY (topic_id, post_id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS graphic_desc (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(255) UNIQUE
+    )""",
+    """CREATE TABLE IF NOT EXISTS graphic_desc_posts (
+        post_id BIGINT,
+        graphic_desc_id INT,
+        PRIMARY KEY (post_id, graphic_desc_id)
+    )""",
+]
+
+TABLES = ["graphic_desc_posts", "graphic_desc", "topic_posts", "topics", "posts"]
+BATCH_SIZE = 2000
+FIRST_POST_ID = 7100000000000000000
+
+
+def bench_db_config():
+    load_dotenv()
+    config = {
+        "host": os.getenv("BENCH_DB_HOST", "localhost"),
+        "port": int(os.getenv("BENCH_DB_PORT", 3306)),
+        "user": os.getenv("BENCH_DB_USER", os.getenv("DB_USER")),
+        "password": os.getenv("BENCH_DB_PASSWORD", os.getenv("DB_PASSWORD")),
+        "database": os.getenv("BENCH_DB_NAME"),
+    }
+    if not config["database"]:
+        sys.exit("Set BENCH_DB_NAME to a scratch database before generating benchmark data.")
+    return config
+
+
+def insert_batches(conn, query, rows):
+    cursor = conn.cursor()
+    for start in range(0, len(rows), BATCH_SIZE):
+        cursor.executemany(query, rows[start:start + BATCH_SIZE])
+        conn.commit()
+    cursor.close()
+
+
+def make_posts(count, vocabulary, rng):
+    captions = make_captions(count, vocabulary, rng)
+    start = datetime(2022, 1, 1, 8, 0)
+    span_minutes = 3 * 365 * 24 * 60
+    offsets = np.sort(rng.integers(0, span_minutes, size=count))
+    ids = FIRST_POST_ID + np.cumsum(rng.integers(1, 10 ** 9, size=count))
+    impressions = rng.lognormal(8, 1.1, size=count).astype(int)
+
+    rows = []
+    for i in range(count):
+        post_id = int(ids[i])
+        views = int(impressions[i])
+        likes = int(views * rng.uniform(0.005, 0.04))
+        clicks = int(views * rng.uniform(0, 0.01))
+        posted = start + timedelta(minutes=int(offsets[i]))
+        rows.append((
+            post_id,
+            f"https://www.linkedin.com/feed/update/urn:li:activity:{post_id}/",
+            f"{post_id}.jpeg",
+            posted,
+            captions[i],
+            likes, int(likes * rng.uniform(0.02, 0.2)), views, int(views * 0.7),
+            clicks * 2, clicks, 0,
+            int(views * 0.002), int(views * 0.001), likes,
+            int(likes * 0.05), int(likes * 0.08), int(likes * 0.03),
+            posted + timedelta(minutes=5),
+            round(clicks / views * 100, 2) if views else 0,
+        ))
+    return rows
+
+
+def make_memberships(post_ids, topic_count, max_per_post, rng):
+    # Zipf over topic ranks: the head topics collect most of the posts
+    pairs = []
+    for post_id in post_ids:
+        wanted = int(rng.integers(1, max_per_post + 1))
+        ranks = set(int(r) for r in (rng.zipf(1.3, size=wanted * 2) - 1) % topic_count + 1)
+        for rank in list(ranks)[:wanted]:
+            pairs.append((rank, post_id))
+    return pairs
+
+
+def generate(config, posts, topics, graphic_descs, reset, seed):
+    rng = np.random.default_rng(seed)
+    vocabulary = make_vocabulary(max(20000, topics * 2), rng)
+    conn = mysql.connector.connect(**config)
+    cursor = conn.cursor()
+    for statement in SCHEMA:
+        cursor.execute(statement)
+    if reset:
+        for table in TABLES:
+            cursor.execute(f"TRUNCATE TABLE {table}")
+    conn.commit()
+
+    timings = {}
+    started = time.perf_counter()
+    names = [word.title() for word in rng.choice(vocabulary, size=topics, replace=False)]
+    insert_batches(conn, "INSERT INTO topics (id, name) VALUES (%s, %s)",
+                   [(i + 1, name) for i, name in enumerate(names)])
+    insert_batches(conn, "INSERT INTO graphic_desc (id, name) VALUES (%s, %s)",
+                   [(i + 1, f"Graphic style {i + 1}") for i in range(graphic_descs)])
+    timings["lookups_s"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    post_rows = make_posts(posts, vocabulary, rng)
+    insert_batches(conn, f"INSERT INTO posts (post_id, post_url, media_url, post_datetime, caption, likes, comments, impressions, members_reached, total_clicks, main_ebook_clicks, lead_magnet_clicks, profile_viewers, followers_gained, reactions, reposts, saves, sends, created_at, main_ebook_ctr) VALUES ({', '.join(['%s'] * 20)})", post_rows)
+    timings["posts_s"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    post_ids = [row[0] for row in post_rows]
+    topic_pairs = make_memberships(post_ids, topics, 5, rng)
+    insert_batches(conn, "INSERT INTO topic_posts (topic_id, post_id) VALUES (%s, %s)", topic_pairs)
+    desc_pairs = [(post_id, desc_id) for desc_id, post_id in make_memberships(post_ids, graphic_descs, 2, rng)]
+    insert_batches(conn, "INSERT INTO graphic_desc_posts (post_id, graphic_desc_id) VALUES (%s, %s)", desc_pairs)
+    timings["links_s"] = time.perf_counter() - started
+
+    cursor.close()
+    conn.close()
+    return {
+        "database": config["database"],
+        "posts": posts,
+        "topics": topics,
+        "topic_posts": len(topic_pairs),
+        "graphic_desc_posts": len(desc_pairs),
+        "seed": seed,
+        **{k: round(v, 1) for k, v in timings.items()},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic dataset for the benchmark suite")
+    parser.add_argument("--posts", type=int, default=100000)
+    parser.add_argument("--topics", type=int, default=5000)
+    parser.add_argument("--graphic-descs", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--reset", action="store_true", help="truncate the benchmark tables first")
+    args = parser.parse_args()
+    print(json.dumps(generate(bench_db_config(), args.posts, args.topics, args.graphic_descs, args.reset, args.seed), indent=2))
@@ -0,0 +1,115 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, request
+import metrics
+
+# Small in-process read-through cache for read routes. Entries are keyed by
+# endpoint, view arguments and query string, expire after a TTL and are
+# evicted least-recently-used once MAX_ENTRIES is reached. Writers call
+# invalidate() for the endpoints whose data they changed.
+
+DEFAULT_TTL = 300
+MAX_ENTRIES = 512
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # key -> (expires_at, body, status, mimetype)
+_stats = {}               # endpoint -> {'hits': n, 'misses': n}
+
+metrics.describe('response_cache_hits_total', 'counter', 'Lookup endpoint cache hits.')
+metrics.describe('response_cache_misses_total', 'counter', 'Lookup endpoint cache misses.')
+
+
+def _key(endpoint, view_args):
+    args = tuple(sorted(request.args.items(multi=True)))
+    return (endpoint, tuple(sorted(view_args.items())), args)
+
+
+def _count(endpoint, outcome):
+    counters = _stats.setdefault(endpoint, {'hits': 0, 'misses': 0})
+    counters[outcome] += 1
+    metrics.inc(f'response_cache_{outcome}_total', endpoint=endpoint)
+
+
+def _get(key):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            _count(key[0], 'misses')
+            return None
+        if entry[0] < time.monotonic():
+            del _entries[key]
+            _count(key[0], 'misses')
+            return None
+        _entries.move_to_end(key)
+        _count(key[0], 'hits')
+        return entry
+
+
+def _put(key, entry):
+    with _lock:
+        _entries[key] = entry
+        _entries.move_to_end(key)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+
+
+# Decorator: cache the body of successful responses for `ttl` seconds
+def cached(ttl=DEFAULT_TTL):
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = _key(request.endpoint, kwargs)
+            entry = _get(key)
+            if entry is not None:
+                _, body, status, mimetype = entry
+                return current_app.response_class(body, status=status, mimetype=mimetype)
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                _put(key, (time.monotonic() + ttl, response.get_data(), response.status_code, response.mimetype))
+            return response
+        return wrapper
+    return decorator
+
+
+def invalidate(*endpoints):
+    with _lock:
+        if not endpoints:
+            _entries.clear()
+            return
+        for key in [k for k in _entries if k[0] in endpoints]:
+            del _entries[key]
+
+
+def stats():
+    with _lock:
+        endpoints = {name: dict(counters) for name, counters in _stats.items()}
+        for key in _entries:
+            endpoints.setdefault(key[0], {'hits': 0, 'misses': 0})
+            endpoints[key[0]]['entries'] = endpoints[key[0]].get('entries', 0) + 1
+        return {
+            'entries': len(_entries),
+            'max_entries': MAX_ENTRIES,
+            'hits': sum(c['hits'] for c in _stats.values()),
+            'misses': sum(c['misses'] for c in _stats.values()),
+            'endpoints': endpoints,
+        }
+
+
+# Totals over the stats() of several worker processes
+def combine(worker_stats):
+    endpoints = {}
+    for stats in worker_stats:
+        for name, counters in stats['endpoints'].items():
+            total = endpoints.setdefault(name, {'hits': 0, 'misses': 0})
+            for field, value in counters.items():
+                total[field] = total.get(field, 0) + value
+    return {
+        'entries': sum(stats['entries'] for stats in worker_stats),
+        'max_entries': MAX_ENTRIES * len(worker_stats),
+        'hits': sum(stats['hits'] for stats in worker_stats),
+        'misses': sum(stats['misses'] for stats in worker_stats),
+        'endpoints': endpoints,
+    }
@@ -0,0 +1,256 @@
+import math
+import threading
+from datetime import datetime
+import numpy as np
+
+# Columnar in-memory snapshot of the numeric post columns plus topic
+# membership, for the analytical views (topic stats, topics list). Metrics
+# are float64 with NaN for NULL; dates are datetime64[s] with NaT for NULL.
+# Membership is kept as appendable (topic, row) pairs and turned into a
+# CSR layout (topic ids, indptr, rows) on demand after changes, so grouped
+# counts, maxima, means and percentiles are computed with whole-array ops.
+
+METRICS = ('likes', 'impressions', 'comments', 'main_ebook_clicks', 'main_ebook_ctr')
+FETCH_BATCH_SIZE = 5000
+
+_lock = threading.RLock()
+_loaded = False
+_dirty = True
+
+_row_index = {}          # post_id -> row
+_post_ids = np.zeros(0, dtype=np.int64)
+_dates = np.zeros(0, dtype='datetime64[s]')
+_metrics = {name: np.zeros(0, dtype=np.float64) for name in METRICS}
+_topic_names = {}        # topic_id -> name
+
+# Membership pairs in insertion order
+_pair_topics = np.zeros(0, dtype=np.int64)
+_pair_rows = np.zeros(0, dtype=np.int64)
+
+# CSR view derived from the pairs: rows of topic _topics[i] are
+# _rows[_indptr[i]:_indptr[i + 1]]
+_topics = np.zeros(0, dtype=np.int64)
+_indptr = np.zeros(1, dtype=np.int64)
+_rows = np.zeros(0, dtype=np.int64)
+
+
+def _float(value):
+    try:
+        return float(value) if value not in (None, '') else math.nan
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _datetime64(value):
+    if isinstance(value, str) and value:
+        value = datetime.fromisoformat(value)
+    return np.datetime64(value, 's') if value else np.datetime64('NaT', 's')
+
+
+def _finalize():
+    global _dirty, _topics, _indptr, _rows
+    if not _dirty:
+        return
+    order = np.argsort(_pair_topics, kind='stable')
+    sorted_topics = _pair_topics[order]
+    _topics, counts = np.unique(sorted_topics, return_counts=True)
+    _indptr = np.concatenate(([0], np.cumsum(counts)))
+    _rows = _pair_rows[order]
+    _dirty = False
+
+
+def rebuild(cursor):
+    global _loaded, _dirty, _row_index, _post_ids, _dates, _metrics, _topic_names, _pair_topics, _pair_rows
+    cursor.execute(f"SELECT post_id, post_datetime, {', '.join(METRICS)} FROM posts")
+    post_ids, dates, columns = [], [], {name: [] for name in METRICS}
+    while True:
+        batch = cursor.fetchmany(FETCH_BATCH_SIZE)
+        if not batch:
+            break
+        for row in batch:
+            post_ids.append(row['post_id'])
+            dates.append(row['post_datetime'])
+            for name in METRICS:
+                columns[name].append(_float(row[name]))
+
+    row_index = {post_id: i for i, post_id in enumerate(post_ids)}
+
+    cursor.execute("SELECT tp.topic_id, tp.post_id FROM topic_posts tp")
+    topics, rows = [], []
+    for row in cursor.fetchall():
+        i = row_index.get(row['post_id'])
+        if i is not None:
+            topics.append(row['topic_id'])
+            rows.append(i)
+
+    cursor.execute("SELECT id, name FROM topics")
+    names = {row['id']: row['name'] for row in cursor.fetchall()}
+
+    with _lock:
+        _row_index = row_index
+        _post_ids = np.array(post_ids, dtype=np.int64)
+        _dates = np.array([_datetime64(d) for d in dates], dtype='datetime64[s]')
+        _metrics = {name: np.array(values, dtype=np.float64) for name, values in columns.items()}
+        _topic_names = names
+        _pair_topics = np.array(topics, dtype=np.int64)
+        _pair_rows = np.array(rows, dtype=np.int64)
+        _dirty = True
+        _loaded = True
+
+
+def is_loaded():
+    return _loaded
+
+
+def ensure_loaded(cursor):
+    if not _loaded:
+        rebuild(cursor)
+
+
+# Drop the snapshot so the next ensure_loaded rebuilds it from the database
+def invalidate():
+    global _loaded
+    with _lock:
+        _loaded = False
+
+
+# Add or replace one post; `topics` is a list of (topic_id, name)
+def add_post(post_id, post_data, topics):
+    global _post_ids, _dates, _pair_topics, _pair_rows, _dirty
+    if not _loaded:
+        return
+    post_id = int(post_id)
+    with _lock:
+        row = _row_index.get(post_id)
+        if row is None:
+            row = len(_post_ids)
+            _row_index[post_id] = row
+            _post_ids = np.append(_post_ids, post_id)
+            _dates = np.append(_dates, _datetime64(post_data.get('post_datetime')))
+            for name in METRICS:
+                _metrics[name] = np.append(_metrics[name], _float(post_data.get(name)))
+        else:
+            _dates[row] = _datetime64(post_data.get('post_datetime'))
+            for name in METRICS:
+                _metrics[name][row] = _float(post_data.get(name))
+            keep = _pair_rows != row
+            _pair_topics, _pair_rows = _pair_topics[keep], _pair_rows[keep]
+
+        topic_ids = [int(topic_id) for topic_id, _ in topics]
+        for topic_id, name in topics:
+            _topic_names[int(topic_id)] = name
+        _pair_topics = np.concatenate((_pair_topics, np.array(topic_ids, dtype=np.int64)))
+        _pair_rows = np.concatenate((_pair_rows, np.full(len(topic_ids), row, dtype=np.int64)))
+        _dirty = True
+
+
+# ----------- Vectorized operations -----------
+
+# Per-group q-th percentile (0-100, linear interpolation) ignoring NaN, for
+# values laid out group by group as described by `indptr`; NaN for empty groups
+def group_percentile(values, indptr, q):
+    groups = len(indptr) - 1
+    group_ids = np.repeat(np.arange(groups), np.diff(indptr))
+    order = np.lexsort((values, group_ids))  # NaN sorts last inside each group
+    ordered = values[order]
+    valid = np.add.reduceat((~np.isnan(values)).astype(np.int64), indptr[:-1]) if len(values) else np.zeros(groups, dtype=np.int64)
+    valid = np.where(np.diff(indptr) > 0, valid, 0)
+
+    result = np.full(groups, np.nan)
+    has = valid > 0
+    position = (valid[has] - 1) * (q / 100.0)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.ceil(position).astype(np.int64)
+    starts = indptr[:-1][has]
+    low_values = ordered[starts + lower]
+    high_values = ordered[starts + upper]
+    result[has] = low_values + (high_values - low_values) * (position - lower)
+    return result
+
+
+def group_mean(values, indptr):
+    counts = np.diff(indptr)
+    if not len(values):
+        return np.full(len(counts), np.nan)
+    valid = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(valid, values, 0), indptr[:-1])
+    valid_counts = np.add.reduceat(valid.astype(np.int64), indptr[:-1])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where((counts > 0) & (valid_counts > 0), sums / valid_counts, np.nan)
+
+
+def group_max_date(indptr, rows):
+    counts = np.diff(indptr)
+    result = np.full(len(counts), np.datetime64('NaT', 's'))
+    if len(rows):
+        seconds = _dates[rows].astype(np.int64).astype(np.float64)
+        seconds[np.isnat(_dates[rows])] = -np.inf
+        latest = np.maximum.reduceat(seconds, indptr[:-1])
+        ok = (counts > 0) & np.isfinite(latest)
+        result[ok] = latest[ok].astype(np.int64).astype('datetime64[s]')
+    return result
+
+
+def topic_rows(topic_id):
+    with _lock:
+        _finalize()
+        i = np.searchsorted(_topics, topic_id)
+        if i >= len(_topics) or _topics[i] != topic_id:
+            return np.zeros(0, dtype=np.int64)
+        return _rows[_indptr[i]:_indptr[i + 1]]
+
+
+# count / last date / mean, p50, p90 of the given metrics for one topic
+def topic_summary(topic_id, metrics=('likes', 'impressions', 'comments')):
+    with _lock:
+        rows = topic_rows(topic_id)
+        indptr = np.array([0, len(rows)])
+        summary = {
+            'total_posts': len(rows),
+            'last_post_datetime': to_python(group_max_date(indptr, rows)[0]),
+        }
+        for name in metrics:
+            values = _metrics[name][rows]
+            summary[f'avg_{name}'] = to_python(group_mean(values, indptr)[0])
+            summary[f'median_{name}'] = to_python(group_percentile(values, indptr, 50)[0])
+            summary[f'p90_{name}'] = to_python(group_percentile(values, indptr, 90)[0])
+    return summary
+
+
+# One entry per topic with posts: ids, counts, last date and medians, as arrays
+def topics_table(metrics=('impressions', 'likes', 'comments')):
+    with _lock:
+        _finalize()
+        table = {
+            'id': _topics.copy(),
+            'post_count': np.diff(_indptr),
+            'last_posted': group_max_date(_indptr, _rows),
+        }
+        for name in metrics:
+            values = _metrics[name][_rows]
+            table[f'median_{name}'] = group_percentile(values, _indptr, 50)
+            table[f'p90_{name}'] = group_percentile(values, _indptr, 90)
+            table[f'avg_{name}'] = group_mean(values, _indptr)
+        table['name'] = np.array([_topic_names.get(int(t), '') for t in _topics], dtype=object)
+    return table
+
+
+# Stable sort of `keys`, NaN / NaT always last, as the list views expect
+def order_by(keys, descending=False):
+    if np.issubdtype(keys.dtype, np.datetime64):
+        missing = np.isnat(keys)
+        keys = keys.astype(np.int64).astype(np.float64)
+    else:
+        keys = keys.astype(np.float64)
+        missing = np.isnan(keys)
+    keys = np.where(missing, np.inf, -keys if descending else keys)
+    return np.argsort(keys, kind='stable')
+
+
+def to_python(value):
+    if isinstance(value, np.datetime64):
+        return None if np.isnat(value) else value.astype(datetime)
+    value = float(value)
+    if math.isnan(value):
+        return None
+    return int(value) if value.is_integer() else value
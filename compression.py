@@ -0,0 +1,126 @@
+import gzip
+import os
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Transparent response compression negotiated through Accept-Encoding.
+# Buffered responses are compressed once they pass COMPRESS_MIN_SIZE;
+# streamed responses (chunked exports) are compressed chunk by chunk.
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'text/css',
+    'text/html',
+    'text/javascript',
+    'text/plain',
+}
+
+
+class _GzipStream:
+    def __init__(self, level):
+        # wbits=31 writes a gzip container rather than a raw zlib stream
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+
+class _BrotliStream:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+def _choose_encoding():
+    available = ['gzip']
+    if brotli is not None:
+        available.insert(0, 'br')
+    return request.accept_encodings.best_match(available)
+
+
+# Iterable rather than a generator so close() reaches the wrapped body even
+# when the client goes away before the first chunk (closing an unstarted
+# generator skips its finally block)
+class _CompressedChunks:
+    def __init__(self, chunks, stream):
+        self._chunks = chunks
+        self._compressed = self._compress(chunks, stream)
+
+    @staticmethod
+    def _compress(chunks, stream):
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = stream.compress(chunk)
+            if data:
+                yield data
+        yield stream.flush()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._compressed)
+
+    def close(self):
+        self._compressed.close()
+        if hasattr(self._chunks, 'close'):
+            self._chunks.close()
+
+
+def init_app(app):
+    app.config.setdefault('COMPRESS_LEVEL', int(os.getenv('COMPRESS_LEVEL', 6)))
+    app.config.setdefault('COMPRESS_BROTLI_QUALITY', int(os.getenv('COMPRESS_BROTLI_QUALITY', 5)))
+    app.config.setdefault('COMPRESS_MIN_SIZE', int(os.getenv('COMPRESS_MIN_SIZE', 1024)))
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = _choose_encoding()
+        if not encoding:
+            return response
+
+        if encoding == 'br':
+            stream = _BrotliStream(app.config['COMPRESS_BROTLI_QUALITY'])
+        else:
+            stream = _GzipStream(app.config['COMPRESS_LEVEL'])
+
+        if response.is_streamed:
+            response.response = _CompressedChunks(response.response, stream)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < app.config['COMPRESS_MIN_SIZE']:
+                return response
+            if encoding == 'br':
+                response.set_data(brotli.compress(data, quality=app.config['COMPRESS_BROTLI_QUALITY']))
+            else:
+                response.set_data(gzip.compress(data, compresslevel=app.config['COMPRESS_LEVEL'], mtime=0))
+
+        response.headers['Content-Encoding'] = encoding
+
+        # A strong ETag names exact bytes, so the compressed body needs its own
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(f"{etag}-{encoding}")
+        return response
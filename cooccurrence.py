@@ -0,0 +1,106 @@
+import threading
+
+# Sparse topic x topic co-occurrence counts (how many posts carry both
+# topics), kept in memory and updated as posts are saved. Each topic's
+# ranked list of related topics is cached until one of its counts changes.
+
+TOP_N = 10
+
+_lock = threading.Lock()
+_loaded = False
+
+_counts = {}         # topic_id -> {other_topic_id: shared post count}
+_names = {}          # topic_id -> name
+_ids_by_name = {}    # lowercased name -> topic_id
+_ranked = {}         # topic_id -> [(count, other_topic_id), ...], best first
+
+
+def _add_pair_counts(topic_ids):
+    topic_ids = set(topic_ids)
+    for a in topic_ids:
+        row = _counts.setdefault(a, {})
+        for b in topic_ids:
+            if a != b:
+                row[b] = row.get(b, 0) + 1
+        _ranked.pop(a, None)
+
+
+def _ranked_for(topic_id):
+    ranked = _ranked.get(topic_id)
+    if ranked is None:
+        row = _counts.get(topic_id, {})
+        ranked = sorted(((count, other) for other, count in row.items()), key=lambda r: (-r[0], r[1]))[:TOP_N]
+        _ranked[topic_id] = ranked
+    return ranked
+
+
+def rebuild(cursor):
+    global _loaded
+    cursor.execute("SELECT id, name FROM topics")
+    topic_rows = cursor.fetchall()
+    cursor.execute("SELECT post_id, topic_id FROM topic_posts ORDER BY post_id")
+    membership_rows = cursor.fetchall()
+
+    topics_by_post = {}
+    for row in membership_rows:
+        topics_by_post.setdefault(row['post_id'], []).append(row['topic_id'])
+
+    with _lock:
+        _counts.clear()
+        _names.clear()
+        _ids_by_name.clear()
+        _ranked.clear()
+        for row in topic_rows:
+            _names[row['id']] = row['name']
+            _ids_by_name[row['name'].lower()] = row['id']
+        for topic_ids in topics_by_post.values():
+            _add_pair_counts(topic_ids)
+        _loaded = True
+
+
+def is_loaded():
+    return _loaded
+
+
+def ensure_loaded(cursor):
+    if not _loaded:
+        rebuild(cursor)
+
+
+# Drop the index so the next ensure_loaded rebuilds it from the database
+def invalidate():
+    global _loaded
+    with _lock:
+        _loaded = False
+
+
+def add_post(topics):
+    # topics: list of (topic_id, name) pairs for the saved post
+    with _lock:
+        if not _loaded:
+            return
+        for topic_id, name in topics:
+            _names[topic_id] = name
+            _ids_by_name[name.lower()] = topic_id
+        _add_pair_counts(topic_id for topic_id, _ in topics)
+
+
+def related_topics(topic_id, limit=TOP_N):
+    with _lock:
+        return [
+            {'id': other, 'name': _names.get(other), 'post_count': count}
+            for count, other in _ranked_for(topic_id)[:limit]
+        ]
+
+
+# Topics that most often appear alongside the given topic names
+def suggest(names, limit=TOP_N):
+    with _lock:
+        selected = {_ids_by_name[n.lower()] for n in names if n.lower() in _ids_by_name}
+        scores = {}
+        for topic_id in selected:
+            for count, other in _ranked_for(topic_id):
+                if other not in selected:
+                    scores[other] = scores.get(other, 0) + count
+        ranked = sorted(scores.items(), key=lambda s: (-s[1], s[0]))[:limit]
+        return [{'id': other, 'name': _names.get(other), 'score': score} for other, score in ranked]
@@ -0,0 +1,246 @@
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from flask import current_app, request
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# A global data version that save_post bumps after every commit. Read-only
+# JSON routes use it as their ETag / Last-Modified so repeat requests can be
+# answered with 304 Not Modified before any query runs.
+#
+# The version lives in a small stamp file so every worker process sees the
+# same one. Each request stats the file; when another process has bumped it,
+# the change is replayed here: a bump may carry a delta (e.g. the saved post)
+# that is appended to DELTA_FILE before the stamp moves, and the delta
+# listeners apply each missed one in order so the in-memory indexes are
+# updated incrementally. When a delta is missing (new epoch, bump without a
+# delta, file trimmed) the reset listeners run instead and everything derived
+# is dropped. The process only takes on the new version once the replay has
+# finished, so its new ETag is never served with the old indexes.
+
+STATE_FILE = os.getenv("DATA_VERSION_FILE") or os.path.join(
+    tempfile.gettempdir(),
+    f"content-os-data-version-{hashlib.sha1(os.path.dirname(os.path.abspath(__file__)).encode()).hexdigest()[:12]}"
+)
+
+DELTA_FILE = f"{STATE_FILE}.deltas"
+DELTA_FILE_MAX_BYTES = 1024 * 1024
+DELTAS_KEPT = 200  # most recent deltas kept when the file is trimmed
+
+_lock = threading.Lock()
+_replay_lock = threading.RLock()  # one thread replays at a time; held across listener calls
+_listeners = []        # full reset: fn()
+_delta_listeners = []  # incremental update: fn(delta)
+_epoch = int(time.time())  # distinguishes versions across restarts
+_version = 0
+_last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+_seen_mtime = None
+
+
+def _now():
+    return datetime.now(timezone.utc).replace(microsecond=0)
+
+
+@contextmanager
+def _file_lock():
+    with open(f"{STATE_FILE}.lock", "a") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _read_state():
+    try:
+        with open(STATE_FILE) as f:
+            epoch, version, modified = f.read().split()
+        return int(epoch), int(version), datetime.fromtimestamp(int(modified), timezone.utc)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_state(epoch, version, modified):
+    global _epoch, _version, _last_modified, _seen_mtime
+    temp_path = f"{STATE_FILE}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as f:
+        f.write(f"{epoch} {version} {int(modified.timestamp())}")
+    os.replace(temp_path, STATE_FILE)
+    with _lock:
+        _epoch, _version, _last_modified = epoch, version, modified
+        _seen_mtime = os.stat(STATE_FILE).st_mtime_ns
+
+
+def _notify():
+    for listener in _listeners:
+        listener()
+
+
+def add_listener(listener):
+    _listeners.append(listener)
+
+
+def add_delta_listener(listener):
+    _delta_listeners.append(listener)
+
+
+def _append_delta(epoch, version, delta):
+    line = json.dumps({'epoch': epoch, 'version': version, 'delta': delta}, default=str) + "\n"
+    if os.path.exists(DELTA_FILE) and os.path.getsize(DELTA_FILE) > DELTA_FILE_MAX_BYTES:
+        with open(DELTA_FILE) as f:
+            kept = f.readlines()[-DELTAS_KEPT:]
+        temp_path = f"{DELTA_FILE}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            f.writelines(kept + [line])
+        os.replace(temp_path, DELTA_FILE)
+        return
+    with open(DELTA_FILE, "a") as f:
+        f.write(line)
+
+
+# Deltas of versions after < v <= upto in `epoch`, oldest first; None if any is missing
+def _read_deltas(epoch, after, upto):
+    found = {}
+    try:
+        with open(DELTA_FILE) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry['epoch'] == epoch and after < entry['version'] <= upto:
+                    found[entry['version']] = entry['delta']
+    except OSError:
+        return None
+    if len(found) != upto - after:
+        return None
+    return [found[v] for v in range(after + 1, upto + 1)]
+
+
+# Bring this process from version `previous` to `current` (epoch, version pairs)
+def _catch_up(previous, current):
+    deltas = None
+    if previous[0] == current[0] and current[1] > previous[1] and _delta_listeners:
+        deltas = _read_deltas(current[0], previous[1], current[1])
+    if deltas is None:
+        _notify()
+        return
+    try:
+        for delta in deltas:
+            for listener in _delta_listeners:
+                listener(delta)
+    except Exception:
+        _notify()
+
+
+# Pick up a version bumped by another process; cheap enough to run per request
+def sync():
+    global _epoch, _version, _last_modified, _seen_mtime
+    try:
+        mtime = os.stat(STATE_FILE).st_mtime_ns
+    except OSError:
+        return
+    if mtime == _seen_mtime:
+        return
+    with _replay_lock:
+        if mtime == _seen_mtime:
+            return  # another thread replayed it meanwhile
+        state = _read_state()
+        if state is None:
+            return
+        previous = (_epoch, _version)
+        if (state[0], state[1]) != previous:
+            _catch_up(previous, (state[0], state[1]))
+        with _lock:
+            _epoch, _version, _last_modified = state
+            _seen_mtime = mtime
+
+
+def current():
+    return _version
+
+
+def last_modified():
+    return _last_modified
+
+
+# Move to a new version after a commit, once this process has applied the
+# change itself; `delta` (JSON-serializable) lets the other processes apply
+# it instead of dropping their indexes
+def bump(delta=None):
+    with _replay_lock:
+        sync()
+        with _file_lock():
+            state = _read_state()
+            previous = (_epoch, _version)
+            current = (state[0], state[1]) if state else previous
+            # Another process bumped since the sync: apply its changes first
+            if current != previous:
+                _catch_up(previous, current)
+            if delta is not None:
+                _append_delta(current[0], current[1] + 1, delta)
+            _write_state(current[0], current[1] + 1, _now())
+        return _version
+
+
+# Start a new epoch; run once per server start, as data may have changed while it was down
+def new_epoch():
+    with _file_lock():
+        open(DELTA_FILE, "w").close()
+        _write_state(int(time.time()), 0, _now())
+
+
+def etag():
+    return f"{_epoch}-{_version}"
+
+
+def _snapshot():
+    sync()
+    with _lock:
+        return etag(), _last_modified
+
+
+def _not_modified(tag, modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(tag)
+    if request.if_modified_since:
+        return request.if_modified_since >= modified
+    return False
+
+
+# Decorator for read-only routes whose output only changes when data_version does
+def conditional(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        tag, modified = _snapshot()
+
+        if _not_modified(tag, modified):
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(tag, weak=True)
+        response.last_modified = modified
+        response.cache_control.no_cache = True
+        return response
+    return wrapper
+
+
+def init_app(app):
+    @app.before_request
+    def sync_data_version():
+        sync()
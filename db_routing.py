@@ -0,0 +1,208 @@
+import logging
+import os
+import threading
+import time
+from flask import g, has_request_context
+import data_version
+import metrics
+
+# Read/write routing. Writes, and reads that must see them, use the primary
+# (db_config). Read-only routes call connect_for_read(), which takes the
+# next usable replica from DB_REPLICA_HOSTS in round-robin order and falls
+# back to the primary when none is configured or reachable.
+#
+# A replica whose connect fails is skipped for DB_REPLICA_RETRY_SECONDS.
+# This is tracked per set of credentials, so a replica that rejects the
+# read-only user still serves the main one. Each replica's replication lag
+# is also checked (at most every DB_REPLICA_CHECK_SECONDS) and one more
+# than DB_REPLICA_MAX_LAG seconds behind, or not replicating, is skipped
+# the same way; DB_REPLICA_MAX_LAG=0 turns the check off. The check runs
+# on its own short-lived connection as the monitor user (the main DB user
+# unless DB_REPLICA_MONITOR_USER is set), since SHOW REPLICA STATUS needs
+# the REPLICATION CLIENT privilege that the read-only user usually lacks.
+#
+# Post-write reads stay on the primary: for DB_REPLICA_STICKY_SECONDS after
+# any data_version bump (which every process sees through the shared
+# version file), and for the rest of a request that has written. The
+# in-memory indexes never load through here (see ensure_indexes_loaded in
+# app.py): they always rebuild from the primary.
+#
+# Local test setup, two MySQL instances where 3307 replicates from 3306:
+#   DB_HOST=127.0.0.1 DB_PORT=3306 DB_REPLICA_HOSTS=127.0.0.1:3307
+
+logger = logging.getLogger(__name__)
+
+STICKY_SECONDS = float(os.getenv("DB_REPLICA_STICKY_SECONDS", 10))
+RETRY_SECONDS = float(os.getenv("DB_REPLICA_RETRY_SECONDS", 30))
+CHECK_SECONDS = float(os.getenv("DB_REPLICA_CHECK_SECONDS", 15))
+CONNECT_TIMEOUT = int(os.getenv("DB_REPLICA_CONNECT_TIMEOUT", 2))
+MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG", 10)) or None
+
+metrics.describe('db_read_connections_total', 'counter', 'Read connections opened, by target (replica or primary).')
+
+
+class Replica:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.down_until = 0.0
+        self.checked_at = 0.0
+        self.last_error = None
+
+    @property
+    def name(self):
+        return f"{self.host}:{self.port}"
+
+
+def _parse_hosts(value):
+    hosts = []
+    for entry in value.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        host, _, port = entry.rpartition(':') if ':' in entry else (entry, '', '')
+        hosts.append((host, int(port) if port else 3306))
+    return hosts
+
+
+_hosts = _parse_hosts(os.getenv("DB_REPLICA_HOSTS", ""))
+_lock = threading.Lock()
+_replica_sets = {}  # (user, database) -> [Replica], one state per set of credentials
+_next = 0
+_connect = None
+_monitor_config = None
+
+
+# `monitor_config` supplies the credentials for the replication lag check
+def init_app(app, connect, monitor_config):
+    global _connect, _monitor_config
+    _connect = connect
+    _monitor_config = {**monitor_config,
+                       'user': os.getenv("DB_REPLICA_MONITOR_USER") or monitor_config.get('user'),
+                       'password': os.getenv("DB_REPLICA_MONITOR_PASSWORD") or monitor_config.get('password')}
+    metrics.register_collector(_replica_metrics)
+    if _hosts:
+        app.logger.info(f"Routing reads to replicas: {', '.join(f'{h}:{p}' for h, p in _hosts)}")
+
+
+def enabled():
+    return bool(_hosts)
+
+
+def _replicas(config):
+    key = (config.get('user'), config.get('database'))
+    with _lock:
+        replicas = _replica_sets.get(key)
+        if replicas is None:
+            replicas = _replica_sets[key] = [Replica(host, port) for host, port in _hosts]
+    return replicas
+
+
+# Keep the rest of this request on the primary (call after a commit)
+def mark_write():
+    if has_request_context():
+        g.db_primary = True
+
+
+def _use_primary():
+    if not _hosts:
+        return True
+    if has_request_context() and g.get('db_primary'):
+        return True
+    return time.time() - data_version.last_modified().timestamp() < STICKY_SECONDS
+
+
+# Replicas not marked down for `config`, starting from the next one in rotation
+def _candidates(config):
+    global _next
+    replicas = _replicas(config)
+    with _lock:
+        start = _next % len(replicas)
+        _next = start + 1
+    now = time.time()
+    ordered = replicas[start:] + replicas[:start]
+    return [r for r in ordered if r.down_until <= now]
+
+
+def _replication_lag(replica):
+    conn = _connect(**{**_monitor_config, 'host': replica.host, 'port': replica.port,
+                       'connection_timeout': CONNECT_TIMEOUT})
+    try:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except Exception:
+            cursor.execute("SHOW SLAVE STATUS")  # MySQL < 8.0.22
+        row = cursor.fetchone()
+        cursor.close()
+    finally:
+        conn.close()
+    if not row:
+        return None
+    lag = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+    return None if lag is None else float(lag)
+
+
+# Periodic check on a monitor connection; a NULL lag means replication stopped
+def _healthy(replica):
+    if MAX_LAG_SECONDS is None or time.time() - replica.checked_at < CHECK_SECONDS:
+        return True
+    lag = _replication_lag(replica)
+    if lag is None or lag > MAX_LAG_SECONDS:
+        replica.last_error = f"replication lag {lag}"
+        return False
+    replica.checked_at = time.time()
+    return True
+
+
+def _mark_down(replica, reason):
+    replica.down_until = time.time() + RETRY_SECONDS
+    replica.checked_at = 0.0
+    replica.last_error = str(reason)
+    logger.warning(f"Replica {replica.name} unavailable for {RETRY_SECONDS:.0f}s: {reason}")
+
+
+# A raw connection for a read-only query; `config` supplies the credentials
+# and database, the host and port come from the chosen replica
+def connect_for_read(config):
+    if not _use_primary():
+        for replica in _candidates(config):
+            try:
+                healthy = _healthy(replica)
+            except Exception as e:
+                healthy = False
+                replica.last_error = f"lag check failed: {e}"
+            if not healthy:
+                _mark_down(replica, replica.last_error)
+                continue
+            try:
+                conn = _connect(**{**config, 'host': replica.host, 'port': replica.port,
+                                   'connection_timeout': CONNECT_TIMEOUT})
+            except Exception as e:
+                _mark_down(replica, e)
+                continue
+            metrics.inc('db_read_connections_total', target=replica.name)
+            return conn
+    metrics.inc('db_read_connections_total', target='primary')
+    return _connect(**config)
+
+
+def status():
+    now = time.time()
+    with _lock:
+        replica_sets = list(_replica_sets.items())
+    return [{
+        'replica': r.name,
+        'user': user,
+        'up': r.down_until <= now,
+        'retry_in': max(0, round(r.down_until - now, 1)),
+        'last_error': r.last_error,
+    } for (user, _), replicas in replica_sets for r in replicas]
+
+
+def _replica_metrics():
+    lines = ["# HELP db_replica_up Whether a read replica is currently in rotation.",
+             "# TYPE db_replica_up gauge"]
+    for entry in status():
+        lines.append(f'db_replica_up{{replica="{entry["replica"]}",user="{entry["user"]}"}} {int(entry["up"])}')
+    return lines
@@ -1,18 +1,99 @@
 import pandas as pd
 from flask import current_app
 from datetime import datetime
-import json
 import requests
 from bs4 import BeautifulSoup
 import re
 import os
+import hashlib
+import shutil
+import tempfile
+import time
+import app_logging
+import media_derivatives
+import metrics
+
+MAX_MEDIA_BYTES = int(os.getenv("MAX_MEDIA_BYTES", 200 * 1024 * 1024))
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Content-addressed copies of every media file; post files are hardlinks to
+# these. Kept outside static/ so they are never served by hash, next to it so
+# hardlinks stay on the same filesystem.
+MEDIA_OBJECTS_DIR = os.getenv("MEDIA_OBJECTS_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'media_objects')
+# Unreferenced objects younger than this are left alone by the sweep, as a
+# download may be about to link them
+OBJECT_SWEEP_GRACE_SECONDS = 3600
+# Where objects used to be kept, inside the public static tree
+LEGACY_OBJECTS_DIR = os.path.join(media_derivatives.MEDIA_DIR, '.objects')
+
+# Stream a media response to disk: write to a temp file while hashing it, then
+# store it once per content hash and atomically link it into place as save_path.
+def _store_media(media_response, save_path, ext):
+    declared_size = media_response.headers.get('content-length')
+    if declared_size and declared_size.isdigit() and int(declared_size) > MAX_MEDIA_BYTES:
+        raise ValueError(f"Media is {declared_size} bytes, over the {MAX_MEDIA_BYTES} byte limit")
+
+    os.makedirs(MEDIA_OBJECTS_DIR, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix='.tmp-', dir=MEDIA_OBJECTS_DIR)
+    link_path = f"{save_path}.tmp-link"
+    try:
+        digest = hashlib.sha256()
+        size = 0
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in media_response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_MEDIA_BYTES:
+                    raise ValueError(f"Media exceeded the {MAX_MEDIA_BYTES} byte limit while downloading")
+                digest.update(chunk)
+                f.write(chunk)
+
+        object_path = os.path.join(MEDIA_OBJECTS_DIR, f"{digest.hexdigest()}{ext}")
+        try:
+            # Link an existing object first: once linked, the sweep cannot take it
+            os.link(object_path, link_path)
+        except FileNotFoundError:
+            os.replace(temp_path, object_path)
+            try:
+                os.link(object_path, link_path)
+            except OSError:
+                shutil.copyfile(object_path, link_path)
+        except OSError:
+            # Filesystems without hardlinks get a plain copy instead
+            shutil.copyfile(object_path, link_path)
+        os.replace(link_path, save_path)
+    finally:
+        # Whatever happened above, no temp file outlives the download
+        for path in (temp_path, link_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+# Delete objects no post file links to any more (link count back to 1) and
+# temp files of downloads that died; returns the number of files removed
+def sweep_media_objects():
+    # Post files keep their data through their own link, so the old store can go
+    shutil.rmtree(LEGACY_OBJECTS_DIR, ignore_errors=True)
+    if not os.path.isdir(MEDIA_OBJECTS_DIR):
+        return 0
+    cutoff = time.time() - OBJECT_SWEEP_GRACE_SECONDS
+    removed = 0
+    for name in os.listdir(MEDIA_OBJECTS_DIR):
+        path = os.path.join(MEDIA_OBJECTS_DIR, name)
+        try:
+            st = os.stat(path)
+            if st.st_nlink == 1 and st.st_mtime < cutoff:
+                os.remove(path)
+                removed += 1
+        except FileNotFoundError:
+            continue
+    return removed
 
 #Standalone function to download media from a URL using post_id as filename
 def download_media_by_id(post_url, post_id):
     print("running")
     try:
         headers = {"User-Agent": "Mozilla/5.0"}
-        resp = requests.get(post_url, headers=headers, timeout=10)
+        with metrics.timed('external_request_duration_seconds', service='linkedin'):
+            resp = requests.get(post_url, headers=headers, timeout=10)
         resp.raise_for_status()
         soup = BeautifulSoup(resp.text, 'html.parser')
 
@@ -20,23 +101,28 @@ def download_media_by_id(post_url, post_id):
         media_url = media_meta['content'] if media_meta and media_meta.get('content') else None
 
         if media_url:
-            media_response = requests.get(media_url, headers=headers, timeout=20)
-            media_response.raise_for_status()
-
-            content_type = media_response.headers.get('content-type', '').split(';')[0].lower()
-            mapping = {
-                'image/gif': '.gif', 'image/png': '.png',
-                'image/jpeg': '.jpeg', 'image/jpg': '.jpeg',
-                'video/mp4': '.mp4', 'image/webp': '.webp'
-            }
-            ext = mapping.get(content_type, os.path.splitext(media_url.split('?')[0])[-1].lower() or '.jpeg')
-            
-            save_dir = os.path.join('static', 'media')
-            os.makedirs(save_dir, exist_ok=True)
-            save_path = os.path.join(save_dir, f"{post_id}{ext}")
-            
-            with open(save_path, 'wb') as f:
-                f.write(media_response.content)
+            with requests.get(media_url, headers=headers, timeout=20, stream=True) as media_response:
+                media_response.raise_for_status()
+
+                content_type = media_response.headers.get('content-type', '').split(';')[0].lower()
+                mapping = {
+                    'image/gif': '.gif', 'image/png': '.png',
+                    'image/jpeg': '.jpeg', 'image/jpg': '.jpeg',
+                    'video/mp4': '.mp4', 'image/webp': '.webp'
+                }
+                ext = mapping.get(content_type, os.path.splitext(media_url.split('?')[0])[-1].lower() or '.jpeg')
+
+                save_dir = media_derivatives.MEDIA_DIR
+                os.makedirs(save_dir, exist_ok=True)
+                save_path = os.path.join(save_dir, f"{post_id}{ext}")
+
+                with metrics.timed('external_request_duration_seconds', service='linkedin_media'):
+                    _store_media(media_response, save_path, ext)
+
+            try:
+                media_derivatives.generate(f"{post_id}{ext}")
+            except Exception as e:
+                print(f"Thumbnail error for {post_id}: {e}")
             return f"{post_id}{ext}"
     except Exception as e:
         print(f"Sync error for {post_id}: {e}")
@@ -88,7 +174,7 @@ def handle_file(file_path):
         
         data = df.set_index('key')['value'].to_dict()
 
-        current_app.logger.info(f"DEBUG - Cleaned Keys: {list(data.keys())}")
+        current_app.logger.debug("Cleaned keys: %s", list(data.keys()))
 
         post_url = data.get('Post URL')
         if not post_url:
@@ -105,7 +191,8 @@ def handle_file(file_path):
         media_url = None
         try:
             headers = {"User-Agent": "Mozilla/5.0"}
-            resp = requests.get(post_url, headers=headers, timeout=10)
+            with metrics.timed('external_request_duration_seconds', service='linkedin'):
+                resp = requests.get(post_url, headers=headers, timeout=10)
             resp.raise_for_status()
             soup = BeautifulSoup(resp.text, 'html.parser')
 
@@ -167,7 +254,7 @@ def handle_file(file_path):
             'sends': _to_int(data.get('Sends on LinkedIn', 0))
         }
 
-        current_app.logger.info(json.dumps(transformed_data, indent=2, ensure_ascii=False))
+        app_logging.log_payload(current_app.logger, f"Parsed upload {filename}", transformed_data)
         return transformed_data
 
     except Exception as e:
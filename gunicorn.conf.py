@@ -0,0 +1,49 @@
+import multiprocessing
+import os
+
+# gunicorn settings for production: gunicorn -c gunicorn.conf.py wsgi:app
+# Every value can be overridden from the environment.
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+
+# Several workers append to one app.log, so in-process size rotation would
+# have them rotating over each other: rotate it with logrotate instead
+# (copytruncate is not needed; the file is reopened once it is moved)
+os.environ.setdefault("LOG_ROTATION", "external")
+
+# One process per core; the in-memory indexes are per process, so memory
+# grows with the worker count. Threads cover requests waiting on MySQL,
+# LinkedIn or Gemini.
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+
+# Import the app once in the master so workers fork with it already loaded
+preload_app = os.getenv("GUNICORN_PRELOAD", "1").lower() in ("1", "true", "yes")
+
+# Video-to-GIF conversion and Ask AI requests can run for a while
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+
+# Worker recycling is off by default: a new worker starts with empty
+# in-memory indexes and rebuilds each one from MySQL on first use, so
+# frequent recycling turns into repeated full rebuilds and slow first
+# requests. Set GUNICORN_MAX_REQUESTS (e.g. 50000) only to contain a memory
+# leak; the jitter keeps workers from restarting together.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 1000))
+
+accesslog = "-"
+
+
+# Runs once in the master before workers are forked (not again on HUP reloads)
+def on_starting(server):
+    from app import run_startup_tasks
+    run_startup_tasks()
+
+
+# Publish the exiting worker's final metrics so /metrics keeps its counts
+def worker_exit(server, worker):
+    import metrics
+    metrics.publish()
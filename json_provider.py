@@ -0,0 +1,92 @@
+import decimal
+import json
+from datetime import date, datetime, time
+from flask.json.provider import DefaultJSONProvider, _default as flask_default
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# JSON provider that serializes MySQL rows in a single pass: datetimes as ISO
+# 8601, DECIMAL columns as numbers, and integers outside JavaScript's safe
+# range (64-bit post ids) as strings so the browser does not round them.
+# orjson is used when installed, with the standard library as a fallback.
+
+MAX_SAFE_INTEGER = 9007199254740991
+
+
+def _default(o):
+    if isinstance(o, decimal.Decimal):
+        return float(o)
+    if isinstance(o, (datetime, date, time)):
+        return o.isoformat()
+    if isinstance(o, (bytes, bytearray)):
+        return o.decode('utf-8', errors='replace')
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    return flask_default(o)
+
+
+# Returns `o` itself when it holds no big integers, so the common case copies nothing
+def _stringify_big_ints(o):
+    kind = type(o)
+    if kind is int:
+        return str(o) if abs(o) > MAX_SAFE_INTEGER else o
+    if kind is dict:
+        changed = None
+        for key, value in o.items():
+            new_value = _stringify_big_ints(value) if type(value) in (int, dict, list, tuple) else value
+            if new_value is not value:
+                if changed is None:
+                    changed = dict(o)
+                changed[key] = new_value
+        return o if changed is None else changed
+    if kind is list or kind is tuple:
+        items = [_stringify_big_ints(v) for v in o]
+        if kind is list and all(a is b for a, b in zip(items, o)):
+            return o
+        return items
+    return o
+
+
+def _orjson_dumps(obj, indent):
+    option = orjson.OPT_STRICT_INTEGER | orjson.OPT_NON_STR_KEYS
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    try:
+        return orjson.dumps(obj, default=_default, option=option)
+    except orjson.JSONEncodeError as e:
+        if 'Integer exceeds' not in str(e):
+            raise
+    # Only payloads that really carry big integers pay for the extra walk
+    return orjson.dumps(_stringify_big_ints(obj), default=_default, option=option)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and set(kwargs) <= {'indent', 'separators'}:
+            return _orjson_dumps(obj, kwargs.get('indent')).decode('utf-8')
+        kwargs.setdefault('default', _default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return json.dumps(_stringify_big_ints(obj), **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+
+        if orjson is not None:
+            body = _orjson_dumps(obj, indent) + b"\n"
+        elif indent:
+            body = f"{self.dumps(obj, indent=2)}\n"
+        else:
+            body = f"{self.dumps(obj, separators=(',', ':'))}\n"
+        return self._app.response_class(body, mimetype=self.mimetype)
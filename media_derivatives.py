@@ -0,0 +1,87 @@
+import os
+import subprocess
+import metrics
+
+# Resized WebP derivatives of downloaded post media: a thumbnail for images
+# and GIFs, and a poster frame for videos. They live under a directory named
+# after their width; pages link them with their mtime as a version, as a
+# re-downloaded post keeps its file name but gets a new thumbnail.
+
+THUMB_WIDTH = 480
+THUMB_QUALITY = 80
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
+VIDEO_EXTENSIONS = {'.mp4', '.webm'}
+
+MEDIA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'media')
+THUMB_SUBDIR = os.path.join('thumbs', f'w{THUMB_WIDTH}')
+THUMB_DIR = os.path.join(MEDIA_DIR, THUMB_SUBDIR)
+
+
+def thumbnail_name(media_name):
+    return f"{os.path.splitext(media_name)[0]}.webp"
+
+
+def thumbnail_path(media_name):
+    return os.path.join(THUMB_DIR, thumbnail_name(media_name))
+
+
+def _ffmpeg_frame(source, target, seek=None):
+    cmd = ["ffmpeg", "-y", "-loglevel", "error"]
+    if seek is not None:
+        cmd += ["-ss", str(seek)]
+    cmd += [
+        "-i", source,
+        "-frames:v", "1",
+        "-vf", f"scale='min({THUMB_WIDTH},iw)':-2",
+        "-c:v", "libwebp", "-quality", str(THUMB_QUALITY),
+        target,
+    ]
+    with metrics.timed('ffmpeg_duration_seconds', task='thumbnail'):
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=60)
+
+
+def generate(media_name):
+    source = os.path.join(MEDIA_DIR, media_name)
+    ext = os.path.splitext(media_name)[1].lower()
+    if not os.path.isfile(source) or ext not in IMAGE_EXTENSIONS | VIDEO_EXTENSIONS:
+        return None
+
+    os.makedirs(THUMB_DIR, exist_ok=True)
+    target = thumbnail_path(media_name)
+    temp_target = f"{target}.tmp.webp"
+
+    try:
+        if ext in VIDEO_EXTENSIONS:
+            # Poster frame one second in; very short clips fall back to the first frame
+            try:
+                _ffmpeg_frame(source, temp_target, seek=1)
+            except subprocess.CalledProcessError:
+                _ffmpeg_frame(source, temp_target)
+            if not os.path.exists(temp_target) or not os.path.getsize(temp_target):
+                _ffmpeg_frame(source, temp_target)
+        else:
+            _ffmpeg_frame(source, temp_target)
+        os.replace(temp_target, target)
+        return target
+    finally:
+        if os.path.exists(temp_target):
+            os.remove(temp_target)
+
+
+# Generate derivatives for every media file that does not have one yet
+def backfill(logger=None):
+    if not os.path.isdir(MEDIA_DIR):
+        return 0
+    created = 0
+    for name in sorted(os.listdir(MEDIA_DIR)):
+        if name.startswith('.') or not os.path.isfile(os.path.join(MEDIA_DIR, name)):
+            continue
+        if os.path.exists(thumbnail_path(name)):
+            continue
+        try:
+            if generate(name):
+                created += 1
+        except (subprocess.SubprocessError, OSError) as e:
+            if logger:
+                logger.error(f"Thumbnail generation failed for {name}: {e}")
+    return created
@@ -0,0 +1,463 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, has_request_context, request
+import data_version
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Request, database and external-call metrics, rendered in the Prometheus
+# text exposition format. Database time is collected by wrapping the
+# connections handed out by get_db_connection; per-request totals can also
+# be sent back as a Server-Timing header.
+#
+# Series are recorded per process. So that a scrape covers every gunicorn
+# worker, whichever one answers, each worker publishes a snapshot (its
+# series, collector lines and registered status sections) to a file in
+# METRICS_DIR every METRICS_PUBLISH_SECONDS and whenever it serves a
+# scrape, and render() sums the counters and histograms of all snapshots.
+# Snapshots of workers that have exited still count; they are folded into
+# one file so the directory stays small. Collector lines (gauges such as
+# cache sizes) only describe one process and get a worker="<pid>" label.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+_lock = threading.Lock()
+_descriptions = {}  # name -> (type, help, buckets)
+_histograms = {}    # (name, labels) -> [bucket counts..., sum, count]
+_counters = {}      # (name, labels) -> value
+_collectors = []    # callables returning extra exposition lines
+_status_sources = {}  # name -> callable returning a JSON-serializable per-process status
+_query_listeners = []  # callables notified with (sql, params, seconds) after execute
+
+
+def describe(name, kind, help_text, buckets=DEFAULT_BUCKETS):
+    _descriptions[name] = (kind, help_text, buckets)
+
+
+describe('http_request_duration_seconds', 'histogram', 'Time spent handling a request, by route.')
+describe('http_requests_total', 'counter', 'Requests handled, by route and status.')
+describe('db_queries_per_request', 'histogram', 'Database queries issued by a single request.', QUERY_COUNT_BUCKETS)
+describe('db_query_duration_seconds', 'histogram', 'Time spent in cursor calls, by operation (execute or fetch).')
+describe('external_request_duration_seconds', 'histogram', 'Time spent on calls to external services.')
+describe('ffmpeg_duration_seconds', 'histogram', 'Time spent running ffmpeg.')
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+def observe(name, value, **labels):
+    buckets = _descriptions.get(name, ('histogram', '', DEFAULT_BUCKETS))[2]
+    key = _key(name, labels)
+    with _lock:
+        series = _histograms.get(key)
+        if series is None:
+            series = _histograms[key] = [0] * (len(buckets) + 2)
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+
+def inc(name, amount=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def register_collector(collector):
+    _collectors.append(collector)
+
+
+# Publish fn() with this process's snapshot, for worker_status(name)
+def register_status(name, fn):
+    _status_sources[name] = fn
+
+
+def _add_request_timing(name, seconds):
+    if has_request_context() and hasattr(g, 'timings'):
+        g.timings[name] = g.timings.get(name, 0) + seconds
+
+
+# Time a block and record it in `name`, e.g. timed('ffmpeg_duration_seconds', task='gif')
+@contextmanager
+def timed(name, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        observe(name, elapsed, **labels)
+        _add_request_timing(next(iter(labels.values()), name), elapsed)
+
+
+# ----------- Database instrumentation -----------
+
+def _record_query(elapsed, operation):
+    observe('db_query_duration_seconds', elapsed, operation=operation)
+    if has_request_context() and hasattr(g, 'db_queries'):
+        g.db_time += elapsed
+        if operation == 'execute':
+            g.db_queries += 1
+
+
+class InstrumentedCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def _timed(self, operation, method, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return getattr(self._cursor, method)(*args, **kwargs)
+        finally:
+            _record_query(time.perf_counter() - started, operation)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            _record_query(elapsed, 'execute')
+            for listener in _query_listeners:
+                listener(operation, params, elapsed)
+
+    def fetchone(self):
+        return self._timed('fetch', 'fetchone')
+
+    def fetchall(self):
+        return self._timed('fetch', 'fetchall')
+
+    def fetchmany(self, *args, **kwargs):
+        return self._timed('fetch', 'fetchmany', *args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def instrument_connection(conn):
+    return InstrumentedConnection(conn)
+
+
+def add_query_listener(listener):
+    _query_listeners.append(listener)
+
+
+# ----------- Flask integration -----------
+
+def init_app(app):
+    app.config.setdefault('SERVER_TIMING', os.getenv('SERVER_TIMING', '').lower() in ('1', 'true', 'yes'))
+
+    @app.before_request
+    def start_request_metrics():
+        if _publisher_pid != os.getpid():
+            _start_publisher(app.logger)
+        g.request_started = time.perf_counter()
+        g.db_queries = 0
+        g.db_time = 0.0
+        g.timings = {}
+
+    @app.after_request
+    def record_request_metrics(response):
+        if not hasattr(g, 'request_started'):
+            return response
+        elapsed = time.perf_counter() - g.request_started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+
+        observe('http_request_duration_seconds', elapsed, route=route, method=request.method)
+        inc('http_requests_total', route=route, method=request.method, status=str(response.status_code))
+        observe('db_queries_per_request', g.db_queries, route=route)
+
+        if app.config['SERVER_TIMING']:
+            entries = [f'app;dur={elapsed * 1000:.1f}',
+                       f'db;dur={g.db_time * 1000:.1f};desc="{g.db_queries} queries"']
+            entries += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in g.timings.items()]
+            response.headers['Server-Timing'] = ', '.join(entries)
+        return response
+
+
+# ----------- Exposition -----------
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs, extra=()):
+    pairs = list(pairs) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _format_number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render():
+    lines = []
+    counters, histograms, collected = _merged()
+
+    names = sorted({name for name, _ in histograms} | {name for name, _ in counters})
+    for name in names:
+        kind, help_text, buckets = _descriptions.get(name, ('untyped', '', DEFAULT_BUCKETS))
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for (series_name, labels), value in sorted(counters.items()):
+            if series_name == name:
+                lines.append(f'{name}{_labels(labels)} {_format_number(value)}')
+        for (series_name, labels), series in sorted(histograms.items()):
+            if series_name != name:
+                continue
+            for bound, count in zip(buckets, series):
+                lines.append(f'{name}_bucket{_labels(labels, [("le", bound)])} {count}')
+            lines.append(f'{name}_bucket{_labels(labels, [("le", "+Inf")])} {series[-1]}')
+            lines.append(f'{name}_sum{_labels(labels)} {_format_number(series[-2])}')
+            lines.append(f'{name}_count{_labels(labels)} {series[-1]}')
+
+    lines.extend(collected)
+    return '\n'.join(lines) + '\n'
+
+
+# ----------- Multiple worker processes -----------
+
+MULTIPROCESS_DIR = os.getenv("METRICS_DIR") or f"{data_version.STATE_FILE}.metrics"
+PUBLISH_SECONDS = float(os.getenv("METRICS_PUBLISH_SECONDS", 10))
+EXITED_FILE = "exited.json"
+
+_publisher_pid = None
+_publisher_lock = threading.Lock()
+_snapshot_name = None  # this process's file; pid plus start time, as pids get reused
+
+
+def _own_file():
+    global _snapshot_name
+    pid = os.getpid()
+    if _snapshot_name is None or not _snapshot_name.startswith(f"{pid}-"):
+        _snapshot_name = f"{pid}-{time.time_ns()}.json"
+    return _snapshot_name
+
+
+def _collector_lines():
+    lines = []
+    for collector in _collectors:
+        lines.extend(collector())
+    return lines
+
+
+def _local_snapshot():
+    with _lock:
+        counters = [[name, list(labels), value] for (name, labels), value in _counters.items()]
+        histograms = [[name, list(labels), list(series)] for (name, labels), series in _histograms.items()]
+    return {
+        'pid': os.getpid(),
+        'counters': counters,
+        'histograms': histograms,
+        'collected': _collector_lines(),
+        'status': {name: fn() for name, fn in _status_sources.items()},
+    }
+
+
+def _write_json(path, data):
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(data, f, default=str)
+    os.replace(temp_path, path)
+
+
+def publish():
+    snapshot = _local_snapshot()
+    try:
+        os.makedirs(MULTIPROCESS_DIR, exist_ok=True)
+        _write_json(os.path.join(MULTIPROCESS_DIR, _own_file()), snapshot)
+    except OSError:
+        return None
+    return snapshot
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _series(entries):
+    return {(name, tuple(tuple(pair) for pair in labels)): value for name, labels, value in entries}
+
+
+def _add_series(counters, histograms, snapshot):
+    for key, value in _series(snapshot.get('counters', [])).items():
+        counters[key] = counters.get(key, 0) + value
+    for key, series in _series(snapshot.get('histograms', [])).items():
+        total = histograms.get(key)
+        histograms[key] = list(series) if total is None else [a + b for a, b in zip(total, series)]
+
+
+# Add the series of exited workers to EXITED_FILE and drop their snapshots
+def _fold_exited(paths):
+    lock_path = os.path.join(MULTIPROCESS_DIR, ".lock")
+    exited_path = os.path.join(MULTIPROCESS_DIR, EXITED_FILE)
+    with open(lock_path, "a") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            counters, histograms = {}, {}
+            for path in [exited_path] + paths:
+                try:
+                    with open(path) as f:
+                        _add_series(counters, histograms, json.load(f))
+                except (OSError, ValueError):
+                    continue
+            _write_json(exited_path, {
+                'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+                'histograms': [[name, labels, series] for (name, labels), series in histograms.items()],
+            })
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+# (own snapshot, snapshots of other live workers, exited totals)
+def _snapshots():
+    own = publish()
+    if own is None:
+        return _local_snapshot(), [], {}
+    others, exited, dead = [], {}, []
+    try:
+        names = os.listdir(MULTIPROCESS_DIR)
+    except OSError:
+        names = []
+    for name in names:
+        if not name.endswith(".json") or name == _snapshot_name:
+            continue
+        path = os.path.join(MULTIPROCESS_DIR, name)
+        if name != EXITED_FILE and not _alive(int(name.split("-")[0])):
+            dead.append(path)
+            continue
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if name == EXITED_FILE:
+            exited = snapshot
+        else:
+            others.append(snapshot)
+    if dead:
+        _fold_exited(dead)
+        try:
+            with open(os.path.join(MULTIPROCESS_DIR, EXITED_FILE)) as f:
+                exited = json.load(f)
+        except (OSError, ValueError):
+            pass
+    return own, others, exited
+
+
+def _with_worker_label(line, pid):
+    if line.startswith("#"):
+        return line
+    name, _, value = line.rpartition(" ")
+    if name.endswith("}"):
+        return f'{name[:-1]},worker="{pid}"}} {value}'
+    return f'{name}{{worker="{pid}"}} {value}'
+
+
+# Counters and histograms summed over all workers, plus every worker's collector lines
+def _merged():
+    own, others, exited = _snapshots()
+    counters, histograms = {}, {}
+    for snapshot in [own, exited] + others:
+        _add_series(counters, histograms, snapshot)
+
+    collected, seen_meta = [], set()
+    for snapshot in [own] + others:
+        for line in snapshot.get('collected', []):
+            if line.startswith("#"):
+                if line in seen_meta:
+                    continue
+                seen_meta.add(line)
+            collected.append(_with_worker_label(line, snapshot['pid']))
+    return counters, histograms, collected
+
+
+# Status section `name` of every live worker: {pid: status}
+def worker_status(name):
+    own, others, _ = _snapshots()
+    return {str(snapshot['pid']): snapshot.get('status', {}).get(name)
+            for snapshot in [own] + others if name in snapshot.get('status', {})}
+
+
+# A forked worker starts with empty series (the parent's are not its own,
+# and would be counted once per worker) and a fresh lock, in case another
+# thread held it at fork time
+def _after_fork_in_child():
+    global _lock, _snapshot_name
+    _lock = threading.Lock()
+    _counters.clear()
+    _histograms.clear()
+    _snapshot_name = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+# Forget earlier snapshots; run once on server start, before workers fork
+def clear_snapshots():
+    if not os.path.isdir(MULTIPROCESS_DIR):
+        return
+    for name in os.listdir(MULTIPROCESS_DIR):
+        try:
+            os.remove(os.path.join(MULTIPROCESS_DIR, name))
+        except OSError:
+            pass
+
+
+def _start_publisher(logger):
+    global _publisher_pid
+    with _publisher_lock:
+        if _publisher_pid == os.getpid():
+            return
+        _publisher_pid = os.getpid()
+
+    def run():
+        while True:
+            time.sleep(PUBLISH_SECONDS)
+            try:
+                publish()
+            except Exception as e:
+                logger.error(f"Publishing metrics failed: {e}")
+
+    threading.Thread(target=run, name="metrics-publisher", daemon=True).start()
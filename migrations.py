@@ -0,0 +1,213 @@
+import logging
+import rollups
+
+# Versioned schema migrations. Applied versions are recorded in
+# schema_migrations; every step also checks information_schema before
+# changing anything, because MySQL commits DDL implicitly and a half-applied
+# migration has to be safe to run again. A named lock keeps several workers
+# starting at once from racing each other.
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = 'content_os_schema_migrations'
+LOCK_TIMEOUT = 60
+
+
+def _index_columns(cursor, table):
+    cursor.execute("""
+        SELECT INDEX_NAME, COLUMN_NAME, INDEX_TYPE
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        ORDER BY INDEX_NAME, SEQ_IN_INDEX
+    """, (table,))
+    indexes = {}
+    for name, column, index_type in cursor.fetchall():
+        indexes.setdefault(name, (index_type, []))[1].append(column)
+    return indexes
+
+
+# Create an index unless one with this name or the same leading columns exists
+def ensure_index(cursor, table, name, columns, kind='INDEX'):
+    for existing, (index_type, existing_columns) in _index_columns(cursor, table).items():
+        same_kind = (index_type == 'FULLTEXT') == (kind == 'FULLTEXT')
+        if existing == name or (same_kind and existing_columns[:len(columns)] == list(columns)):
+            return False
+    cursor.execute(f"ALTER TABLE {table} ADD {kind} {name} ({', '.join(columns)})")
+    logger.info(f"Created {kind.lower()} {name} on {table}({', '.join(columns)})")
+    return True
+
+
+# Drop an index if it exists, e.g. one a wider index now starts with
+def drop_index(cursor, table, name):
+    if name not in _index_columns(cursor, table):
+        return False
+    cursor.execute(f"ALTER TABLE {table} DROP INDEX {name}")
+    logger.info(f"Dropped index {name} on {table}")
+    return True
+
+
+# /api/posts picks a page of post ids ordered by one of these columns (and
+# post_id, which InnoDB appends to every secondary index) while filtering on
+# the others; one index per sort column that also holds the filter columns
+# lets that step run as a covering index scan, rows are fetched only for the
+# page itself
+PAGE_SORT_COLUMNS = ['post_datetime', 'likes', 'impressions', 'comments', 'main_ebook_ctr', 'main_ebook_clicks']
+PAGE_FILTER_COLUMNS = ['post_datetime', 'likes', 'impressions', 'comments']
+
+
+def _page_index(column):
+    return ('posts', f'idx_posts_page_{column}',
+            [column] + [c for c in PAGE_FILTER_COLUMNS if c != column], 'INDEX')
+
+
+# (version, description, steps); a step is an index spec (table, name, columns,
+# kind), an idempotent SQL statement, or a callable taking the cursor
+MIGRATIONS = [
+    (1, "Secondary indexes for post sorting and filtering", [
+        ('posts', 'idx_posts_post_datetime', ['post_datetime'], 'INDEX'),
+        ('posts', 'idx_posts_likes', ['likes'], 'INDEX'),
+        ('posts', 'idx_posts_impressions', ['impressions'], 'INDEX'),
+        ('posts', 'idx_posts_comments', ['comments'], 'INDEX'),
+        ('posts', 'idx_posts_main_ebook_ctr', ['main_ebook_ctr'], 'INDEX'),
+        ('posts', 'idx_posts_main_ebook_clicks', ['main_ebook_clicks'], 'INDEX'),
+    ]),
+    (2, "Both directions of the topic and graphic description link tables", [
+        ('topic_posts', 'idx_topic_posts_topic_post', ['topic_id', 'post_id'], 'INDEX'),
+        ('topic_posts', 'idx_topic_posts_post_topic', ['post_id', 'topic_id'], 'INDEX'),
+        ('graphic_desc_posts', 'idx_gdp_desc_post', ['graphic_desc_id', 'post_id'], 'INDEX'),
+        ('graphic_desc_posts', 'idx_gdp_post_desc', ['post_id', 'graphic_desc_id'], 'INDEX'),
+    ]),
+    (3, "Name lookups for topics and graphic descriptions", [
+        ('topics', 'idx_topics_name', ['name'], 'INDEX'),
+        ('graphic_desc', 'idx_graphic_desc_name', ['name'], 'INDEX'),
+    ]),
+    (4, "Fulltext index on captions", [
+        ('posts', 'ft_posts_caption', ['caption'], 'FULLTEXT'),
+    ]),
+    (5, "Engagement rollup tables", [
+        *rollups.SCHEMA,
+        rollups.rebuild,
+    ]),
+    (6, "Covering indexes for /api/posts pages, replacing the single-column sort indexes", [
+        *[_page_index(column) for column in PAGE_SORT_COLUMNS],
+        *[lambda cursor, column=column: drop_index(cursor, 'posts', f'idx_posts_{column}')
+          for column in PAGE_SORT_COLUMNS],
+    ]),
+]
+
+
+def _ensure_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description VARCHAR(255),
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied_versions(cursor):
+    _ensure_table(cursor)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def status(conn):
+    cursor = conn.cursor()
+    done = applied_versions(cursor)
+    cursor.close()
+    return [{'version': version, 'description': description, 'applied': version in done}
+            for version, description, _ in MIGRATIONS]
+
+
+# Apply pending migrations up to `target` (all by default); returns the versions applied
+def migrate(conn, target=None):
+    cursor = conn.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, LOCK_TIMEOUT))
+    if cursor.fetchone()[0] != 1:
+        cursor.close()
+        raise RuntimeError("Timed out waiting for the schema migration lock")
+
+    applied = []
+    try:
+        done = applied_versions(cursor)
+        for version, description, steps in MIGRATIONS:
+            if version in done or (target is not None and version > target):
+                continue
+            logger.info(f"Applying migration {version}: {description}")
+            for step in steps:
+                if isinstance(step, str):
+                    cursor.execute(step)
+                elif callable(step):
+                    step(cursor)
+                else:
+                    ensure_index(cursor, *step)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                (version, description)
+            )
+            conn.commit()
+            applied.append(version)
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+        cursor.fetchall()
+        cursor.close()
+    return applied
+
+
+# Representative statements for each route, with the table and leading index
+# columns they should be served by
+VERIFY_QUERIES = [
+    ("/api/posts (sort by likes)",
+     "SELECT post_id FROM posts ORDER BY likes DESC, post_id DESC LIMIT 20 OFFSET 200", (), 'posts', ['likes']),
+    ("/api/posts (date range)",
+     "SELECT post_id FROM posts WHERE post_datetime >= %s ORDER BY post_datetime DESC, post_id DESC LIMIT 20",
+     ('2024-01-01',), 'posts', ['post_datetime']),
+    ("/api/posts (impressions filter, sort by likes)",
+     "SELECT post_id FROM posts WHERE impressions >= %s ORDER BY likes DESC, post_id DESC LIMIT 20",
+     (10000,), 'posts', ['likes', 'post_datetime', 'impressions']),
+    ("/api/posts (topic filter)",
+     "SELECT post_id FROM topic_posts WHERE topic_id = %s", (1,), 'topic_posts', ['topic_id', 'post_id']),
+    ("/topic/<id> (first page)",
+     "SELECT posts.post_id FROM posts JOIN topic_posts ON posts.post_id = topic_posts.post_id "
+     "WHERE topic_posts.topic_id = %s ORDER BY posts.post_datetime DESC, posts.post_id DESC LIMIT 24",
+     (1,), 'topic_posts', ['topic_id', 'post_id']),
+    ("/api/posts (latest related post)",
+     "SELECT topic_id FROM topic_posts WHERE post_id = %s", (1,), 'topic_posts', ['post_id']),
+    ("/post/<id> (graphic descriptions)",
+     "SELECT graphic_desc_id FROM graphic_desc_posts WHERE post_id = %s", (1,), 'graphic_desc_posts', ['post_id']),
+    ("/api/save-post (graphic description lookup)",
+     "SELECT id FROM graphic_desc WHERE name = %s", ('x',), 'graphic_desc', ['name']),
+    ("/api/search-suggestions (caption fallback)",
+     "SELECT post_id FROM posts WHERE MATCH(caption) AGAINST (%s IN BOOLEAN MODE) LIMIT 10",
+     ('+grid*',), 'posts', ['caption']),
+]
+
+
+# EXPLAIN each representative query and report whether it uses a suitable index
+def verify(conn):
+    plain = conn.cursor()
+    indexes = {table: _index_columns(plain, table) for table in {q[3] for q in VERIFY_QUERIES}}
+    plain.close()
+
+    cursor = conn.cursor(dictionary=True)
+    report = []
+    for route, sql, params, table, columns in VERIFY_QUERIES:
+        try:
+            cursor.execute(f"EXPLAIN {sql}", params)
+            plan = cursor.fetchall()
+        except Exception as e:
+            report.append({'route': route, 'ok': False, 'error': str(e)})
+            continue
+        row = next((r for r in plan if r.get('table') == table), plan[0] if plan else {})
+        key = row.get('key')
+        key_columns = indexes[table].get(key, (None, []))[1] if key else []
+        report.append({
+            'route': route,
+            'ok': key_columns[:len(columns)] == columns,
+            'index': key,
+            'access': row.get('type'),
+            'extra': row.get('Extra'),
+        })
+    cursor.close()
+    return report
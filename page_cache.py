@@ -0,0 +1,296 @@
+import functools
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, request
+import data_version
+import metrics
+
+# Rendered HTML cache for the post and topic detail pages. Entries live in a
+# byte-bounded in-memory LRU; with PAGE_CACHE_DIR set, entries evicted from
+# memory spill to disk there (bounded by PAGE_CACHE_DISK_MAX_BYTES, shared
+# by all workers) and are promoted back on a hit.
+#
+# Invalidation is targeted: save_post appends the keys of the pages a new
+# post affects ("post:12 topic:3 ...", or "*" for everything) to a journal
+# file next to the data version stamp, which every worker reads on lookup.
+# Each entry remembers the journal position at which its render started,
+# so it is stale once a later journal line names its page. Pages are also
+# re-rendered after PAGE_CACHE_TTL, which bounds drift the journal does not
+# track (e.g. caption-similarity scores shifting as the corpus grows).
+
+MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+TTL = int(os.getenv("PAGE_CACHE_TTL", 3600))
+DISK_DIR = os.getenv("PAGE_CACHE_DIR") or None
+DISK_MAX_BYTES = int(os.getenv("PAGE_CACHE_DISK_MAX_BYTES", 256 * 1024 * 1024))
+JOURNAL_FILE = os.getenv("PAGE_CACHE_JOURNAL") or f"{data_version.STATE_FILE}.pages"
+JOURNAL_MAX_BYTES = 1024 * 1024
+MAX_KEYS_PER_INVALIDATION = 500  # beyond this, flush everything instead
+FLUSH = "*"
+
+metrics.describe('page_cache_requests_total', 'counter', 'Detail page lookups, by page kind and result.')
+
+_lock = threading.RLock()
+_entries = OrderedDict()  # key -> (journal id, position, created, body)
+_bytes = 0
+_journal_id = None        # (st_dev, st_ino) of the journal read so far
+_journal_offset = 0
+_flushed_at = 0           # journal position of the last full flush
+_invalidated = {}         # key -> journal position of its last invalidation
+_disk_written = 0         # bytes spilled since the last disk sweep
+
+
+def page_key(kind, ident):
+    return f"{kind}:{ident}"
+
+
+def _reset_memory():
+    global _bytes
+    _entries.clear()
+    _bytes = 0
+
+
+# Read journal lines appended since the last call; a replaced or truncated
+# journal (new epoch, rotation) invalidates everything cached so far
+def _sync_journal():
+    global _journal_id, _journal_offset, _flushed_at, _invalidated
+    try:
+        st = os.stat(JOURNAL_FILE)
+        ident, size = (st.st_dev, st.st_ino), st.st_size
+    except FileNotFoundError:
+        ident, size = None, 0
+
+    with _lock:
+        if ident != _journal_id or size < _journal_offset:
+            _reset_memory()
+            _journal_id, _journal_offset, _flushed_at, _invalidated = ident, 0, 0, {}
+        if size == _journal_offset:
+            return
+        try:
+            with open(JOURNAL_FILE, "rb") as f:
+                f.seek(_journal_offset)
+                data = f.read(size - _journal_offset)
+        except OSError:
+            return
+        position = _journal_offset
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break  # partially written; picked up next time
+            position += len(line)
+            keys = line.decode("utf-8", errors="replace").split()
+            if FLUSH in keys:
+                _flushed_at = position
+            else:
+                for key in keys:
+                    _invalidated[key] = position
+        _journal_offset = position
+
+
+def _valid(key, journal_id, position, created):
+    return (journal_id == _journal_id
+            and position >= _flushed_at
+            and position >= _invalidated.get(key, 0)
+            and time.time() - created < TTL)
+
+
+# ----------- Disk spill -----------
+
+def _disk_path(key):
+    return os.path.join(DISK_DIR, hashlib.sha1(key.encode()).hexdigest() + ".html")
+
+
+def _spill(key, entry):
+    global _disk_written
+    journal_id, position, created, body = entry
+    dev, ino = journal_id if journal_id else ("-", "-")
+    path = _disk_path(key)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(DISK_DIR, exist_ok=True)
+        with open(temp_path, "wb") as f:
+            f.write(f"{dev} {ino} {position} {created}\n".encode())
+            f.write(body)
+        os.replace(temp_path, path)
+    except OSError as e:
+        current_app.logger.warning(f"Page cache spill failed for {key}: {e}")
+        return
+    _disk_written += len(body)
+    if _disk_written > DISK_MAX_BYTES // 4:
+        _disk_written = 0
+        _sweep_disk()
+
+
+# Delete the least recently used spill files until the directory fits
+def _sweep_disk():
+    try:
+        files = []
+        for name in os.listdir(DISK_DIR):
+            if name.endswith(".html"):
+                path = os.path.join(DISK_DIR, name)
+                st = os.stat(path)
+                files.append((st.st_mtime, st.st_size, path))
+    except OSError:
+        return
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= DISK_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+
+def _load_from_disk(key):
+    path = _disk_path(key)
+    try:
+        with open(path, "rb") as f:
+            header = f.readline().decode().split()
+            body = f.read()
+        dev, ino, position, created = header
+        journal_id = None if dev == "-" else (int(dev), int(ino))
+        entry = (journal_id, int(position), float(created), body)
+    except (OSError, ValueError):
+        return None
+    if not _valid(key, *entry[:3]):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+    os.utime(path)
+    return entry
+
+
+# ----------- Lookup / store -----------
+
+def get(key):
+    _sync_journal()
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            if _valid(key, *entry[:3]):
+                _entries.move_to_end(key)
+                return entry[3], "memory"
+            _remove(key)
+    if DISK_DIR:
+        entry = _load_from_disk(key)
+        if entry is not None:
+            _store(key, entry)
+            return entry[3], "disk"
+    return None, "miss"
+
+
+def _remove(key):
+    global _bytes
+    entry = _entries.pop(key, None)
+    if entry is not None:
+        _bytes -= len(entry[3])
+
+
+def _store(key, entry):
+    global _bytes
+    evicted = []
+    with _lock:
+        _remove(key)
+        _entries[key] = entry
+        _bytes += len(entry[3])
+        while _bytes > MAX_BYTES and len(_entries) > 1:
+            old_key, old_entry = _entries.popitem(last=False)
+            _bytes -= len(old_entry[3])
+            evicted.append((old_key, old_entry))
+    if DISK_DIR:
+        for old_key, old_entry in evicted:
+            if _valid(old_key, *old_entry[:3]):
+                _spill(old_key, old_entry)
+
+
+def _position():
+    _sync_journal()
+    with _lock:
+        return _journal_id, _journal_offset
+
+
+# Decorator for detail views: `kind` plus the view argument form the page key.
+# Only plain 200 GETs without a query string are cached.
+def cached(kind):
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.args or request.method != "GET":
+                return view(*args, **kwargs)
+            key = page_key(kind, next(iter(kwargs.values())))
+            body, source = get(key)
+            metrics.inc('page_cache_requests_total', page=kind, result=source)
+            if body is not None:
+                return current_app.response_class(body, mimetype="text/html")
+
+            journal_id, position = _position()
+            created = time.time()
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                _store(key, (journal_id, position, created, response.get_data()))
+            return response
+        return wrapper
+    return decorator
+
+
+# ----------- Invalidation -----------
+
+def _append(line):
+    if os.path.exists(JOURNAL_FILE) and os.path.getsize(JOURNAL_FILE) > JOURNAL_MAX_BYTES:
+        clear()
+        return
+    fd = os.open(JOURNAL_FILE, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode())
+    finally:
+        os.close(fd)
+
+
+# Mark pages stale in every worker
+def invalidate(keys):
+    keys = sorted(set(keys))
+    if not keys:
+        return
+    if len(keys) > MAX_KEYS_PER_INVALIDATION:
+        invalidate_all()
+        return
+    _append(" ".join(keys) + "\n")
+    _sync_journal()
+
+
+def invalidate_all():
+    _append(f"{FLUSH}\n")
+    _sync_journal()
+
+
+# Start over with an empty journal and spill directory; run on server start,
+# since data may have changed while it was down
+def clear():
+    temp_path = f"{JOURNAL_FILE}.{os.getpid()}.tmp"
+    with open(temp_path, "w"):
+        pass
+    os.replace(temp_path, JOURNAL_FILE)
+    if DISK_DIR and os.path.isdir(DISK_DIR):
+        for name in os.listdir(DISK_DIR):
+            if name.endswith(".html"):
+                try:
+                    os.remove(os.path.join(DISK_DIR, name))
+                except OSError:
+                    pass
+    _sync_journal()
+
+
+def stats():
+    with _lock:
+        return {
+            'entries': len(_entries),
+            'bytes': _bytes,
+            'max_bytes': MAX_BYTES,
+            'disk_dir': DISK_DIR,
+            'journal_position': _journal_offset,
+        }
@@ -0,0 +1,346 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from datetime import datetime, timezone
+import mysql.connector
+from dotenv import load_dotenv
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Columnar export of the dataset for notebooks, as an alternative to
+# reparsing the /download JSON. Runs on its own (no web server, no app
+# import) against the DB_* database:
+#
+#   python parquet_export.py --out exports/            # incremental
+#   python parquet_export.py --out exports/ --full     # rewrite everything
+#   python parquet_export.py --out exports/ --since 2025-01-01
+#
+# Layout:
+#   posts/created_month=YYYY-MM/part-<run>.parquet  one row per post, with
+#                                                   its topic and graphic
+#                                                   description names as lists;
+#                                                   created_month=unknown holds
+#                                                   posts without created_at
+#   since-<date>/posts/...                          --since output, same layout,
+#                                                   replaced by each such run
+#   topics.parquet, graphic_desc.parquet            full tables, rewritten by
+#                                                   every run except --since
+#   _export_state.json                              incremental watermark and
+#                                                   the runs it covers
+#
+# Posts are insert-only, so each incremental run exports the half-open
+# created_at range [previous cutoff, cutoff) into new part files. The cutoff
+# trails the database clock by --settle-seconds so rows from transactions
+# still committing are picked up by the next run instead of being skipped.
+# A run's parts count once the state file lists its run id; parts of a run
+# that died before saving the state are deleted by the next run, which
+# exports the same range again. Posts without created_at fall outside every
+# range, so only a first or --full run picks them up.
+# Load with: pandas.read_parquet("exports/posts")
+#
+# Requires pyarrow (in requirements.txt); the web app does not import it.
+
+POST_COLUMNS = [
+    ("post_id", "int64"), ("post_url", "string"), ("media_url", "string"),
+    ("post_datetime", "timestamp"), ("caption", "string"),
+    ("likes", "int64"), ("comments", "int64"), ("impressions", "int64"),
+    ("members_reached", "int64"), ("total_clicks", "int64"),
+    ("main_ebook_clicks", "int64"), ("lead_magnet_clicks", "int64"),
+    ("profile_viewers", "int64"), ("followers_gained", "int64"),
+    ("reactions", "int64"), ("reposts", "int64"), ("saves", "int64"),
+    ("sends", "int64"), ("main_ebook_ctr", "float64"), ("created_at", "timestamp"),
+]
+BATCH_SIZE = 5000
+STATE_FILE = "_export_state.json"
+COMPRESSION = "zstd"
+UNKNOWN_MONTH = "unknown"
+
+
+def db_config():
+    return {
+        "host": os.getenv("DB_HOST"),
+        "port": int(os.getenv("DB_PORT", 3306)),
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASSWORD"),
+        "database": os.getenv("DB_NAME"),
+    }
+
+
+def _arrow_type(kind):
+    if kind == "timestamp":
+        return pa.timestamp("s")
+    return pa.string() if kind == "string" else getattr(pa, kind)()
+
+
+def posts_schema():
+    fields = [pa.field(name, _arrow_type(kind)) for name, kind in POST_COLUMNS]
+    fields += [pa.field("topics", pa.list_(pa.string())), pa.field("graphic_descs", pa.list_(pa.string()))]
+    return pa.schema(fields)
+
+
+def _float(value):
+    return float(value) if value is not None else None
+
+
+def _names_by_post(cursor, post_ids, table, id_column, name_table):
+    placeholders = ", ".join(["%s"] * len(post_ids))
+    cursor.execute(f"""
+        SELECT m.post_id, n.name
+        FROM {table} m
+        JOIN {name_table} n ON n.id = m.{id_column}
+        WHERE m.post_id IN ({placeholders})
+        ORDER BY n.name
+    """, post_ids)
+    names = {}
+    for row in cursor.fetchall():
+        names.setdefault(row["post_id"], []).append(row["name"])
+    return names
+
+
+# Post rows in [since, until) with their topic / graphic description names,
+# in post_id order, BATCH_SIZE at a time (keyset pagination on the primary key)
+def post_batches(cursor, since=None, until=None):
+    columns = ", ".join(name for name, _ in POST_COLUMNS)
+    conditions, params = ["post_id > %s"], []
+    if since is not None:
+        conditions.append("created_at >= %s")
+        params.append(since)
+    if until is not None:
+        conditions.append("created_at < %s")
+        params.append(until)
+
+    last_id = -1
+    while True:
+        cursor.execute(
+            f"SELECT {columns} FROM posts WHERE {' AND '.join(conditions)} ORDER BY post_id LIMIT %s",
+            [last_id] + params + [BATCH_SIZE],
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        post_ids = [row["post_id"] for row in rows]
+        topics = _names_by_post(cursor, post_ids, "topic_posts", "topic_id", "topics")
+        descs = _names_by_post(cursor, post_ids, "graphic_desc_posts", "graphic_desc_id", "graphic_desc")
+        for row in rows:
+            row["main_ebook_ctr"] = _float(row["main_ebook_ctr"])
+            row["topics"] = topics.get(row["post_id"], [])
+            row["graphic_descs"] = descs.get(row["post_id"], [])
+        yield rows
+        last_id = post_ids[-1]
+
+
+def _month(row):
+    if row["created_at"] is None:
+        return UNKNOWN_MONTH
+    return row["created_at"].strftime("%Y-%m")
+
+
+def _replace_atomically(table, path):
+    temp_path = f"{path}.tmp"
+    pq.write_table(table, temp_path, compression=COMPRESSION)
+    os.replace(temp_path, path)
+
+
+# Write posts into per-month partitions under posts_dir; returns {month: row count}
+def export_posts(cursor, posts_dir, run_id, since=None, until=None):
+    schema = posts_schema()
+    writers, counts, temp_paths = {}, {}, {}
+    try:
+        for rows in post_batches(cursor, since, until):
+            by_month = {}
+            for row in rows:
+                by_month.setdefault(_month(row), []).append(row)
+            for month, month_rows in by_month.items():
+                if month not in writers:
+                    partition = os.path.join(posts_dir, f"created_month={month}")
+                    os.makedirs(partition, exist_ok=True)
+                    temp_paths[month] = os.path.join(partition, f".part-{run_id}.parquet.tmp")
+                    writers[month] = pq.ParquetWriter(temp_paths[month], schema, compression=COMPRESSION)
+                writers[month].write_batch(pa.RecordBatch.from_pylist(month_rows, schema=schema))
+                counts[month] = counts.get(month, 0) + len(month_rows)
+    except BaseException:
+        for month, writer in writers.items():
+            writer.close()
+            os.remove(temp_paths[month])
+        raise
+
+    # Publish the part files only once every batch has been written
+    for month, writer in writers.items():
+        writer.close()
+        os.replace(temp_paths[month], os.path.join(os.path.dirname(temp_paths[month]), f"part-{run_id}.parquet"))
+    return counts
+
+
+def export_lookup_tables(cursor, out_dir):
+    cursor.execute("SELECT id, name, created_at FROM topics ORDER BY id")
+    topics = cursor.fetchall()
+    _replace_atomically(pa.Table.from_pylist(topics, schema=pa.schema([
+        ("id", pa.int64()), ("name", pa.string()), ("created_at", pa.timestamp("s")),
+    ])), os.path.join(out_dir, "topics.parquet"))
+
+    cursor.execute("SELECT id, name FROM graphic_desc ORDER BY id")
+    descs = cursor.fetchall()
+    _replace_atomically(pa.Table.from_pylist(descs, schema=pa.schema([
+        ("id", pa.int64()), ("name", pa.string()),
+    ])), os.path.join(out_dir, "graphic_desc.parquet"))
+    return len(topics), len(descs)
+
+
+def load_state(out_dir):
+    try:
+        with open(os.path.join(out_dir, STATE_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(out_dir, state):
+    path = os.path.join(out_dir, STATE_FILE)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def _part_files(posts_dir):
+    if not os.path.isdir(posts_dir):
+        return
+    for partition in os.listdir(posts_dir):
+        partition_dir = os.path.join(posts_dir, partition)
+        if os.path.isdir(partition_dir):
+            for name in os.listdir(partition_dir):
+                yield os.path.join(partition_dir, name), name
+
+
+def _run_id(name):
+    if name.startswith("part-") and name.endswith(".parquet"):
+        return name[len("part-"):-len(".parquet")]
+    return None
+
+
+# Run ids whose parts are part of the export. State files written before
+# runs were recorded cover every part present.
+def published_runs(out_dir, state):
+    if "runs" in state or not state.get("watermark"):
+        return set(state.get("runs", []))
+    return {_run_id(name) for _, name in _part_files(os.path.join(out_dir, "posts"))} - {None}
+
+
+# Delete leftovers of interrupted runs: temp files, and parts published by
+# a run that died before recording itself in the state file
+def remove_unpublished(out_dir, published):
+    removed = 0
+    for path, name in _part_files(os.path.join(out_dir, "posts")):
+        run_id = _run_id(name)
+        if name.endswith(".tmp") or (run_id is not None and run_id not in published):
+            os.remove(path)
+            removed += 1
+    for name in os.listdir(out_dir):
+        if name.startswith(".since-") and name.endswith(".tmp"):
+            shutil.rmtree(os.path.join(out_dir, name), ignore_errors=True)
+    return removed
+
+
+# Export [since, cutoff) into its own since-<date> directory, replacing the
+# output of an earlier run with the same date
+def _export_since(cursor, out_dir, run_id, since, cutoff):
+    name = f"since-{since.strftime('%Y%m%dT%H%M%S')}"
+    temp_dir = os.path.join(out_dir, f".{name}.{run_id}.tmp")
+    os.makedirs(os.path.join(temp_dir, "posts"))
+    try:
+        counts = export_posts(cursor, os.path.join(temp_dir, "posts"), run_id, since, cutoff)
+    except BaseException:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    target = os.path.join(out_dir, name)
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(temp_dir, target)
+    return counts, os.path.join(target, "posts")
+
+
+# One export run. `since` (a datetime) exports [since, cutoff) to its own
+# directory without touching the watermark; otherwise the range starts at
+# the watermark, or at the beginning with `full`, and the watermark moves
+# to the cutoff.
+def run_export(conn, out_dir, since=None, full=False, settle_seconds=60):
+    os.makedirs(out_dir, exist_ok=True)
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT NOW() - INTERVAL %s SECOND AS cutoff", (settle_seconds,))
+    cutoff = cursor.fetchone()["cutoff"]
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+
+    if full:
+        # Forget the watermark first, so a crash below cannot leave it
+        # pointing past posts that were deleted
+        save_state(out_dir, {})
+        shutil.rmtree(os.path.join(out_dir, "posts"), ignore_errors=True)
+    state = load_state(out_dir)
+    published = published_runs(out_dir, state)
+    removed = remove_unpublished(out_dir, published)
+
+    if since is not None:
+        start = since
+        counts, posts_dir = _export_since(cursor, out_dir, run_id, since, cutoff)
+    else:
+        start = datetime.fromisoformat(state["watermark"]) if state.get("watermark") else None
+        posts_dir = os.path.join(out_dir, "posts")
+        counts = export_posts(cursor, posts_dir, run_id, start, cutoff)
+    topics = descs = None
+
+    if since is None:
+        topics, descs = export_lookup_tables(cursor, out_dir)
+        # Only runs that still have parts on disk, so the list does not grow with every run
+        on_disk = {_run_id(name) for _, name in _part_files(posts_dir)}
+        save_state(out_dir, {
+            "watermark": cutoff.isoformat(),
+            "last_run": run_id,
+            "runs": sorted((published | {run_id}) & on_disk),
+            "posts_exported": state.get("posts_exported", 0) + sum(counts.values()),
+        })
+    return {"from": start, "until": cutoff, "posts": counts, "posts_dir": posts_dir,
+            "removed": removed, "topics": topics, "graphic_descs": descs}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export posts, topics and graphic descriptions as Parquet.")
+    parser.add_argument("--out", default="exports", help="Output directory (default: exports)")
+    parser.add_argument("--since", type=datetime.fromisoformat,
+                        help="Export posts created at or after this date, ignoring the saved watermark, "
+                             "into a separate since-<date> directory")
+    parser.add_argument("--full", action="store_true", help="Discard earlier post partitions and export everything")
+    parser.add_argument("--settle-seconds", type=int, default=60,
+                        help="Leave posts newer than this for the next run (default: 60)")
+    args = parser.parse_args()
+
+    if pa is None:
+        sys.exit("pyarrow is required for Parquet export: pip install -r requirements.txt")
+    if args.since and args.full:
+        sys.exit("--since and --full cannot be combined.")
+
+    load_dotenv()
+    started = time.perf_counter()
+    conn = mysql.connector.connect(**db_config())
+    try:
+        result = run_export(conn, args.out, args.since, args.full, args.settle_seconds)
+    finally:
+        conn.close()
+
+    posts = result["posts"]
+    if result["removed"]:
+        print(f"Removed {result['removed']} files left by an interrupted run")
+    tables = ""
+    if result["topics"] is not None:
+        tables = f", {result['topics']} topics, {result['graphic_descs']} graphic descriptions to {args.out}"
+    print(f"Exported {sum(posts.values())} posts in {len(posts)} partitions "
+          f"(created_at {result['from'] or 'start'} .. {result['until']}) to {result['posts_dir']}"
+          f"{tables} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
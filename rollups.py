@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta
+
+# Precomputed engagement rollups: daily, weekly (Monday start), weekday x
+# hour and per-topic monthly sums of the main post metrics. The tables are
+# created and backfilled by migration 5 and kept current by save_post, which
+# adds each new post in the same transaction. CTR is derived when reading
+# (main_ebook_clicks / impressions) so the stored sums stay additive.
+
+METRICS = ('likes', 'impressions', 'total_clicks', 'main_ebook_clicks', 'followers_gained')
+
+# rollup name -> (table, key columns, SQL expressions for the keys)
+ROLLUPS = {
+    'daily': ('rollup_daily', ('day',), ("DATE(p.post_datetime)",)),
+    'weekly': ('rollup_weekly', ('week_start',),
+               ("DATE_SUB(DATE(p.post_datetime), INTERVAL WEEKDAY(p.post_datetime) DAY)",)),
+    'weekday-hour': ('rollup_weekday_hour', ('weekday', 'hour'),
+                     ("WEEKDAY(p.post_datetime)", "HOUR(p.post_datetime)")),
+    'topic-monthly': ('rollup_topic_monthly', ('topic_id', 'month'),
+                      ("tp.topic_id", "DATE_FORMAT(p.post_datetime, '%Y-%m-01')")),
+}
+
+_METRIC_COLUMNS = ",\n    ".join(f"{name} BIGINT NOT NULL DEFAULT 0" for name in METRICS)
+
+SCHEMA = [
+    f"""CREATE TABLE IF NOT EXISTS rollup_daily (
+    day DATE PRIMARY KEY,
+    posts INT NOT NULL DEFAULT 0,
+    {_METRIC_COLUMNS}
+)""",
+    f"""CREATE TABLE IF NOT EXISTS rollup_weekly (
+    week_start DATE PRIMARY KEY,
+    posts INT NOT NULL DEFAULT 0,
+    {_METRIC_COLUMNS}
+)""",
+    f"""CREATE TABLE IF NOT EXISTS rollup_weekday_hour (
+    weekday TINYINT NOT NULL,
+    hour TINYINT NOT NULL,
+    posts INT NOT NULL DEFAULT 0,
+    {_METRIC_COLUMNS},
+    PRIMARY KEY (weekday, hour)
+)""",
+    f"""CREATE TABLE IF NOT EXISTS rollup_topic_monthly (
+    topic_id INT NOT NULL,
+    month DATE NOT NULL,
+    posts INT NOT NULL DEFAULT 0,
+    {_METRIC_COLUMNS},
+    PRIMARY KEY (topic_id, month)
+)""",
+]
+
+
+def _int(value):
+    try:
+        return int(float(value)) if value not in (None, '') else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+def _upsert_sql(table, keys):
+    columns = list(keys) + ['posts'] + list(METRICS)
+    updates = ', '.join(f"{c} = {c} + VALUES({c})" for c in ['posts'] + list(METRICS))
+    return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+            f"ON DUPLICATE KEY UPDATE {updates}")
+
+
+# Recompute every rollup from posts; used by the migration backfill
+def rebuild(cursor):
+    sums = ', '.join(f"COALESCE(SUM(p.{name}), 0)" for name in METRICS)
+    for table, keys, expressions in ROLLUPS.values():
+        join = "JOIN topic_posts tp ON tp.post_id = p.post_id" if 'topic_id' in keys else ""
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(f"""
+            INSERT INTO {table} ({', '.join(keys)}, posts, {', '.join(METRICS)})
+            SELECT {', '.join(expressions)}, COUNT(*), {sums}
+            FROM posts p {join}
+            WHERE p.post_datetime IS NOT NULL
+            GROUP BY {', '.join(expressions)}
+        """)
+
+
+# Add one newly inserted post to every rollup, inside the caller's transaction
+def add_post(cursor, post_data, topic_ids):
+    posted = post_data.get('post_datetime')
+    if isinstance(posted, str):
+        posted = datetime.fromisoformat(posted) if posted else None
+    if not posted:
+        return
+    values = [1] + [_int(post_data.get(name)) for name in METRICS]
+    day = posted.date()
+
+    cursor.execute(_upsert_sql('rollup_daily', ('day',)), [day] + values)
+    cursor.execute(_upsert_sql('rollup_weekly', ('week_start',)),
+                   [day - timedelta(days=posted.weekday())] + values)
+    cursor.execute(_upsert_sql('rollup_weekday_hour', ('weekday', 'hour')),
+                   [posted.weekday(), posted.hour] + values)
+    month = day.replace(day=1)
+    for topic_id in topic_ids:
+        cursor.execute(_upsert_sql('rollup_topic_monthly', ('topic_id', 'month')), [topic_id, month] + values)
+
+
+def _with_rates(row):
+    impressions = row.get('impressions') or 0
+    posts = row.get('posts') or 0
+    row['ctr'] = round(row['main_ebook_clicks'] / impressions * 100, 2) if impressions else 0
+    for name in ('likes', 'impressions', 'main_ebook_clicks'):
+        row[f'avg_{name}'] = round(row[name] / posts, 2) if posts else 0
+    return row
+
+
+# Rows of one rollup, optionally limited to a date range and (topic-monthly) one topic
+def fetch(cursor, name, date_from=None, date_to=None, topic_id=None):
+    table, keys, _ = ROLLUPS[name]
+    query = f"SELECT * FROM {table} WHERE 1=1"
+    params = []
+    date_key = next((k for k in keys if k in ('day', 'week_start', 'month')), None)
+    if date_key and date_from:
+        query += f" AND {date_key} >= %s"
+        params.append(date_from)
+    if date_key and date_to:
+        query += f" AND {date_key} <= %s"
+        params.append(date_to)
+    if topic_id is not None and 'topic_id' in keys:
+        query += " AND topic_id = %s"
+        params.append(topic_id)
+    query += f" ORDER BY {', '.join(keys)}"
+    cursor.execute(query, params)
+    return [_with_rates(row) for row in cursor.fetchall()]
@@ -0,0 +1,179 @@
+import math
+import threading
+from datetime import datetime
+
+# In-memory "similar posts" index built from topic_posts and graphic_desc_posts.
+# Posts are scored with an IDF-weighted Jaccard overlap of their topics, blended
+# with the overlap of their graphic descriptions, and the top-K neighbours of
+# each post are kept in memory once computed.
+
+TOP_K = 10
+GRAPHIC_DESC_WEIGHT = 0.25
+MAX_CANDIDATES = 2000
+
+_lock = threading.RLock()
+_loaded = False
+
+_post_datetimes = {}  # post_id -> post_datetime
+_post_topics = {}     # post_id -> set of topic ids
+_post_descs = {}      # post_id -> set of graphic_desc ids
+_topic_posts = {}     # topic_id -> list of post ids, oldest first
+_desc_posts = {}      # graphic_desc_id -> list of post ids, oldest first
+_neighbours = {}      # post_id -> [(score, post_id), ...], best first
+
+
+def _sort_key(post_id):
+    return _post_datetimes.get(post_id) or datetime.min
+
+
+def _idf(df):
+    return math.log(1 + len(_post_datetimes) / df) if df else 0.0
+
+
+def _weighted_jaccard(a, b, postings):
+    if not a or not b:
+        return 0.0
+    shared = sum(_idf(len(postings.get(t, ()))) for t in a & b)
+    if not shared:
+        return 0.0
+    union = sum(_idf(len(postings.get(t, ()))) for t in a | b)
+    return shared / union if union else 0.0
+
+
+def _score(a, b):
+    topic_score = _weighted_jaccard(_post_topics.get(a, set()), _post_topics.get(b, set()), _topic_posts)
+    descs_a = _post_descs.get(a)
+    descs_b = _post_descs.get(b)
+    if descs_a and descs_b:
+        desc_score = _weighted_jaccard(descs_a, descs_b, _desc_posts)
+        return (1 - GRAPHIC_DESC_WEIGHT) * topic_score + GRAPHIC_DESC_WEIGHT * desc_score
+    return topic_score
+
+
+def _candidates(post_id):
+    # Rarest topics first so that huge topics do not drown out specific ones;
+    # from each topic only its most recent posts are considered.
+    candidates = set()
+    topics = sorted(_post_topics.get(post_id, ()), key=lambda t: len(_topic_posts.get(t, ())))
+    for topic_id in topics:
+        remaining = MAX_CANDIDATES - len(candidates)
+        if remaining <= 0:
+            break
+        candidates.update(_topic_posts.get(topic_id, [])[-remaining:])
+    candidates.discard(post_id)
+    return candidates
+
+
+def _compute_neighbours(post_id):
+    scored = []
+    for other in _candidates(post_id):
+        score = _score(post_id, other)
+        if score > 0:
+            scored.append((score, other))
+    scored.sort(key=lambda s: (s[0], _sort_key(s[1])), reverse=True)
+    return scored[:TOP_K]
+
+
+def rebuild(cursor):
+    global _loaded
+    cursor.execute("SELECT post_id, post_datetime FROM posts ORDER BY post_datetime")
+    post_rows = cursor.fetchall()
+    cursor.execute("SELECT post_id, topic_id FROM topic_posts")
+    topic_rows = cursor.fetchall()
+    cursor.execute("SELECT post_id, graphic_desc_id FROM graphic_desc_posts")
+    desc_rows = cursor.fetchall()
+
+    with _lock:
+        _post_datetimes.clear()
+        _post_topics.clear()
+        _post_descs.clear()
+        _topic_posts.clear()
+        _desc_posts.clear()
+        _neighbours.clear()
+
+        for row in post_rows:
+            _post_datetimes[row['post_id']] = row['post_datetime']
+        for row in topic_rows:
+            _post_topics.setdefault(row['post_id'], set()).add(row['topic_id'])
+            _topic_posts.setdefault(row['topic_id'], []).append(row['post_id'])
+        for row in desc_rows:
+            _post_descs.setdefault(row['post_id'], set()).add(row['graphic_desc_id'])
+            _desc_posts.setdefault(row['graphic_desc_id'], []).append(row['post_id'])
+
+        for postings in (_topic_posts, _desc_posts):
+            for ids in postings.values():
+                ids.sort(key=_sort_key)
+        _loaded = True
+
+
+def is_loaded():
+    return _loaded
+
+
+def ensure_loaded(cursor):
+    if not _loaded:
+        rebuild(cursor)
+
+
+# Drop the index so the next ensure_loaded rebuilds it from the database
+def invalidate():
+    global _loaded
+    with _lock:
+        _loaded = False
+
+
+def add_post(post_id, post_datetime, topic_ids, graphic_desc_ids=()):
+    if isinstance(post_datetime, str):
+        post_datetime = datetime.strptime(post_datetime, '%Y-%m-%d %H:%M:%S')
+
+    with _lock:
+        if not _loaded:
+            return
+
+        _post_datetimes[post_id] = post_datetime
+        _post_topics[post_id] = set(topic_ids)
+        _post_descs[post_id] = set(graphic_desc_ids)
+        for topic_id in topic_ids:
+            ids = _topic_posts.setdefault(topic_id, [])
+            ids.append(post_id)
+            if len(ids) > 1 and _sort_key(ids[-2]) > _sort_key(post_id):
+                ids.sort(key=_sort_key)
+        for gd_id in graphic_desc_ids:
+            ids = _desc_posts.setdefault(gd_id, [])
+            ids.append(post_id)
+            if len(ids) > 1 and _sort_key(ids[-2]) > _sort_key(post_id):
+                ids.sort(key=_sort_key)
+
+        # Posts sharing a topic or graphic description see new IDF weights and
+        # a new candidate; drop their cached lists so they are recomputed on
+        # the next lookup. (The corpus size in the IDF also grows for every
+        # other post, which is left to drift until the next rebuild.)
+        for topic_id in topic_ids:
+            for other in _topic_posts.get(topic_id, ()):
+                _neighbours.pop(other, None)
+        for gd_id in graphic_desc_ids:
+            for other in _desc_posts.get(gd_id, ()):
+                _neighbours.pop(other, None)
+        _neighbours[post_id] = _compute_neighbours(post_id)
+
+
+def similar_posts(post_id, limit=TOP_K):
+    with _lock:
+        neighbours = _neighbours.get(post_id)
+        if neighbours is None:
+            neighbours = _compute_neighbours(post_id)
+            _neighbours[post_id] = neighbours
+        return [other for _, other in neighbours[:limit]]
+
+
+# Most recent post sharing a topic with post_id (including the post itself)
+def latest_related_post(post_id):
+    with _lock:
+        latest = None
+        for topic_id in _post_topics.get(post_id, ()):
+            ids = _topic_posts.get(topic_id)
+            if ids and (latest is None or _sort_key(ids[-1]) > _sort_key(latest)):
+                latest = ids[-1]
+        if latest is None:
+            return None
+        return {'post_id': latest, 'post_datetime': _post_datetimes.get(latest)}
@@ -0,0 +1,255 @@
+import functools
+import json
+import threading
+from flask import current_app, request
+import data_version
+import metrics
+
+# Request coalescing: concurrent identical requests (same endpoint, view
+# args, query string, JSON body and data version) share one in-flight
+# computation. The first caller runs the view; the others wait for it and
+# get their own copy of the result. The data version in the key keeps a
+# request that arrives after a save from joining work started before it,
+# which would hand it a pre-save body under the new ETag. Streamed responses are shared through a replay buffer:
+# late joiners read it from the start, so it is only trimmed once it grows
+# past STREAM_REPLAY_BYTES, after which the stream stops taking new readers.
+# From then on a reader that falls more than STREAM_MAX_LAG_BYTES behind the
+# fastest one is detached (its response fails and the client can retry), so
+# a stalled client cannot pin the rest of the body in memory.
+# Only in-flight work is shared: nothing is kept afterwards.
+
+metrics.describe('singleflight_coalesced_total', 'counter',
+                 'Requests answered by joining an identical in-flight request.')
+metrics.describe('singleflight_detached_readers_total', 'counter',
+                 'Shared-stream readers dropped for falling too far behind.')
+
+STREAM_REPLAY_BYTES = 8 * 1024 * 1024
+STREAM_MAX_LAG_BYTES = 16 * 1024 * 1024
+
+_lock = threading.Lock()
+_calls = {}    # key -> _Call
+_streams = {}  # key -> _SharedStream still open to new readers
+
+
+class StreamLagError(Exception):
+    pass
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# Run fn() once per key across concurrent callers; returns (result, shared)
+def do(key, fn):
+    with _lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _calls[key] = _Call()
+
+    if not leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result, True
+
+    try:
+        call.result = fn()
+    except BaseException as e:
+        call.error = e
+        raise
+    finally:
+        with _lock:
+            _calls.pop(key, None)
+        call.done.set()
+    return call.result, False
+
+
+class _SharedStream:
+    # Chunks are pulled from the source by whichever reader needs the next one
+    # and kept until every active reader has passed them.
+
+    def __init__(self, key, source, status, headers):
+        self.status = status
+        self.headers = headers
+        self._key = key
+        self._source = iter(source)
+        self._close_source = getattr(source, 'close', None)
+        self._lock = threading.Lock()
+        self._chunks = []
+        self._starts = []      # absolute byte offset of each buffered chunk
+        self._base = 0         # absolute index of self._chunks[0]
+        self._buffered = 0     # bytes held in self._chunks
+        self._total = 0        # bytes pulled from the source so far
+        self._positions = {}   # reader id -> next absolute index
+        self._detached = set()
+        self._finished = False
+        self._error = None
+
+    def _retire(self):
+        with _lock:
+            if _streams.get(self._key) is self:
+                del _streams[self._key]
+
+    # Register a reader; None once the start of the stream has been trimmed
+    def open_reader(self):
+        with self._lock:
+            if self._base or self._error is not None:
+                return None
+            reader_id = object()
+            self._positions[reader_id] = 0
+        return _Reader(self, reader_id)
+
+    def _read(self, reader_id):
+        while True:
+            with self._lock:
+                if reader_id in self._detached:
+                    raise StreamLagError("Reader fell too far behind the shared stream")
+                position = self._positions[reader_id]
+                if position - self._base < len(self._chunks):
+                    chunk = self._chunks[position - self._base]
+                elif self._finished:
+                    if self._error is not None:
+                        raise self._error
+                    return
+                else:
+                    try:
+                        chunk = next(self._source)
+                    except StopIteration:
+                        # Finished streams take no new readers; a fresh request recomputes
+                        self._finished = True
+                        self._retire()
+                        continue
+                    except Exception as e:
+                        self._finished, self._error = True, e
+                        raise
+                    self._chunks.append(chunk)
+                    self._starts.append(self._total)
+                    self._buffered += len(chunk)
+                    self._total += len(chunk)
+                self._positions[reader_id] = position + 1
+                self._trim()
+            yield chunk
+
+    def _offset(self, position):
+        index = position - self._base
+        return self._starts[index] if index < len(self._starts) else self._total
+
+    def _trim(self):
+        if not (self._base or self._buffered > STREAM_REPLAY_BYTES):
+            return
+        front = self._offset(max(self._positions.values()))
+        for reader_id, position in list(self._positions.items()):
+            if front - self._offset(position) > STREAM_MAX_LAG_BYTES:
+                del self._positions[reader_id]
+                self._detached.add(reader_id)
+                metrics.inc('singleflight_detached_readers_total')
+        lowest = min(self._positions.values())
+        if lowest > self._base:
+            if not self._base:
+                self._retire()
+            count = lowest - self._base
+            self._buffered -= sum(len(chunk) for chunk in self._chunks[:count])
+            del self._chunks[:count]
+            del self._starts[:count]
+            self._base = lowest
+
+    def _close_reader(self, reader_id):
+        with self._lock:
+            self._detached.discard(reader_id)
+            if self._positions.pop(reader_id, None) is None:
+                return
+            abandoned = not self._positions
+            if abandoned and not self._finished:
+                self._finished = True
+                self._error = GeneratorExit()
+        if abandoned:
+            self._retire()
+            if self._close_source:
+                self._close_source()
+
+
+# One reader's view of a shared stream. _build also registers close() with
+# the response, so the reader is released even when a wrapper around it (or
+# an unstarted generator) does not pass close() through.
+class _Reader:
+    def __init__(self, stream, reader_id):
+        self._stream = stream
+        self._reader_id = reader_id
+        self._chunks = stream._read(reader_id)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._chunks)
+
+    def close(self):
+        self._chunks.close()
+        self._stream._close_reader(self._reader_id)
+
+
+def _request_key(key_func):
+    if key_func is not None:
+        extra = key_func()
+    else:
+        body = request.get_json(silent=True)
+        extra = json.dumps(body, sort_keys=True, default=str) if body is not None else None
+    args = tuple(sorted((k, tuple(v)) for k, v in request.args.lists()))
+    data_version.sync()
+    return (data_version.etag(), request.endpoint, tuple(sorted(request.view_args.items())), args, extra)
+
+
+def _snapshot(key, rv):
+    response = current_app.make_response(rv)
+    headers = list(response.headers.items())
+    if response.is_streamed:
+        shared = _SharedStream(key, response.response, response.status_code, headers)
+        with _lock:
+            _streams[key] = shared
+        return shared
+    return (response.get_data(), response.status_code, headers)
+
+
+# A fresh response per caller, so after_request hooks run on each one
+def _build(snapshot):
+    if isinstance(snapshot, _SharedStream):
+        reader = snapshot.open_reader()
+        if reader is None:
+            return None
+        response = current_app.response_class(reader, status=snapshot.status, headers=snapshot.headers)
+        response.call_on_close(reader.close)
+        return response
+    body, status, headers = snapshot
+    return current_app.response_class(body, status=status, headers=headers)
+
+
+# Decorator for read-only views whose result depends only on the request
+# itself; `key` may return a normalized form of the parts that matter
+def coalesce(key=None):
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            request_key = _request_key(key)
+
+            with _lock:
+                shared = _streams.get(request_key)
+            if shared is not None:
+                response = _build(shared)
+                if response is not None:
+                    metrics.inc('singleflight_coalesced_total', endpoint=request.endpoint)
+                    return response
+
+            snapshot, joined = do(request_key, lambda: _snapshot(request_key, view(*args, **kwargs)))
+            response = _build(snapshot)
+            if response is None:
+                # The shared stream moved on before we could join; run our own
+                return view(*args, **kwargs)
+            if joined:
+                metrics.inc('singleflight_coalesced_total', endpoint=request.endpoint)
+            return response
+        return wrapper
+    return decorator
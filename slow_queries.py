@@ -0,0 +1,151 @@
+import logging
+import os
+import threading
+from flask import has_request_context, request
+import metrics
+
+# Opt-in slow query capture for development. Any statement slower than
+# SLOW_QUERY_MS is logged with its parameters and EXPLAIN plan (run on a
+# separate connection so the caller's cursor is left untouched), and
+# aggregated per route for the /api/slow-queries report. Only execute time
+# is measured, which covers planning, sorting and grouping but not fetching
+# the rows of an unbuffered cursor.
+
+DEFAULT_THRESHOLD_MS = 200
+MAX_EXPLAINED_STATEMENTS = 256
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_report = {}   # route -> sql -> aggregate
+_plans = {}    # sql -> (explain rows, flags)
+_connect = None
+_threshold = DEFAULT_THRESHOLD_MS / 1000
+
+
+def _flags(plan):
+    flags = set()
+    for row in plan:
+        access = row.get('type')
+        extra = row.get('Extra') or ''
+        if access == 'ALL':
+            flags.add(f"full scan on {row.get('table')}")
+        elif access == 'index':
+            flags.add(f"full index scan on {row.get('table')}")
+        if 'Using filesort' in extra:
+            flags.add('filesort')
+        if 'Using temporary' in extra:
+            flags.add('temporary table')
+    return sorted(flags)
+
+
+def _explain(sql, params):
+    if sql in _plans:
+        return _plans[sql]
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return [], []
+
+    conn = None
+    try:
+        conn = _connect()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(f"EXPLAIN {sql}", params)
+        plan = cursor.fetchall()
+        cursor.close()
+    except Exception as e:
+        logger.warning(f"EXPLAIN failed: {e}")
+        return [], []
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+
+    result = (plan, _flags(plan))
+    with _lock:
+        if len(_plans) < MAX_EXPLAINED_STATEMENTS:
+            _plans[sql] = result
+    return result
+
+
+def _on_query(sql, params, seconds):
+    if seconds < _threshold:
+        return
+    sql = sql if isinstance(sql, str) else sql.decode('utf-8', errors='replace')
+    route = request.url_rule.rule if has_request_context() and request.url_rule else 'background'
+    plan, flags = _explain(sql, params)
+
+    logger.warning(
+        f"Slow query ({seconds * 1000:.0f} ms) on {route}: {' '.join(sql.split())} "
+        f"params={params!r} flags={flags} plan={plan}"
+    )
+
+    with _lock:
+        entry = _report.setdefault(route, {}).setdefault(sql, {
+            'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+            'flags': flags, 'explain': plan, 'last_params': None,
+        })
+        entry['count'] += 1
+        entry['total_ms'] += seconds * 1000
+        entry['max_ms'] = max(entry['max_ms'], seconds * 1000)
+        entry['last_params'] = list(params) if isinstance(params, (list, tuple)) else params
+
+
+def enabled():
+    return _connect is not None
+
+
+def report():
+    with _lock:
+        routes = {}
+        for route, statements in _report.items():
+            rows = [{
+                'sql': ' '.join(sql.split()),
+                'count': entry['count'],
+                'avg_ms': round(entry['total_ms'] / entry['count'], 1),
+                'max_ms': round(entry['max_ms'], 1),
+                'flags': entry['flags'],
+                'explain': entry['explain'],
+                'last_params': entry['last_params'],
+            } for sql, entry in statements.items()]
+            rows.sort(key=lambda r: r['count'] * r['avg_ms'], reverse=True)
+            routes[route] = rows
+        return {'enabled': enabled(), 'threshold_ms': round(_threshold * 1000), 'routes': routes}
+
+
+# Merge the report() of several worker processes
+def combine(reports):
+    routes = {}
+    for report_ in reports:
+        for route, rows in report_['routes'].items():
+            merged = routes.setdefault(route, {})
+            for row in rows:
+                entry = merged.get(row['sql'])
+                if entry is None:
+                    merged[row['sql']] = dict(row)
+                    continue
+                count = entry['count'] + row['count']
+                entry['avg_ms'] = round((entry['avg_ms'] * entry['count'] + row['avg_ms'] * row['count']) / count, 1)
+                entry['max_ms'] = max(entry['max_ms'], row['max_ms'])
+                entry['count'] = count
+                entry['last_params'] = row['last_params']
+    for route, merged in routes.items():
+        routes[route] = sorted(merged.values(), key=lambda r: r['count'] * r['avg_ms'], reverse=True)
+    return {
+        'enabled': any(r['enabled'] for r in reports),
+        'threshold_ms': reports[0]['threshold_ms'] if reports else round(_threshold * 1000),
+        'routes': routes,
+        'workers': len(reports),
+    }
+
+
+# `connect` returns a new, uninstrumented DB-API connection used only for EXPLAIN
+def init_app(app, connect):
+    global _connect, _threshold
+    app.config.setdefault('SLOW_QUERY_LOG', os.getenv('SLOW_QUERY_LOG', '').lower() in ('1', 'true', 'yes'))
+    app.config.setdefault('SLOW_QUERY_MS', int(os.getenv('SLOW_QUERY_MS', DEFAULT_THRESHOLD_MS)))
+    if not app.config['SLOW_QUERY_LOG']:
+        return
+
+    _connect = connect
+    _threshold = app.config['SLOW_QUERY_MS'] / 1000
+    metrics.add_query_listener(_on_query)
+    app.logger.info(f"Slow query capture enabled (threshold {app.config['SLOW_QUERY_MS']} ms)")
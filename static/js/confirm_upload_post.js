@@ -1,5 +1,5 @@
 // --- Generic Tag Input System ---
-function createTagInput({ inputEl, containerEl, fetchUrl, suggestionClass, formatTag }) {
+function createTagInput({ inputEl, containerEl, fetchUrl, suggestionClass, formatTag, onChange }) {
     const suggestionsContainer = document.createElement('div');
     suggestionsContainer.classList.add('tags-input-bar__search-suggestions');
     inputEl.parentNode.appendChild(suggestionsContainer);
@@ -17,7 +17,7 @@ function createTagInput({ inputEl, containerEl, fetchUrl, suggestionClass, forma
 
     async function fetchAllItems() {
         try {
-            const response = await fetch(fetchUrl);
+            const response = await fetch(fetchUrl, { cache: 'no-cache' });
             allItems = await response.json();
         } catch (err) {
             console.error(`Error fetching from ${fetchUrl}:`, err);
@@ -47,6 +47,7 @@ function createTagInput({ inputEl, containerEl, fetchUrl, suggestionClass, forma
                 tags = tags.filter(tag => tag !== tagToRemove);
                 renderTags();
                 toggleTagsContainer();
+                if (onChange) onChange(tags);
             });
         });
         toggleTagsContainer();
@@ -60,6 +61,7 @@ function createTagInput({ inputEl, containerEl, fetchUrl, suggestionClass, forma
         if (!tags.includes(formattedTag)) {
             tags.push(formattedTag);
             renderTags();
+            if (onChange) onChange(tags);
         }
 
         inputEl.value = '';
@@ -101,16 +103,62 @@ function createTagInput({ inputEl, containerEl, fetchUrl, suggestionClass, forma
 
     return {
         getTags: () => tags,
+        addTag,
     };
 }
 
+// --- Related topic suggestions based on the tags already added ---
+function createRelatedTopics({ containerEl, fetchUrl, onSelect }) {
+    let requestId = 0;
+
+    function render(topics) {
+        containerEl.innerHTML = '';
+        topics.forEach(topic => {
+            const chip = document.createElement('button');
+            chip.type = 'button';
+            chip.classList.add('tag--suggested');
+            chip.textContent = `+ ${topic.name}`;
+            chip.addEventListener('click', () => onSelect(topic.name));
+            containerEl.appendChild(chip);
+        });
+    }
+
+    async function update(tags) {
+        const currentRequest = ++requestId;
+        if (tags.length === 0) {
+            render([]);
+            return;
+        }
+
+        const params = new URLSearchParams();
+        tags.forEach(tag => params.append('topics', tag));
+
+        try {
+            const response = await fetch(`${fetchUrl}?${params.toString()}`, { cache: 'no-cache' });
+            const topics = await response.json();
+            if (currentRequest === requestId && Array.isArray(topics)) render(topics);
+        } catch (err) {
+            console.error(`Error fetching from ${fetchUrl}:`, err);
+        }
+    }
+
+    return { update };
+}
+
 // --- Initialize both tag inputs ---
+const relatedTopics = createRelatedTopics({
+    containerEl: document.getElementById('related-topics-container'),
+    fetchUrl: '/api/topic-suggestions',
+    onSelect: (name) => topicTagInput.addTag(name),
+});
+
 const topicTagInput = createTagInput({
     inputEl: document.getElementById('topic-tags-input'),
     containerEl: document.getElementById('topic-tags-container'),
     fetchUrl: '/api/topics',
     suggestionClass: 'suggestion-item--topic',
     formatTag: (tag) => tag.charAt(0).toUpperCase() + tag.slice(1).toLowerCase(),
+    onChange: (tags) => relatedTopics.update(tags),
 });
 
 const graphicDescTagInput = createTagInput({
@@ -1,6 +1,4 @@
-const container = document.querySelector('.similar-posts');
-
-if (container) {
+document.querySelectorAll('.similar-posts').forEach(container => {
     container.addEventListener('wheel', function (e) {
         if (e.deltaY === 0) return;
 
@@ -13,4 +11,4 @@ if (container) {
             container.scrollLeft += e.deltaY * 2;
         }
     }, { passive: false })
-}
+});
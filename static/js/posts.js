@@ -40,6 +40,14 @@
         }
     };
 
+    // "2025-01-05T10:00:00" -> "05 January 2025"
+    function formatDate(isoString) {
+        if (!isoString) return '-';
+        const date = new Date(isoString);
+        if (isNaN(date)) return isoString;
+        return date.toLocaleDateString('en-GB', { day: '2-digit', month: 'long', year: 'numeric' });
+    }
+
     function fetchPosts() {
         state.isLoading = true;
         DOM.loading.style.display = 'block';
@@ -52,7 +60,7 @@
             ...state.filters
         });
 
-        return fetch(`/api/posts?${params.toString()}`)
+        return fetch(`/api/posts?${params.toString()}`, { cache: 'no-cache' })
             .then(res => res.json())
             .then(posts => {
                 posts.forEach(post => {
@@ -72,8 +80,8 @@
                         <span><i class="fas fa-comment"></i> ${post.comments !== null ? post.comments : '-'}</span>
                         <span><i class="fa-solid fa-rocket"></i> ${post.main_ebook_ctr !== null ? post.main_ebook_ctr : '-'}</span>
                         <span><i class="fa-solid fa-mouse-pointer"></i> ${post.main_ebook_clicks !== null ? post.main_ebook_clicks : '-'}</span>
-                        <span><i class="fa-solid fa-calendar"></i> ${post.post_datetime}</span>
-                        <span><i class="fa-solid fa-clock"></i> ${post.latest_post_datetime}</span>
+                        <span><i class="fa-solid fa-calendar"></i> ${formatDate(post.post_datetime)}</span>
+                        <span><i class="fa-solid fa-clock"></i> ${formatDate(post.latest_post_datetime)}</span>
                     `;
 
                     postEl.appendChild(caption);
@@ -0,0 +1,151 @@
+(() => {
+    'use strict';
+
+    const CONFIG = { SCROLL_THRESHOLD: 300 };
+
+    const DOM = {
+        postsGrid: document.getElementById('topic-posts-grid'),
+        loading: document.getElementById('loading')
+    };
+
+    if (!DOM.postsGrid) return;
+
+    let state = {
+        topicId: DOM.postsGrid.dataset.topicId,
+        offset: parseInt(DOM.postsGrid.dataset.offset, 10) || 0,
+        pageSize: parseInt(DOM.postsGrid.dataset.pageSize, 10) || 20,
+        captionLength: parseInt(DOM.postsGrid.dataset.captionLength, 10) || 150,
+        total: parseInt(DOM.postsGrid.dataset.total, 10) || 0,
+        thumbnailBase: DOM.postsGrid.dataset.thumbnailBase,
+        isLoading: false
+    };
+
+    function createOriginalMedia(mediaUrl) {
+        const extension = mediaUrl.split('.').pop().toLowerCase();
+        const src = `/static/media/${mediaUrl}`;
+
+        if (['jpg', 'jpeg', 'png', 'gif'].includes(extension)) {
+            const img = document.createElement('img');
+            img.src = src;
+            img.alt = 'Post Media';
+            img.loading = 'lazy';
+            img.classList.add('post-card__media');
+            return img;
+        }
+        if (['mp4', 'webm'].includes(extension)) {
+            const video = document.createElement('video');
+            video.controls = true;
+            video.preload = 'metadata';
+            video.classList.add('post-card__media');
+            const source = document.createElement('source');
+            source.src = src;
+            source.type = `video/${extension}`;
+            video.appendChild(source);
+            return video;
+        }
+        return null;
+    }
+
+    // Prefer the WebP thumbnail and fall back to the original if it does not exist yet
+    function createMedia(mediaUrl) {
+        if (!mediaUrl || mediaUrl.startsWith('http')) return null;
+
+        const extension = mediaUrl.split('.').pop().toLowerCase();
+        if (!['jpg', 'jpeg', 'png', 'gif', 'webp', 'mp4', 'webm'].includes(extension)) return null;
+
+        const img = document.createElement('img');
+        img.src = `${state.thumbnailBase}${mediaUrl.replace(/\.[^.]+$/, '.webp')}`;
+        img.alt = 'Post Media';
+        img.loading = 'lazy';
+        img.classList.add('post-card__media');
+        img.addEventListener('error', () => {
+            const original = createOriginalMedia(mediaUrl);
+            if (original) img.replaceWith(original);
+            else img.remove();
+        }, { once: true });
+        return img;
+    }
+
+    function createCard(post) {
+        const card = document.createElement('a');
+        card.href = `/post/${post.post_id}`;
+        card.classList.add('post-card');
+
+        const media = createMedia(post.media_url);
+        if (media) card.appendChild(media);
+
+        const caption = document.createElement('div');
+        caption.classList.add('post-card__caption');
+        const captionText = document.createElement('p');
+        captionText.textContent = `${(post.caption || '').slice(0, state.captionLength)}...`;
+        caption.appendChild(captionText);
+
+        const stats = document.createElement('div');
+        stats.classList.add('post-card__stats');
+        stats.innerHTML = `
+            <span><i class="fas fa-eye"></i> ${post.impressions}</span>
+            <span><i class="fas fa-heart"></i> ${post.likes}</span>
+            <span><i class="fas fa-comment"></i> ${post.comments}</span>
+        `;
+
+        card.appendChild(caption);
+        card.appendChild(stats);
+        return card;
+    }
+
+    function hasMore() {
+        return state.offset < state.total;
+    }
+
+    function fetchPosts() {
+        if (state.isLoading || !hasMore()) return;
+        state.isLoading = true;
+        DOM.loading.style.display = 'block';
+
+        const params = new URLSearchParams({
+            topic_id: state.topicId,
+            offset: state.offset,
+            limit: state.pageSize,
+            sort_by: 'post_datetime',
+            sort_order: 'desc',
+            caption_length: state.captionLength
+        });
+
+        return fetch(`/api/posts?${params.toString()}`, { cache: 'no-cache' })
+            .then(res => res.json())
+            .then(posts => {
+                posts.forEach(post => DOM.postsGrid.appendChild(createCard(post)));
+                state.offset += state.pageSize;
+                if (posts.length < state.pageSize) state.total = state.offset;
+                state.isLoading = false;
+                DOM.loading.style.display = 'none';
+                fillViewport();
+            })
+            .catch(err => {
+                console.error('Error fetching topic posts:', err);
+                state.isLoading = false;
+                DOM.loading.style.display = 'none';
+            });
+    }
+
+    function nearBottom() {
+        return window.innerHeight + window.scrollY >= document.body.offsetHeight - CONFIG.SCROLL_THRESHOLD;
+    }
+
+    // A page shorter than the window never scrolls, so keep loading until
+    // it fills the viewport (after the first render and after each page)
+    function fillViewport() {
+        if (nearBottom()) fetchPosts();
+    }
+
+    function init() {
+        window.addEventListener('scroll', () => {
+            if (nearBottom()) fetchPosts();
+        });
+        window.addEventListener('resize', fillViewport);
+        fillViewport();
+    }
+
+    document.addEventListener('DOMContentLoaded', init);
+
+})();
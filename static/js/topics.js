@@ -48,7 +48,7 @@
             ...state.filters
         });
 
-        return fetch(`/api/topics-list?${params.toString()}`)
+        return fetch(`/api/topics-list?${params.toString()}`, { cache: 'no-cache' })
             .then(res => res.json())
             .then(topics => {
                 topics.forEach(topic => {
@@ -5,43 +5,103 @@ document.addEventListener('DOMContentLoaded', () => {
 
     if (!form) return;
 
+    const MAX_CHUNK_RETRIES = 5;
+
+    async function errorMessage(response, fallback) {
+        try {
+            const data = await response.json();
+            return data.error || fallback;
+        } catch (err) {
+            return fallback;
+        }
+    }
+
+    async function currentOffset(uploadId) {
+        const response = await fetch(`/api/video-uploads/${uploadId}`);
+        if (!response.ok) throw new Error(await errorMessage(response, 'Upload expired. Please try again.'));
+        return (await response.json()).offset;
+    }
+
+    // Send the file in chunks; after a failed chunk, ask the server how much
+    // arrived and resume from there
+    async function uploadFile(file) {
+        const createResponse = await fetch('/api/video-uploads', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: file.name, size: file.size })
+        });
+        if (!createResponse.ok) throw new Error(await errorMessage(createResponse, 'Could not start the upload.'));
+        const upload = await createResponse.json();
+
+        let offset = upload.offset;
+        let retries = 0;
+        while (offset < file.size) {
+            const chunk = file.slice(offset, Math.min(offset + upload.chunk_size, file.size));
+            try {
+                const response = await fetch(`/api/video-uploads/${upload.upload_id}`, {
+                    method: 'PUT',
+                    headers: { 'Upload-Offset': String(offset) },
+                    body: chunk
+                });
+                if (response.status === 409) {
+                    // Offset mismatch or another chunk still being written: wait, then resync
+                    if (++retries > MAX_CHUNK_RETRIES) throw new Error(await errorMessage(response, 'Upload failed.'));
+                    await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+                    offset = await currentOffset(upload.upload_id);
+                    continue;
+                }
+                if (!response.ok) throw new Error(await errorMessage(response, 'Upload failed.'));
+                offset = (await response.json()).offset;
+                retries = 0;
+                submitBtn.textContent = `Uploading... ${Math.floor(offset / file.size * 100)}%`;
+            } catch (err) {
+                if (++retries > MAX_CHUNK_RETRIES) throw err;
+                await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+                offset = await currentOffset(upload.upload_id);
+            }
+        }
+        return upload.upload_id;
+    }
+
     form.addEventListener('submit', async (e) => {
         e.preventDefault();
 
+        const file = fileInput.files[0];
+        if (!file) return;
+
         // 1. Update UI to show processing
         const originalBtnText = submitBtn.textContent;
-        submitBtn.textContent = 'Converting...';
+        submitBtn.textContent = 'Uploading...';
         submitBtn.disabled = true;
         submitBtn.style.cursor = 'wait';
 
-        const formData = new FormData(form);
-
         try {
-            const response = await fetch('/video-to-gif', {
-                method: 'POST',
-                body: formData
-            });
+            // 2. Upload in resumable chunks
+            const uploadId = await uploadFile(file);
+
+            // 3. Convert on the server
+            submitBtn.textContent = 'Converting...';
+            const response = await fetch(`/api/video-uploads/${uploadId}/gif`, { method: 'POST' });
 
             const contentType = response.headers.get('content-type');
 
             if (response.ok && contentType && contentType.includes('image/gif')) {
                 const blob = await response.blob();
                 const url = window.URL.createObjectURL(blob);
-                
+
                 // 4. Create a temporary link to trigger download
                 const a = document.createElement('a');
                 a.href = url;
-                
+
                 const disposition = response.headers.get('content-disposition');
                 let filename = 'converted.gif';
                 if (disposition && disposition.indexOf('filename=') !== -1) {
                     const matches = /filename[^;=\n]*=((['"]).*?\2|[^;\n]*)/.exec(disposition);
-                    if (matches != null && matches[1]) { 
+                    if (matches != null && matches[1]) {
                         filename = matches[1].replace(/['"]/g, '');
                     }
-                } else if (fileInput.files[0]) {
-                    const originalName = fileInput.files[0].name;
-                    filename = originalName.replace(/\.[^/.]+$/, "") + ".gif";
+                } else {
+                    filename = file.name.replace(/\.[^/.]+$/, "") + ".gif";
                 }
 
                 a.download = filename;
@@ -52,16 +112,16 @@ document.addEventListener('DOMContentLoaded', () => {
 
                 form.reset();
             } else {
-                alert("An error occurred during conversion. Please check the file format and try again.");
+                alert(await errorMessage(response, "An error occurred during conversion. Please check the file format and try again."));
             }
 
         } catch (err) {
             console.error(err);
-            alert("A network error occurred.");
+            alert(err.message || "A network error occurred.");
         } finally {
             submitBtn.textContent = originalBtnText;
             submitBtn.disabled = false;
             submitBtn.style.cursor = 'pointer';
         }
     });
-});
\ No newline at end of file
+});
@@ -0,0 +1,82 @@
+import os
+import threading
+import time
+
+import pytest
+
+import data_version
+
+
+@pytest.fixture(autouse=True)
+def version_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_version, 'STATE_FILE', str(tmp_path / 'version'))
+    monkeypatch.setattr(data_version, 'DELTA_FILE', str(tmp_path / 'version.deltas'))
+    monkeypatch.setattr(data_version, '_listeners', [])
+    monkeypatch.setattr(data_version, '_delta_listeners', [])
+    data_version.new_epoch()
+
+
+# What bump() does in another worker, without touching this process's state
+def bump_elsewhere(delta=None):
+    with data_version._file_lock():
+        epoch, version, _ = data_version._read_state()
+        if delta is not None:
+            data_version._append_delta(epoch, version + 1, delta)
+        with open(data_version.STATE_FILE, "w") as f:
+            f.write(f"{epoch} {version + 1} {int(time.time())}")
+        os.utime(data_version.STATE_FILE, ns=(time.time_ns(), time.time_ns() + 1))
+    return version + 1
+
+
+def test_deltas_replay_before_the_version_moves():
+    seen = []
+
+    def apply(delta):
+        seen.append((delta['post_id'], data_version.current()))
+
+    data_version.add_delta_listener(apply)
+    bump_elsewhere({'post_id': 1})
+    version = bump_elsewhere({'post_id': 2})
+    data_version.sync()
+    assert seen == [(1, 0), (2, 0)]
+    assert data_version.current() == version
+
+
+def test_failed_replay_falls_back_to_reset():
+    resets = []
+    data_version.add_listener(lambda: resets.append(data_version.current()))
+
+    def apply(delta):
+        raise RuntimeError("index update failed")
+
+    data_version.add_delta_listener(apply)
+    version = bump_elsewhere({'post_id': 1})
+    data_version.sync()
+    assert resets == [0]
+    assert data_version.current() == version
+
+
+def test_concurrent_syncs_replay_once():
+    seen = []
+
+    def apply(delta):
+        time.sleep(0.05)
+        seen.append(delta['post_id'])
+
+    data_version.add_delta_listener(apply)
+    bump_elsewhere({'post_id': 1})
+    threads = [threading.Thread(target=data_version.sync) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert seen == [1]
+
+
+def test_bump_applies_other_saves_first():
+    seen = []
+    data_version.add_delta_listener(lambda delta: seen.append(delta['post_id']))
+    bump_elsewhere({'post_id': 1})
+    assert data_version.bump({'post_id': 2}) == 2
+    assert seen == [1]
+    assert data_version._read_deltas(data_version._epoch, 0, 2) == [{'post_id': 1}, {'post_id': 2}]
@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'MULTIPROCESS_DIR', str(tmp_path / 'metrics'))
+    monkeypatch.setattr(metrics, '_counters', {})
+    monkeypatch.setattr(metrics, '_histograms', {})
+    monkeypatch.setattr(metrics, '_collectors', [])
+    monkeypatch.setattr(metrics, '_status_sources', {})
+
+
+# Record in a forked child, publish, and keep it alive until told to exit
+def worker(record):
+    read_fd, write_fd = os.pipe()
+    ready_fd, signal_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(write_fd)
+        record()
+        metrics.publish()
+        os.write(signal_fd, b"x")
+        os.read(read_fd, 1)
+        os._exit(0)
+    os.read(ready_fd, 1)
+
+    def stop():
+        os.write(write_fd, b"x")
+        os.waitpid(pid, 0)
+    return pid, stop
+
+
+def test_scrape_sums_all_workers():
+    metrics.register_collector(lambda: ["# TYPE queue_depth gauge", f"queue_depth {os.getpid() % 7}"])
+    metrics.register_status('pid', os.getpid)
+    metrics.inc('http_requests_total', route='/a')
+    metrics.observe('db_queries_per_request', 3, route='/a')
+
+    first, stop_first = worker(lambda: metrics.inc('http_requests_total', 2, route='/a'))
+    second, stop_second = worker(lambda: metrics.observe('db_queries_per_request', 30, route='/a'))
+    try:
+        text = metrics.render()
+        assert 'http_requests_total{route="/a"} 3' in text
+        assert 'db_queries_per_request_count{route="/a"} 2' in text
+        assert text.count("# TYPE queue_depth gauge") == 1
+        for pid in (os.getpid(), first, second):
+            assert f'queue_depth{{worker="{pid}"}}' in text
+        assert set(metrics.worker_status('pid')) == {str(os.getpid()), str(first), str(second)}
+    finally:
+        stop_first()
+        stop_second()
+
+
+def test_exited_workers_still_count():
+    for _ in range(2):
+        _, stop = worker(lambda: metrics.inc('http_requests_total', 5, route='/b'))
+        stop()
+    assert 'http_requests_total{route="/b"} 10' in metrics.render()
+    assert sorted(os.listdir(metrics.MULTIPROCESS_DIR)) == sorted(
+        [metrics.EXITED_FILE, metrics._snapshot_name, '.lock'])
+    # Folding is not repeated on later scrapes
+    assert 'http_requests_total{route="/b"} 10' in metrics.render()
@@ -0,0 +1,194 @@
+import gzip
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+import compression
+import data_version
+import singleflight
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_version, 'STATE_FILE', str(tmp_path / 'version'))
+    monkeypatch.setattr(data_version, 'DELTA_FILE', str(tmp_path / 'version.deltas'))
+    data_version.new_epoch()
+    app = Flask(__name__)
+    compression.init_app(app)
+    app.config['COMPRESS_MIN_SIZE'] = 0
+    yield app
+    assert singleflight._calls == {}
+    assert singleflight._streams == {}
+
+
+class Source:
+    # A streamed body that records how often it was started and closed
+    def __init__(self, chunks, delay=0.0):
+        self.chunks = chunks
+        self.delay = delay
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            time.sleep(self.delay)
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+def run_concurrently(fn, count, stagger=0.0):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(fn())) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+        time.sleep(stagger)
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_identical_requests_share_one_run(app):
+    runs = []
+
+    @app.route('/slow')
+    @singleflight.coalesce()
+    def slow():
+        runs.append(1)
+        time.sleep(0.2)
+        return {'value': len(runs)}
+
+    bodies = run_concurrently(lambda: app.test_client().get('/slow?a=1').get_json(), 4, stagger=0.01)
+    assert len(runs) == 1
+    assert bodies == [{'value': 1}] * 4
+
+    app.test_client().get('/slow?a=2')
+    assert len(runs) == 2
+
+
+def test_late_readers_join_a_shared_stream(app):
+    runs = []
+
+    @app.route('/stream')
+    @singleflight.coalesce()
+    def stream():
+        runs.append(1)
+        return app.response_class(Source([f"{i}," for i in range(40)], delay=0.01), mimetype='text/plain')
+
+    def fetch():
+        response = app.test_client().get('/stream')
+        body = response.get_data()
+        response.close()
+        return body
+
+    bodies = run_concurrently(fetch, 3, stagger=0.05)
+    assert len(runs) == 1
+    assert set(bodies) == {"".join(f"{i}," for i in range(40)).encode()}
+
+
+def test_stream_is_trimmed_and_lagging_reader_detached(monkeypatch):
+    monkeypatch.setattr(singleflight, 'STREAM_REPLAY_BYTES', 20)
+    monkeypatch.setattr(singleflight, 'STREAM_MAX_LAG_BYTES', 50)
+    source = Source([b"x" * 10] * 20)
+    shared = singleflight._SharedStream('key', source, 200, [])
+    fast, slow = shared.open_reader(), shared.open_reader()
+
+    next(slow)
+    for _ in range(4):
+        next(fast)
+    # Past the replay window the start is trimmed, so nobody else can join
+    assert shared._buffered <= 40
+    assert shared.open_reader() is None
+
+    for _ in range(4):
+        next(fast)
+    assert shared._buffered <= 60
+    with pytest.raises(singleflight.StreamLagError):
+        next(slow)
+
+    assert b"".join(fast) == b"x" * 120
+    slow.close()
+    fast.close()
+
+
+def test_abandoned_stream_is_released(app):
+    source = Source([b"chunk"] * 10)
+
+    @app.route('/abandon')
+    @singleflight.coalesce()
+    def abandon():
+        return app.response_class(source, mimetype='text/plain')
+
+    # Compressed response closed before its first chunk was read
+    response = app.test_client().get('/abandon', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    response.close()
+    assert source.closed
+
+
+def test_abandoning_one_reader_keeps_the_stream_for_others(app):
+    source = Source([b"chunk"] * 5)
+    shared = singleflight._SharedStream('key', source, 200, [])
+    first, second = shared.open_reader(), shared.open_reader()
+    first.close()
+    assert b"".join(second) == b"chunk" * 5
+    second.close()
+    assert not source.closed or shared._finished
+
+
+def test_compressed_shared_stream_round_trips(app):
+    @app.route('/gz')
+    @singleflight.coalesce()
+    def gz():
+        return app.response_class(Source([b"abc"] * 100), mimetype='text/plain')
+
+    response = app.test_client().get('/gz', headers={'Accept-Encoding': 'gzip'})
+    assert gzip.decompress(response.get_data()) == b"abc" * 100
+    response.close()
+
+
+def test_request_after_a_save_does_not_join_earlier_work(app):
+    data = {'value': 'before'}
+    runs = []
+    started = threading.Event()
+
+    @app.route('/data')
+    @data_version.conditional
+    @singleflight.coalesce()
+    def view():
+        value = data['value']
+        runs.append(value)
+        started.set()
+        time.sleep(0.3)
+        return {'value': value}
+
+    @app.route('/stream')
+    @data_version.conditional
+    @singleflight.coalesce()
+    def stream():
+        value = data['value']
+        runs.append(value)
+        started.set()
+        return app.response_class(Source([value.encode()] * 5, delay=0.06), mimetype='text/plain')
+
+    for path in ('/data', '/stream'):
+        data['value'], runs[:], results = 'before', [], {}
+        started.clear()
+        first = threading.Thread(target=lambda: results.update(first=app.test_client().get(path)))
+        first.start()
+        started.wait()
+        data['value'] = 'after'
+        data_version.bump()
+        results['second'] = app.test_client().get(path)
+        first.join()
+
+        bodies = {name: response.get_data() for name, response in results.items()}
+        for response in results.values():
+            response.close()
+
+        assert runs == ['before', 'after']
+        assert b'before' in bodies['first'] and b'after' not in bodies['first']
+        assert b'after' in bodies['second'] and b'before' not in bodies['second']
+        assert results['second'].headers['ETag'] != results['first'].headers['ETag']
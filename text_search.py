@@ -0,0 +1,279 @@
+import math
+import re
+import threading
+import numpy as np
+
+# In-memory TF-IDF index over posts.caption. Term entries are kept sorted by
+# term id so a query only touches the postings of its own terms, and scoring
+# is done with batched NumPy ops (bincount over the concatenated postings).
+# A doc-major permutation of the entries gives each post's terms without a
+# scan. Posts added after a rebuild go to a small pending segment, in doc
+# order, which queries scan directly; it is merged into the sorted entries
+# once it holds PENDING_MAX_ENTRIES.
+
+TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9'+#-]*")
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just me more most
+my myself no nor not now of off on once only or other our ours ourselves out over own same she should
+so some such than that the their theirs them themselves then there these they this those through to
+too under until up very was we were what when where which while who whom why will with you your yours
+yourself yourselves
+""".split())
+SIMILAR_QUERY_TERMS = 30
+FETCH_BATCH_SIZE = 1000
+PENDING_MAX_ENTRIES = 8192
+
+_lock = threading.RLock()
+_loaded = False
+_dirty = True
+
+_vocab = {}                                # term -> term id
+_df = np.zeros(0, dtype=np.int32)          # term id -> document frequency
+_post_ids = []                             # doc id -> post_id
+_doc_index = {}                            # post_id -> doc id
+
+# Term-sorted entries: one per (doc, term) pair
+_terms = np.zeros(0, dtype=np.int32)
+_docs = np.zeros(0, dtype=np.int32)
+_tf = np.zeros(0, dtype=np.float32)
+
+# Entry positions in doc order; doc d's entries are _doc_entries[_doc_ptr[d]:_doc_ptr[d + 1]]
+_doc_entries = np.zeros(0, dtype=np.int64)
+_doc_ptr = np.zeros(1, dtype=np.int64)
+_term_ptr = np.zeros(1, dtype=np.int64)
+
+# Pending segment: (term ids, tf) per post added since the last merge, for
+# doc ids from len(_doc_ptr) - 1 on
+_pending = []
+_pending_entries = 0
+_p_terms = np.zeros(0, dtype=np.int32)
+_p_docs = np.zeros(0, dtype=np.int32)
+_p_tf = np.zeros(0, dtype=np.float32)
+_p_ptr = np.zeros(1, dtype=np.int64)
+
+# Derived on demand after changes
+_idf = np.zeros(0, dtype=np.float32)
+_weights = np.zeros(0, dtype=np.float32)
+_p_weights = np.zeros(0, dtype=np.float32)
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return [t for t in TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def _term_counts(text, grow_vocab):
+    counts = {}
+    for token in tokenize(text):
+        term_id = _vocab.get(token)
+        if term_id is None:
+            if not grow_vocab:
+                continue
+            term_id = _vocab[token] = len(_vocab)
+        counts[term_id] = counts.get(term_id, 0) + 1
+    if not counts:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+    term_ids = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+    tf = 1 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+    return term_ids, tf
+
+
+def _grow_df(term_ids):
+    global _df
+    if len(_vocab) > len(_df):
+        _df = np.concatenate([_df, np.zeros(len(_vocab) - len(_df), dtype=np.int32)])
+    np.add.at(_df, term_ids, 1)
+
+
+# Offsets into the sorted entries, by term and by doc
+def _index_main(n_docs):
+    global _doc_entries, _doc_ptr, _term_ptr
+    _doc_entries = np.argsort(_docs, kind='stable')
+    _doc_ptr = np.searchsorted(_docs[_doc_entries], np.arange(n_docs + 1))
+    _term_ptr = np.searchsorted(_terms, np.arange(len(_vocab) + 1))
+
+
+def _clear_pending():
+    global _pending_entries, _p_terms, _p_docs, _p_tf, _p_ptr
+    _pending.clear()
+    _pending_entries = 0
+    _p_terms = np.zeros(0, dtype=np.int32)
+    _p_docs = np.zeros(0, dtype=np.int32)
+    _p_tf = np.zeros(0, dtype=np.float32)
+    _p_ptr = np.zeros(1, dtype=np.int64)
+
+
+# Fold the pending segment into the term-sorted entries
+def _merge_pending():
+    global _terms, _docs, _tf
+    terms = np.concatenate([_terms, _p_terms])
+    order = np.argsort(terms, kind='stable')
+    _terms = terms[order]
+    _docs = np.concatenate([_docs, _p_docs])[order]
+    _tf = np.concatenate([_tf, _p_tf])[order]
+    _clear_pending()
+    _index_main(len(_post_ids))
+
+
+def _finalize():
+    global _dirty, _idf, _weights, _p_weights, _p_terms, _p_docs, _p_tf, _p_ptr, _term_ptr
+    if _pending:
+        first_doc = len(_doc_ptr) - 1
+        _p_terms = np.concatenate([terms for terms, _ in _pending])
+        _p_tf = np.concatenate([tf for _, tf in _pending])
+        lengths = [len(terms) for terms, _ in _pending]
+        _p_docs = np.repeat(np.arange(first_doc, first_doc + len(_pending), dtype=np.int32), lengths)
+        _p_ptr = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        if _pending_entries > PENDING_MAX_ENTRIES:
+            _merge_pending()
+    if len(_term_ptr) < len(_vocab) + 1:
+        # Terms first seen in pending posts have no main-segment postings
+        _term_ptr = np.concatenate([_term_ptr, np.full(len(_vocab) + 1 - len(_term_ptr), len(_terms))])
+
+    n_docs = len(_post_ids)
+    _idf = (np.log((1 + n_docs) / (1 + _df)) + 1).astype(np.float32)
+    weights = _tf * _idf[_terms]
+    p_weights = _p_tf * _idf[_p_terms]
+    squares = np.bincount(_docs, weights=weights.astype(np.float64) ** 2, minlength=n_docs)
+    squares += np.bincount(_p_docs, weights=p_weights.astype(np.float64) ** 2, minlength=n_docs)
+    norms = np.sqrt(squares)
+    norms[norms == 0] = 1
+    _weights = (weights / norms[_docs]).astype(np.float32)
+    _p_weights = (p_weights / norms[_p_docs]).astype(np.float32)
+    _dirty = False
+
+
+def rebuild(cursor):
+    global _loaded, _dirty, _df, _terms, _docs, _tf
+    cursor.execute("SELECT post_id, caption FROM posts")
+
+    with _lock:
+        _vocab.clear()
+        _post_ids.clear()
+        _doc_index.clear()
+        _df = np.zeros(0, dtype=np.int32)
+        term_chunks, doc_chunks, tf_chunks = [], [], []
+
+        while True:
+            rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                doc_id = len(_post_ids)
+                _post_ids.append(row['post_id'])
+                _doc_index[row['post_id']] = doc_id
+                term_ids, tf = _term_counts(row['caption'], grow_vocab=True)
+                term_chunks.append(term_ids)
+                tf_chunks.append(tf)
+                doc_chunks.append(np.full(len(term_ids), doc_id, dtype=np.int32))
+
+        terms = np.concatenate(term_chunks) if term_chunks else np.zeros(0, dtype=np.int32)
+        _df = np.bincount(terms, minlength=len(_vocab)).astype(np.int32)
+        order = np.argsort(terms, kind='stable')
+        _terms = terms[order]
+        _docs = (np.concatenate(doc_chunks) if doc_chunks else np.zeros(0, dtype=np.int32))[order]
+        _tf = (np.concatenate(tf_chunks) if tf_chunks else np.zeros(0, dtype=np.float32))[order]
+        _clear_pending()
+        _index_main(len(_post_ids))
+        _dirty = True
+        _loaded = True
+
+
+def is_loaded():
+    return _loaded
+
+
+def ensure_loaded(cursor):
+    if not _loaded:
+        rebuild(cursor)
+
+
+# Drop the index so the next ensure_loaded rebuilds it from the database
+def invalidate():
+    global _loaded
+    with _lock:
+        _loaded = False
+
+
+def add_post(post_id, caption):
+    global _dirty, _pending_entries
+    with _lock:
+        if not _loaded or post_id in _doc_index:
+            return
+        _doc_index[post_id] = len(_post_ids)
+        _post_ids.append(post_id)
+
+        term_ids, tf = _term_counts(caption, grow_vocab=True)
+        _grow_df(term_ids)
+        order = np.argsort(term_ids)
+        _pending.append((term_ids[order], tf[order]))
+        _pending_entries += len(term_ids)
+        _dirty = True
+
+
+def _rank(term_ids, query_weights, limit, exclude=None):
+    if _dirty:
+        _finalize()
+    if not len(term_ids):
+        return []
+
+    starts = _term_ptr[term_ids]
+    ends = _term_ptr[term_ids + 1]
+    lengths = ends - starts
+    # Gather the postings of every query term in one shot
+    offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    entries = np.arange(lengths.sum()) + offsets
+    docs = _docs[entries]
+    contributions = _weights[entries] * np.repeat(query_weights, lengths)
+
+    if len(_p_terms):
+        # The pending segment is small and unsorted: match its entries against the query terms
+        order = np.argsort(term_ids)
+        positions = np.minimum(np.searchsorted(term_ids[order], _p_terms), len(order) - 1)
+        matched = np.flatnonzero(term_ids[order][positions] == _p_terms)
+        docs = np.concatenate([docs, _p_docs[matched]])
+        contributions = np.concatenate([contributions, _p_weights[matched] * query_weights[order][positions[matched]]])
+    scores = np.bincount(docs, weights=contributions, minlength=len(_post_ids)).astype(np.float64)
+
+    if exclude is not None:
+        scores[exclude] = 0
+    candidates = np.flatnonzero(scores > 0)
+    if len(candidates) > limit:
+        candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+    candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+    return [(_post_ids[d], float(scores[d])) for d in candidates]
+
+
+def search(text, limit=10):
+    with _lock:
+        term_ids, tf = _term_counts(text, grow_vocab=False)
+        if _dirty:
+            _finalize()
+        if not len(term_ids):
+            return []
+        query_weights = tf * _idf[term_ids]
+        query_weights /= math.sqrt(float((query_weights ** 2).sum())) or 1
+        return _rank(term_ids, query_weights, limit)
+
+
+def similar_to(post_id, limit=10):
+    with _lock:
+        doc_id = _doc_index.get(post_id)
+        if doc_id is None:
+            return []
+        if _dirty:
+            _finalize()
+        main_docs = len(_doc_ptr) - 1
+        if doc_id < main_docs:
+            entries = _doc_entries[_doc_ptr[doc_id]:_doc_ptr[doc_id + 1]]
+            terms, weights = _terms[entries], _weights[entries]
+        else:
+            pending = slice(_p_ptr[doc_id - main_docs], _p_ptr[doc_id - main_docs + 1])
+            terms, weights = _p_terms[pending], _p_weights[pending]
+        if len(terms) > SIMILAR_QUERY_TERMS:
+            top = np.argpartition(-weights, SIMILAR_QUERY_TERMS - 1)[:SIMILAR_QUERY_TERMS]
+            terms, weights = terms[top], weights[top]
+        return _rank(terms, weights, limit, exclude=doc_id)
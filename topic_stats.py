@@ -0,0 +1,55 @@
+import threading
+import columnar
+
+# Cached per-topic aggregates for the /topic/<id> page, computed from the
+# columnar snapshot rather than by pulling the topic's rows from MySQL.
+# Entries are dropped when save_post touches the topic.
+
+_lock = threading.Lock()
+_cache = {}  # topic_id -> stats dict
+_generation = 0  # bumped by invalidate(), so a result computed across one is not stored
+
+EMPTY_STATS = {
+    'total_posts': 0,
+    'last_post_datetime': None,
+    'avg_likes': 0,
+    'median_likes': 0,
+    'avg_impressions': 0,
+    'median_impressions': 0,
+    'avg_comments': 0,
+    'median_comments': 0,
+}
+
+
+def _compute(topic_id, load):
+    load()
+    summary = columnar.topic_summary(topic_id)
+    if not summary['total_posts']:
+        return dict(EMPTY_STATS)
+    # NULL-only columns read as 0, as the SQL AVG fallback did
+    return {key: (0 if value is None and key != 'last_post_datetime' else value)
+            for key, value in summary.items()}
+
+
+# `load` makes sure the columnar snapshot is loaded
+def get(topic_id, load):
+    with _lock:
+        stats = _cache.get(topic_id)
+        generation = _generation
+    if stats is None:
+        stats = _compute(topic_id, load)
+        with _lock:
+            if _generation == generation:
+                _cache[topic_id] = stats
+    return stats
+
+
+def invalidate(topic_ids=None):
+    global _generation
+    with _lock:
+        _generation += 1
+        if topic_ids is None:
+            _cache.clear()
+            return
+        for topic_id in topic_ids:
+            _cache.pop(topic_id, None)
@@ -0,0 +1,316 @@
+import json
+import os
+import re
+import subprocess
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+import metrics
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Upload storage and checks for the video-to-GIF converter. Uploads are
+# streamed to uniquely named files under temp_uploads/video, either from the
+# plain form post or through resumable chunked uploads:
+#
+#   POST   /api/video-uploads            {"filename", "size"} -> {"upload_id", "offset", "chunk_size"}
+#   PUT    /api/video-uploads/<id>       raw chunk at the Upload-Offset header -> {"offset"}
+#   GET    /api/video-uploads/<id>       current offset, to resume after a failure
+#   POST   /api/video-uploads/<id>/gif   probe and convert the completed upload
+#   DELETE /api/video-uploads/<id>       abandon it
+#
+# Upload state lives on disk (the .part file and a .json sidecar), so any
+# worker can take the next chunk. Before any encoding, ffprobe checks that
+# the file holds a video stream within the duration and resolution limits.
+# VIDEO_MAX_TOTAL_BYTES caps the whole directory: files on disk plus the
+# bytes still owed to resumable uploads already accepted. New uploads and
+# chunks that would exceed it get a 503 until space frees up.
+# A background sweeper in each worker deletes files untouched for
+# VIDEO_UPLOAD_TTL, which covers abandoned uploads and failed conversions.
+
+MAX_BYTES = int(os.getenv("VIDEO_MAX_BYTES", 500 * 1024 * 1024))
+MAX_SECONDS = float(os.getenv("VIDEO_MAX_SECONDS", 60))
+MAX_WIDTH = int(os.getenv("VIDEO_MAX_WIDTH", 1920))
+MAX_HEIGHT = int(os.getenv("VIDEO_MAX_HEIGHT", 1920))
+CHUNK_SIZE = int(os.getenv("VIDEO_CHUNK_SIZE", 8 * 1024 * 1024))  # largest chunk accepted per request
+MAX_TOTAL_BYTES = int(os.getenv("VIDEO_MAX_TOTAL_BYTES", 4 * 1024 * 1024 * 1024))
+UPLOAD_TTL = int(os.getenv("VIDEO_UPLOAD_TTL", 3600))
+SWEEP_INTERVAL = int(os.getenv("VIDEO_SWEEP_INTERVAL", 300))
+PROBE_TIMEOUT = 30
+COPY_BUFFER = 64 * 1024
+
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+_upload_dir = None
+_sweeper_pid = None
+_sweeper_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def init_app(app):
+    global _upload_dir
+    _upload_dir = os.path.join(app.root_path, 'temp_uploads', 'video')
+
+    # Started lazily so each forked worker runs its own sweeper thread
+    @app.before_request
+    def start_upload_sweeper():
+        if _sweeper_pid != os.getpid():
+            _start_sweeper(app.logger)
+
+
+def _new_path(suffix):
+    os.makedirs(_upload_dir, exist_ok=True)
+    return os.path.join(_upload_dir, f"{uuid.uuid4().hex}{suffix}")
+
+
+# Bytes stored under the upload directory, plus the remainder of every
+# resumable upload's declared size (already promised to its client)
+def _disk_usage():
+    used, reserved = 0, 0
+    try:
+        entries = list(os.scandir(_upload_dir))
+    except FileNotFoundError:
+        return 0
+    sizes = {}
+    for entry in entries:
+        try:
+            sizes[entry.name] = entry.stat().st_size
+        except FileNotFoundError:
+            continue
+        used += sizes[entry.name]
+    for name in sizes:
+        if name.endswith(".json"):
+            try:
+                with open(os.path.join(_upload_dir, name)) as f:
+                    declared = json.load(f)['size']
+            except (OSError, ValueError, KeyError):
+                continue
+            reserved += max(0, declared - sizes.get(f"{name[:-len('.json')]}.part", 0))
+    return used + reserved
+
+
+def _check_quota(extra):
+    if _disk_usage() + extra > MAX_TOTAL_BYTES:
+        raise UploadError("The server is handling too many uploads. Please try again later.", 503)
+
+
+# Held across a quota check and the write that reserves the space, so
+# concurrent creates in any worker cannot both pass the same check. The lock
+# file sits next to the directory, where the sweeper and _disk_usage never see it.
+@contextmanager
+def _quota_lock():
+    os.makedirs(_upload_dir, exist_ok=True)
+    with open(f"{_upload_dir}.lock", "a") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _copy(source, target, limit):
+    written = 0
+    while written < limit:
+        data = source.read(min(COPY_BUFFER, limit - written))
+        if not data:
+            break
+        target.write(data)
+        written += len(data)
+    return written
+
+
+# ----------- Single-request uploads -----------
+
+# Stream a form upload (werkzeug FileStorage) to a unique temp file
+def save_upload(file):
+    _check_quota(0)
+    path = _new_path(".upload")
+    try:
+        with open(path, "wb") as target:
+            written = _copy(file.stream, target, MAX_BYTES + 1)
+        if written > MAX_BYTES:
+            raise UploadError(f"Video is larger than {MAX_BYTES // (1024 * 1024)} MB.", 413)
+    except BaseException:
+        discard_path(path)
+        raise
+    return path
+
+
+# ----------- Resumable uploads -----------
+
+def _paths(upload_id):
+    if not _UPLOAD_ID.match(upload_id or ""):
+        raise UploadError("Unknown upload.", 404)
+    base = os.path.join(_upload_dir, upload_id)
+    if not os.path.exists(f"{base}.json"):
+        raise UploadError("Unknown upload.", 404)
+    return f"{base}.part", f"{base}.json"
+
+
+def _state(upload_id):
+    part_path, meta_path = _paths(upload_id)
+    with open(meta_path) as f:
+        meta = json.load(f)
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    return {'upload_id': upload_id, 'filename': meta['filename'], 'size': meta['size'],
+            'offset': offset, 'chunk_size': CHUNK_SIZE}
+
+
+def create(filename, size):
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError("A positive upload size is required.")
+    if size > MAX_BYTES:
+        raise UploadError(f"Video is larger than {MAX_BYTES // (1024 * 1024)} MB.", 413)
+    upload_id = uuid.uuid4().hex
+    base = os.path.join(_upload_dir, upload_id)
+    with _quota_lock():
+        _check_quota(size)
+        open(f"{base}.part", "wb").close()
+        with open(f"{base}.json", "w") as f:
+            json.dump({'filename': filename or "video", 'size': size, 'created': time.time()}, f)
+    return _state(upload_id)
+
+
+def status(upload_id):
+    return _state(upload_id)
+
+
+# Append one chunk read from `stream`; the client's offset must match the
+# bytes already stored. A chunk cut short by a dropped connection keeps what
+# arrived, and the client resumes from the offset reported by status().
+def append(upload_id, offset, stream, length):
+    state = _state(upload_id)
+    if length is None:
+        raise UploadError("Chunks need a Content-Length.", 411)
+    if length > CHUNK_SIZE:
+        raise UploadError(f"Chunks are limited to {CHUNK_SIZE} bytes.", 413)
+    if offset + length > state['size']:
+        raise UploadError("Chunk runs past the declared upload size.", 416)
+
+    part_path, meta_path = _paths(upload_id)
+    with open(part_path, "ab") as target:
+        if fcntl:
+            try:
+                fcntl.flock(target, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadError("Another chunk of this upload is in progress.", 409)
+        current = os.fstat(target.fileno()).st_size
+        if offset != current:
+            raise UploadError(f"Expected offset {current}.", 409)
+        # This upload's remaining bytes are already counted as reserved, so
+        # only fail when the directory is over quota for other reasons
+        _check_quota(0)
+        _copy(stream, target, length)
+        target.flush()
+    os.utime(meta_path)
+    return _state(upload_id)
+
+
+# Path and original name of a fully received upload, handed over to the
+# caller: the upload id stops being valid
+def complete(upload_id):
+    state = _state(upload_id)
+    if state['offset'] != state['size']:
+        raise UploadError(f"Upload incomplete: {state['offset']} of {state['size']} bytes.", 409)
+    part_path, meta_path = _paths(upload_id)
+    path = _new_path(".upload")
+    try:
+        os.replace(part_path, path)
+    except FileNotFoundError:
+        # Completed by a concurrent request, or swept meanwhile
+        raise UploadError("Unknown upload.", 404)
+    discard_path(meta_path)
+    return path, state['filename']
+
+
+def discard(upload_id):
+    for path in _paths(upload_id):
+        discard_path(path)
+
+
+def discard_path(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# ----------- Validation -----------
+
+# Reject files that are not videos or exceed the limits, before encoding
+def probe(path):
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0",
+           "-show_entries", "stream=width,height,duration:format=duration",
+           "-of", "json", path]
+    try:
+        with metrics.timed('ffmpeg_duration_seconds', task='probe'):
+            result = subprocess.run(cmd, check=True, capture_output=True, timeout=PROBE_TIMEOUT)
+        info = json.loads(result.stdout or b"{}")
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, ValueError):
+        raise UploadError("The file could not be read as a video.", 422)
+
+    streams = info.get('streams') or []
+    if not streams:
+        raise UploadError("The file has no video stream.", 422)
+    stream = streams[0]
+    width, height = int(stream.get('width') or 0), int(stream.get('height') or 0)
+    try:
+        duration = float(stream.get('duration') or (info.get('format') or {}).get('duration') or 0)
+    except ValueError:
+        duration = 0.0
+
+    if duration > MAX_SECONDS:
+        raise UploadError(f"Video is {duration:.0f}s long; the limit is {MAX_SECONDS:.0f}s.", 422)
+    if width > MAX_WIDTH or height > MAX_HEIGHT:
+        raise UploadError(f"Video is {width}x{height}; the limit is {MAX_WIDTH}x{MAX_HEIGHT}.", 422)
+    return {'width': width, 'height': height, 'duration': duration}
+
+
+# ----------- Sweeper -----------
+
+def sweep(max_age=None):
+    max_age = UPLOAD_TTL if max_age is None else max_age
+    if not _upload_dir or not os.path.isdir(_upload_dir):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for name in os.listdir(_upload_dir):
+        path = os.path.join(_upload_dir, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def _start_sweeper(logger):
+    global _sweeper_pid
+    with _sweeper_lock:
+        if _sweeper_pid == os.getpid():
+            return
+        _sweeper_pid = os.getpid()
+
+    def run():
+        while True:
+            time.sleep(SWEEP_INTERVAL)
+            try:
+                removed = sweep()
+                if removed:
+                    logger.info(f"Removed {removed} abandoned video upload files.")
+            except Exception as e:
+                logger.error(f"Video upload sweep failed: {e}")
+
+    threading.Thread(target=run, name="video-upload-sweeper", daemon=True).start()
@@ -0,0 +1,7 @@
+from app import create_app
+
+# WSGI entry point for production serving:
+#   gunicorn -c gunicorn.conf.py wsgi:app
+# Startup tasks are run once by gunicorn's on_starting hook, not per worker.
+
+app = create_app()